@@ -0,0 +1,404 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+from firebase_admin import auth
+from google.auth import crypt, jwt # type: ignore
+import urllib.request
+import asyncio
+import hashlib
+import logging
+import json
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ID_TOKEN_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+FIREBASE_ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+class VerifiedTokenCache:
+  """Bounded LRU of decoded Firebase ID tokens, keyed by the SHA-256 of the raw token"""
+
+  def __init__(self, max_entries: int = 4096):
+    self.max_entries = max_entries
+    self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict() # token hash -> (expiry, decoded token)
+    self.hits = 0
+    self.misses = 0
+
+  @staticmethod
+  def _key(id_token: str) -> str:
+    return hashlib.sha256(id_token.encode()).hexdigest()
+
+  def get(self, id_token: str) -> dict | None:
+    key = self._key(id_token)
+    entry = self._entries.get(key)
+
+    if entry is None:
+      self.misses += 1
+      return None
+
+    expiry, decoded_token = entry
+    if time.time() >= expiry:
+      del self._entries[key]
+      self.misses += 1
+      return None
+
+    self._entries.move_to_end(key)
+    self.hits += 1
+    return decoded_token
+
+  def put(self, id_token: str, decoded_token: dict, valid_until: float | None = None):
+    # kept until the token's exp, or until valid_until when its revocation check is only good until then
+    exp = decoded_token.get("exp")
+    expiry = min(exp, valid_until) if exp and valid_until is not None else exp
+    if not expiry or time.time() >= expiry:
+      return
+
+    key = self._key(id_token)
+    self._entries[key] = (expiry, decoded_token)
+    self._entries.move_to_end(key)
+
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+
+  def clear(self):
+    self._entries.clear()
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "size": len(self._entries),
+      "max_entries": self.max_entries,
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_ratio": self.hits / lookups if lookups else 0.0,
+    }
+
+class TokenRevocationChecker:
+  """Rejects ID tokens issued before their user's Firebase tokens_valid_after time, which every revocation sets
+  wherever it is made. Each uid's time is looked up at most once per interval and shared by concurrent requests,
+  so every worker sees a revocation within interval seconds"""
+
+  def __init__(self, lookup: Callable[[str], float | None], interval: float = 60, max_entries: int = 16384, timeout: float = 5.0):
+    self._lookup = lookup # blocking: uid -> tokens_valid_after in seconds
+    self.interval = interval # 0 disables the lookups, for setups without Firebase credentials
+    self.max_entries = max_entries
+    self.timeout = timeout
+    self._entries: "OrderedDict[str, Tuple[float, float | None]]" = OrderedDict() # uid -> (checked at, tokens valid after)
+    self._in_flight: Dict[str, asyncio.Future] = {} # uid -> pending lookup
+    self.lookups = 0
+    self.failures = 0
+
+  async def check(self, decoded_token: dict) -> float | None:
+    """Raises RevokedIdTokenError for a revoked token, otherwise returns until when that answer holds"""
+    if self.interval <= 0:
+      return None
+
+    uid = decoded_token.get("uid")
+    entry = self._entries.get(uid)
+    if entry is None or time.time() >= entry[0] + self.interval:
+      entry = await self._refresh(uid)
+    else:
+      self._entries.move_to_end(uid)
+
+    checked_at, valid_after = entry
+    if valid_after is not None and decoded_token.get("iat", 0) < valid_after:
+      raise auth.RevokedIdTokenError("The Firebase ID token has been revoked")
+    return checked_at + self.interval
+
+  async def _refresh(self, uid: str) -> Tuple[float, float | None]:
+    future = self._in_flight.get(uid)
+    if future is None:
+      future = asyncio.ensure_future(self._run(uid))
+      self._in_flight[uid] = future
+      future.add_done_callback(lambda _: self._in_flight.pop(uid, None))
+    return await asyncio.shield(future)
+
+  async def _run(self, uid: str) -> Tuple[float, float | None]:
+    checked_at = time.time()
+    loop = asyncio.get_running_loop()
+    try:
+      valid_after = await asyncio.wait_for(loop.run_in_executor(None, self._lookup, uid), self.timeout)
+      self.lookups += 1
+    except Exception as e:
+      # an unreachable Firebase must not sign everyone out: the last known time stands until the next interval
+      self.failures += 1
+      logger.warning("Token revocation lookup failed: %s", e)
+      previous = self._entries.get(uid)
+      valid_after = previous[1] if previous else None
+
+    entry = (checked_at, valid_after)
+    self._entries[uid] = entry
+    self._entries.move_to_end(uid)
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+    return entry
+
+  def clear(self):
+    self._entries.clear()
+
+  def stats(self) -> dict:
+    return {
+      "interval": self.interval,
+      "users": len(self._entries),
+      "lookups": self.lookups,
+      "failures": self.failures,
+    }
+
+class TokenVerificationTimeout(Exception):
+  pass
+
+class TokenVerifier:
+  """Runs a blocking verify function in a bounded thread pool so it never stalls the event loop. The function
+  is expected to verify against keys already in memory (SigningKeyStore.verify): certificate fetches belong to
+  the SigningKeyStore, which shares each one between every caller, never to the pool threads"""
+
+  def __init__(self, verify: Callable[[str], dict], max_workers: int = 4, max_concurrency: int = 16, timeout: float = 5.0):
+    self._verify = verify
+    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="token-verifier")
+    self._semaphore = asyncio.Semaphore(max_concurrency) # caps verifications running or queued in the pool
+    self._in_flight: Dict[str, asyncio.Future] = {} # token hash -> pending verification
+    self.timeout = timeout
+
+  async def verify(self, id_token: str) -> dict:
+    # concurrent requests carrying the same token share one verification; different tokens are verified
+    # independently, so at most max_workers of them run (each possibly fetching certificates) at once
+    key = VerifiedTokenCache._key(id_token)
+    future = self._in_flight.get(key)
+
+    if future is None:
+      future = asyncio.ensure_future(self._run(id_token))
+      self._in_flight[key] = future
+      future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+    return await asyncio.shield(future) # one cancelled request must not cancel the others waiting on it
+
+  async def _run(self, id_token: str) -> dict:
+    try:
+      return await asyncio.wait_for(self._run_bounded(id_token), self.timeout)
+    except asyncio.TimeoutError:
+      raise TokenVerificationTimeout(f"Token verification took longer than {self.timeout}s")
+
+  async def _run_bounded(self, id_token: str) -> dict:
+    async with self._semaphore:
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(self._executor, self._verify, id_token)
+
+  def shutdown(self):
+    self._executor.shutdown(wait=False, cancel_futures=True)
+
+class UnknownSigningKeyError(auth.InvalidIdTokenError):
+  def __init__(self, kid: str | None):
+    super().__init__(f'ID token is signed with unknown key id "{kid}"')
+    self.kid = kid
+
+class SigningKeysUnavailable(Exception):
+  pass
+
+class SigningKeyStore:
+  """Local copy of the Firebase ID token signing certificates, verified against with no network calls"""
+
+  def __init__(self, project_id: str, certs_url: str = GOOGLE_ID_TOKEN_CERTS_URL, key_file: str | None = None, refresh_margin: float = 300, min_refresh_interval: float = 30, fetch_timeout: float = 10):
+    self.project_id = project_id
+    self.certs_url = certs_url
+    self.key_file = key_file # JSON object of kid -> PEM certificate or public key, same shape as certs_url
+    self.refresh_margin = refresh_margin # refresh this many seconds before the published keys expire
+    self.min_refresh_interval = min_refresh_interval
+    self.fetch_timeout = fetch_timeout
+    self.certs: Dict[str, str] = {}
+    self.expires_at = 0.0
+    self.last_refreshed = 0.0
+    self.refresh_count = 0
+    self.refresh_failures = 0
+    self.last_failed = 0.0
+    self._refresh_task: asyncio.Task | None = None # shared by every caller while a refresh is running
+    self._background_task: asyncio.Task | None = None
+
+  @property
+  def ready(self) -> bool:
+    return bool(self.certs)
+
+  async def start(self):
+    try:
+      await self.refresh()
+    except Exception as e:
+      logger.warning("Initial signing key load failed: %s", e)
+
+    if not self.key_file:
+      self._background_task = asyncio.create_task(self._refresh_loop())
+
+  async def stop(self):
+    if self._background_task:
+      self._background_task.cancel()
+      self._background_task = None
+
+  async def refresh(self):
+    if self._refresh_task is None:
+      self._refresh_task = asyncio.create_task(self._refresh())
+      self._refresh_task.add_done_callback(self._clear_refresh_task)
+    await asyncio.shield(self._refresh_task)
+
+  def _clear_refresh_task(self, task: asyncio.Task):
+    self._refresh_task = None
+    if not task.cancelled():
+      task.exception() # retrieved here so a failure nobody awaited is not reported as unhandled
+
+  async def ensure_ready(self):
+    # verifications arriving before the keys have loaded wait on one shared fetch; after a failed fetch they
+    # fail fast until min_refresh_interval has passed, rather than each retrying it
+    if self.ready:
+      return
+    if time.time() - self.last_failed < self.min_refresh_interval:
+      raise SigningKeysUnavailable("Signing keys are not loaded")
+    try:
+      await self.refresh()
+    except Exception as e:
+      raise SigningKeysUnavailable(f"Signing keys could not be loaded: {e}") from e
+
+  async def refresh_for_unknown_key(self) -> bool:
+    # a token signed with a kid we do not hold usually means Google rotated keys early;
+    # rate limited so tokens with made-up kids cannot turn into a fetch per request
+    if self.key_file or time.time() - self.last_refreshed < self.min_refresh_interval:
+      return False
+    try:
+      await self.refresh()
+      return True
+    except Exception as e:
+      logger.warning("Signing key refresh failed: %s", e)
+      return False
+
+  async def _refresh(self):
+    loop = asyncio.get_running_loop()
+    try:
+      certs, max_age = await loop.run_in_executor(None, self._load)
+    except Exception:
+      self.refresh_failures += 1
+      self.last_failed = time.time()
+      raise
+
+    self.certs = certs
+    self.last_refreshed = time.time()
+    self.expires_at = self.last_refreshed + max_age if max_age is not None else float("inf")
+    self.refresh_count += 1
+
+  def _load(self) -> Tuple[Dict[str, str], float | None]:
+    if self.key_file:
+      with open(self.key_file) as key_file:
+        return json.load(key_file), None
+
+    with urllib.request.urlopen(self.certs_url, timeout=self.fetch_timeout) as response:
+      certs = json.loads(response.read().decode())
+      match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+      return certs, float(match.group(1)) if match else 3600.0
+
+  async def _refresh_loop(self):
+    while True:
+      if self.ready:
+        delay = max(self.expires_at - self.refresh_margin - time.time(), self.min_refresh_interval)
+      else:
+        delay = self.min_refresh_interval
+      await asyncio.sleep(delay)
+
+      try:
+        await self.refresh()
+      except Exception as e:
+        logger.warning("Background signing key refresh failed: %s", e)
+
+  def verify(self, id_token: str) -> dict:
+    # same checks as firebase_admin's ID token verifier, minus the certificate fetch
+    try:
+      header = jwt.decode_header(id_token)
+    except ValueError as e:
+      raise auth.InvalidIdTokenError(str(e), cause=e)
+
+    if header.get("alg") != "RS256":
+      raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect algorithm "{header.get("alg")}"')
+
+    kid = header.get("kid")
+    cert = self.certs.get(kid)
+    if cert is None:
+      raise UnknownSigningKeyError(kid)
+
+    try:
+      claims = jwt.decode(id_token, certs={kid: cert}, audience=self.project_id)
+    except ValueError as e:
+      if "Token expired" in str(e):
+        raise auth.ExpiredIdTokenError(str(e), cause=e)
+      raise auth.InvalidIdTokenError(str(e), cause=e)
+
+    if claims.get("iss") != FIREBASE_ID_TOKEN_ISSUER_PREFIX + self.project_id:
+      raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect "iss" claim "{claims.get("iss")}"')
+
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+      raise auth.InvalidIdTokenError('Firebase ID token has an invalid "sub" claim')
+
+    claims["uid"] = subject
+    return claims
+
+  def stats(self) -> dict:
+    return {
+      "source": self.key_file or self.certs_url,
+      "key_ids": sorted(self.certs),
+      "expires_at": self.expires_at if self.expires_at != float("inf") else None, # keys from a key_file never expire
+      "last_refreshed": self.last_refreshed,
+      "refresh_count": self.refresh_count,
+      "refresh_failures": self.refresh_failures,
+    }
+
+def mint_id_token(private_key_pem: str, kid: str, project_id: str, uid: str, email: str | None = None, lifetime: int = 3600) -> str:
+  """Signs a Firebase-shaped ID token, for tests and air-gapped setups that verify against a key_file"""
+  now = int(time.time())
+  payload = {
+    "iss": FIREBASE_ID_TOKEN_ISSUER_PREFIX + project_id,
+    "aud": project_id,
+    "auth_time": now,
+    "sub": uid,
+    "iat": now,
+    "exp": now + lifetime,
+  }
+  if email:
+    payload["email"] = email
+
+  signer = crypt.RSASigner.from_string(private_key_pem, key_id=kid)
+  return jwt.encode(signer, payload).decode()
+
+class AppuserIdCache:
+  """Bounded LRU of Firebase uid -> Appuser id, so authorization checks need no lookup query"""
+
+  def __init__(self, max_entries: int = 16384):
+    self.max_entries = max_entries
+    self._entries: "OrderedDict[str, int]" = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, uid: str) -> int | None:
+    appuser_id = self._entries.get(uid)
+
+    if appuser_id is None:
+      self.misses += 1
+      return None
+
+    self._entries.move_to_end(uid)
+    self.hits += 1
+    return appuser_id
+
+  def put(self, uid: str, appuser_id: int):
+    self._entries[uid] = appuser_id
+    self._entries.move_to_end(uid)
+
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+
+  def invalidate(self, uid: str):
+    self._entries.pop(uid, None)
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "size": len(self._entries),
+      "max_entries": self.max_entries,
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_ratio": self.hits / lookups if lookups else 0.0,
+    }
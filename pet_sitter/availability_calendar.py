@@ -0,0 +1,108 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+from tortoise.expressions import RawSQL # type: ignore
+from tortoise.functions import Sum # type: ignore
+import pet_sitter.models as models
+
+# Set-based writes to a sitter's availability: a whole calendar save is one statement, and the
+# (appuser_id, available_date) unique constraint makes concurrent saves of the same dates harmless.
+#
+# Alongside the availability rows, availability_month holds one bitmap per sitter per month (bit 0 is the
+# 1st), updated by the same statements that write the rows. Calendar reads and date-filtered searches use
+# the bitmaps; REBUILD_MONTHS_SQL recreates them from the rows for anything written around these functions.
+
+MAX_RANGE_DAYS = 366 # longest range one request may create, clear or read
+
+# the bit of each date's day within its month's bitmap, and that month's first day
+DAY_BIT_SQL = '1 << (EXTRACT(DAY FROM {column})::INT - 1)'
+MONTH_SQL = "date_trunc('month', {column})::DATE"
+
+REBUILD_MONTHS_SQL = f"""
+WITH months AS (
+  SELECT "appuser_id", {MONTH_SQL.format(column='"available_date"')} AS month, bit_or({DAY_BIT_SQL.format(column='"available_date"')}) AS days
+  FROM "availability"
+  GROUP BY 1, 2
+), emptied AS (
+  DELETE FROM "availability_month"
+  WHERE NOT EXISTS (SELECT 1 FROM months WHERE months."appuser_id" = "availability_month"."appuser_id" AND months.month = "availability_month"."month")
+)
+INSERT INTO "availability_month" ("appuser_id", "month", "days")
+SELECT "appuser_id", month, days FROM months
+ON CONFLICT ("appuser_id", "month") DO UPDATE SET "days" = EXCLUDED."days" WHERE "availability_month"."days" <> EXCLUDED."days"
+"""
+
+def month_start(day: date) -> date:
+  return day.replace(day=1)
+
+def month_masks(start_date: date, end_date: date, weekdays: Iterable[int] | None = None) -> Dict[date, int]:
+  """The bitmap of the dates from start_date to end_date inclusive (on weekdays, when given) for each month they cover"""
+  masks: Dict[date, int] = {}
+  for day in dates_in_range(start_date, end_date, weekdays):
+    masks[month_start(day)] = masks.get(month_start(day), 0) | 1 << (day.day - 1)
+  return masks
+
+def dates_in_range(start_date: date, end_date: date, weekdays: Iterable[int] | None = None) -> List[date]:
+  """Every date from start_date to end_date inclusive, limited to weekdays (0 is Monday) when given"""
+  allowed = set(weekdays) if weekdays is not None else None
+  days = (end_date - start_date).days + 1
+  return [day for day in (start_date + timedelta(days=offset) for offset in range(days)) if allowed is None or day.weekday() in allowed]
+
+async def insert_availabilities(connection, appuser_id: int, dates: Iterable[date]) -> List[dict]:
+  """Inserts the dates the sitter does not have yet, returning the created rows in date order"""
+  rows = await connection.execute_query_dict(f"""
+    WITH created AS (
+      INSERT INTO "availability" ("appuser_id", "available_date")
+      SELECT $1, requested.available_date FROM unnest($2::DATE[]) AS requested(available_date)
+      ON CONFLICT ("appuser_id", "available_date") DO NOTHING
+      RETURNING "id", "appuser_id", "available_date"
+    ), months AS (
+      INSERT INTO "availability_month" ("appuser_id", "month", "days")
+      SELECT "appuser_id", {MONTH_SQL.format(column='"available_date"')}, bit_or({DAY_BIT_SQL.format(column='"available_date"')})
+      FROM created
+      GROUP BY 1, 2
+      ON CONFLICT ("appuser_id", "month") DO UPDATE SET "days" = "availability_month"."days" | EXCLUDED."days"
+    )
+    SELECT "id", "appuser_id", "available_date" FROM created
+  """, [appuser_id, sorted(set(dates))])
+  return sorted(rows, key=lambda row: row["available_date"])
+
+async def delete_availabilities(connection, appuser_id: int, start_date: date, end_date: date, weekdays: Iterable[int] | None = None) -> List[date]:
+  """Deletes the sitter's dates from start_date to end_date inclusive (only on weekdays, when given), returning them in order"""
+  # isodow - 1 gives Python's weekday numbering, Monday 0 to Sunday 6
+  rows = await connection.execute_query_dict(f"""
+    WITH deleted AS (
+      DELETE FROM "availability"
+      WHERE "appuser_id" = $1 AND "available_date" BETWEEN $2 AND $3
+        AND ($4::INT[] IS NULL OR EXTRACT(ISODOW FROM "available_date")::INT - 1 = ANY($4::INT[]))
+      RETURNING "appuser_id", "available_date"
+    ), cleared AS (
+      SELECT "appuser_id", {MONTH_SQL.format(column='"available_date"')} AS month, bit_or({DAY_BIT_SQL.format(column='"available_date"')}) AS days
+      FROM deleted
+      GROUP BY 1, 2
+    ), months AS (
+      UPDATE "availability_month" SET "days" = "availability_month"."days" & ~cleared.days
+      FROM cleared
+      WHERE "availability_month"."appuser_id" = cleared."appuser_id" AND "availability_month"."month" = cleared.month
+    )
+    SELECT "available_date" FROM deleted
+  """, [appuser_id, start_date, end_date, list(weekdays) if weekdays is not None else None])
+  return sorted(row["available_date"] for row in rows)
+
+async def rebuild_months(connection):
+  await connection.execute_script(REBUILD_MONTHS_SQL)
+
+async def calendar(appuser_id: int, start_date: date, end_date: date) -> Dict[str, int]:
+  """The sitter's availability from start_date to end_date as {"YYYY-MM": bitmap}, leaving out months with no dates"""
+  masks = month_masks(start_date, end_date)
+  rows = await models.AvailabilityMonth.filter(appuser_id=appuser_id, month__in=list(masks)).order_by("month").values_list("month", "days")
+  return {month.strftime("%Y-%m"): days & masks[month] for month, days in rows if days & masks[month]}
+
+def available_days_sum(start_date: date, end_date: date) -> Sum:
+  """Sum over a sitter's availability_month rows of how many dates from start_date to end_date they are available on"""
+  # each month's bitmap is masked to the range before its bits are counted; the masks are computed here, not user input
+  cases = " ".join(f"WHEN '{month.isoformat()}' THEN {mask}" for month, mask in month_masks(start_date, end_date).items())
+  return Sum(RawSQL(f'bit_count(("availability_month"."days" & CASE "availability_month"."month" {cases} ELSE 0 END)::BIT(32))'))
+
+# appuser ids available on at least requiredDays of the dates from start_date to end_date, from the month bitmaps
+def available_sitters_query(start_date: date, end_date: date, requiredDays: int, appuser_search_conditions: dict):
+  return models.AvailabilityMonth.filter(month__gte=month_start(start_date), month__lte=end_date, **appuser_search_conditions).annotate(available_days=available_days_sum(start_date, end_date)).group_by("appuser_id").filter(available_days__gte=requiredDays).values_list("appuser_id", flat=True)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel # type: ignore
-from datetime import datetime
+from typing import List
+from datetime import date, datetime
 
 class SignUpBody(BaseModel):
   email: str
@@ -66,9 +67,21 @@ class CreateMessageBody(BaseModel):
   recipient_appuser_id: int
   content: str
 
+class SocketAuthFrame(BaseModel):
+  token: str
+
+class SocketMessageFrame(BaseModel):
+  content: str
+  client_id: str | int | None = None # echoed in the ack, so the client can match it to the message it sent
+
 class CreateAvailabilityBody(BaseModel):
   available_date: datetime
 
+class AvailabilityRangeBody(BaseModel):
+  start_date: date
+  end_date: date
+  weekdays: List[int] | None = None # 0 (Monday) to 6 (Sunday); every day when omitted
+
 class CreateReviewBody(BaseModel):
   author_appuser_id: int
   recipient_appuser_type: str
@@ -116,7 +129,13 @@ class FullAppuserResponseObject(BaseModel):
   account_language: str | None
   english_ok: bool | None
   japanese_ok: bool | None
-  average_user_rating: float | None
+  average_user_rating: float | None # legacy, over both roles
+  sitter_rating: float | None = None # mean score received as a sitter, which ranked sitter search uses
+  owner_rating: float | None = None
+  owner_review_count: int | None = None
+  owner_score_sum: int | None = None
+  sitter_review_count: int | None = None
+  sitter_score_sum: int | None = None
   user_profile_bio: str | None
   user_bio_picture_src_list: str | None
   is_sitter: bool | None
@@ -138,7 +157,13 @@ class ReducedAppuserResponseObject(BaseModel):
   account_language: str | None
   english_ok: bool | None
   japanese_ok: bool | None
-  average_user_rating: float | None
+  average_user_rating: float | None # legacy, over both roles
+  sitter_rating: float | None = None # mean score received as a sitter, which ranked sitter search uses
+  owner_rating: float | None = None
+  owner_review_count: int | None = None
+  owner_score_sum: int | None = None
+  sitter_review_count: int | None = None
+  sitter_score_sum: int | None = None
   user_profile_bio: str | None
   user_bio_picture_src_list: str | None
   is_sitter: bool | None
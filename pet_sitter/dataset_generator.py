@@ -0,0 +1,382 @@
+"""Generates large, reproducible synthetic datasets for load testing, as CSV files or straight into PostgreSQL via COPY
+
+  poetry run generate-dataset --appusers 1000000 --sitters 300000 --inquiries 1000000 --messages-per-inquiry 10 --availability-per-sitter 67 --format postgres
+
+Foreign keys and per-user row counts are pure functions of (seed, id), so shards can be generated in any order by
+any number of processes and still agree with each other. Everything else comes from a per-shard RNG, so the output
+is identical for the same seed, shard size and --now, whatever the process count.
+"""
+from datetime import date, datetime, timedelta, timezone
+from multiprocessing import Pool
+from dataclasses import dataclass
+from random import Random
+from typing import Callable, Dict, Iterator, List, Tuple
+import pet_sitter.availability_calendar as availability_calendar
+import pet_sitter.locations as locations
+import pet_sitter.ratings as ratings
+import pet_sitter.seeds as seeds
+import argparse
+import asyncio
+import csv
+import os
+
+MASK64 = (1 << 64) - 1
+
+APPUSER_COLUMNS = ["id", "firstname", "lastname", "email", "firebase_user_id", "average_user_rating", "user_profile_bio", "user_bio_picture_src_list", "account_created", "last_updated", "last_login", "profile_picture_src", "prefecture", "city_ward", "street_address", "postal_code", "account_language", "english_ok", "japanese_ok", "is_sitter"]
+SITTER_COLUMNS = ["id", "sitter_profile_bio", "sitter_bio_picture_src_list", "sitter_house_ok", "owner_house_ok", "visit_ok", "dogs_ok", "cats_ok", "fish_ok", "birds_ok", "rabbits_ok", "appuser_id"]
+AVAILABILITY_COLUMNS = ["id", "appuser_id", "available_date"]
+PET_COLUMNS = ["id", "name", "type_of_animal", "subtype", "gender", "weight", "birthday", "known_allergies", "medications", "special_needs", "profile_picture_src", "pet_bio_picture_src_list", "appuser_id", "posted_date", "last_updated", "profile_bio"]
+INQUIRY_COLUMNS = ["id", "owner_appuser_id", "sitter_appuser_id", "inquiry_status", "start_date", "end_date", "desired_service", "pet_id_list", "additional_info", "inquiry_submitted", "inquiry_finalized"]
+INQUIRY_PET_COLUMNS = ["id", "inquiry_id", "pet_id", "position"]
+MESSAGE_COLUMNS = ["id", "inquiry_id", "author_appuser_id", "recipient_appuser_id", "content", "time_sent"]
+REVIEW_COLUMNS = ["id", "author_appuser_id", "recipient_appuser_type", "comment", "score", "recipient_appuser_id", "submission_date"]
+
+# splitmix64: a cheap, well-mixed hash used to derive per-id values any shard can recompute
+def mix(seed: int, value: int) -> int:
+  z = (seed * 0x9E3779B97F4A7C15 + value + 0x9E3779B97F4A7C15) & MASK64
+  z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+  z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+  return z ^ (z >> 31)
+
+@dataclass(frozen=True)
+class DatasetConfig:
+  appusers: int
+  sitters: int
+  inquiries: int
+  messages_per_inquiry: int
+  availability_per_sitter: int
+  max_pets_per_appuser: int
+  seed: int
+  shard_size: int
+  now: datetime
+
+  def __post_init__(self):
+    if not 0 <= self.sitters <= self.appusers:
+      raise ValueError("sitters must be between 0 and appusers")
+    if self.inquiries and not self.sitters:
+      raise ValueError("inquiries need at least one sitter")
+
+  # appusers are sitters at evenly spaced ids, so that any shard can tell who is a sitter without coordination
+  def sitter_number(self, appuser_id: int) -> int | None:
+    number = appuser_id * self.sitters // self.appusers
+    return number if number != (appuser_id - 1) * self.sitters // self.appusers else None
+
+  def sitter_appuser_id(self, sitter_number: int) -> int:
+    return -(-sitter_number * self.appusers // self.sitters) # ceil division
+
+  def pet_count(self, appuser_id: int) -> int:
+    return 1 + mix(self.seed, appuser_id) % self.max_pets_per_appuser
+
+  # pets get fixed id slots per owner so their ids never depend on other shards
+  def pet_ids(self, appuser_id: int) -> List[int]:
+    first = (appuser_id - 1) * self.max_pets_per_appuser + 1
+    return list(range(first, first + self.pet_count(appuser_id)))
+
+class NamePools:
+  """Names and email domains drawn once from Faker, then picked per id, since calling Faker per row is too slow at this scale"""
+
+  def __init__(self, seed: int, size: int = 2000):
+    seeds.fake.seed_instance(seed)
+    seeds.fake_jp.seed_instance(seed)
+    self.first_names = [seeds.fake.first_name() for _ in range(size)]
+    self.last_names = [seeds.fake.last_name() for _ in range(size)]
+    self.domains = sorted({seeds.fake.free_email_domain() for _ in range(50)})
+    self.streets = [seeds.fake.street_address() for _ in range(size)]
+    self.zipcodes = [seeds.fake_jp.zipcode() for _ in range(size)]
+
+  def firstname(self, seed: int, appuser_id: int) -> str:
+    return self.first_names[mix(seed, appuser_id) % len(self.first_names)]
+
+  def lastname(self, seed: int, appuser_id: int) -> str:
+    return self.last_names[(mix(seed, appuser_id) >> 16) % len(self.last_names)]
+
+class RowGenerator:
+  def __init__(self, config: DatasetConfig):
+    self.config = config
+    self.names = NamePools(config.seed)
+    self.year_start = datetime(config.now.year, 1, 1, tzinfo=timezone.utc)
+    self.year_end = datetime(config.now.year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+
+  def _rng(self, table: str, shard: int) -> Random:
+    return Random(f"{self.config.seed}:{table}:{shard}")
+
+  def _between(self, rng: Random, start: datetime, end: datetime) -> datetime:
+    return start + timedelta(seconds=rng.randint(0, max(int((end - start).total_seconds()), 0)))
+
+  def _before_now(self, rng: Random) -> datetime:
+    return self._between(rng, self.year_start, self.config.now)
+
+  def _after_now(self, rng: Random) -> datetime:
+    return self._between(rng, self.config.now, self.year_end)
+
+  def appusers(self, shard: int, first_id: int, last_id: int) -> Iterator[tuple]:
+    rng = self._rng("appuser", shard)
+    seed = self.config.seed
+
+    for appuser_id in range(first_id, last_id + 1):
+      prefecture = rng.choice(locations.japan_prefectures[rng.choice(["major", "minor"])]) # same major/minor skew as seeds.py
+      firstname = self.names.firstname(seed, appuser_id)
+      lastname = self.names.lastname(seed, appuser_id)
+      domain = "@" + rng.choice(self.names.domains)
+      suffix = str(appuser_id)
+      email = (firstname.lower() + "." + lastname.lower())[:40 - len(domain) - len(suffix)] + suffix + domain
+
+      yield (
+        appuser_id, firstname, lastname, email, "%032x" % rng.getrandbits(128), float(rng.randint(1, 5)),
+        rng.choice(seeds.bios), [rng.choice(seeds.interior), rng.choice(seeds.exterior), rng.choice(seeds.yard)],
+        self._before_now(rng), self._before_now(rng), self._before_now(rng), rng.choice(seeds.people),
+        prefecture, rng.choice(locations.japan_prefectures_cities[prefecture]), rng.choice(self.names.streets), rng.choice(self.names.zipcodes),
+        rng.choice(["english", "japanese"]), rng.random() < 0.5, rng.random() < 0.5, self.config.sitter_number(appuser_id) is not None,
+      )
+
+  def sitters(self, shard: int, first_id: int, last_id: int) -> Iterator[tuple]:
+    rng = self._rng("sitter", shard)
+
+    for appuser_id in range(first_id, last_id + 1):
+      sitter_number = self.config.sitter_number(appuser_id)
+      if sitter_number is None:
+        continue
+      yield (
+        sitter_number, rng.choice(seeds.bios), [rng.choice(seeds.interior), rng.choice(seeds.exterior), rng.choice(seeds.yard)],
+        *(rng.random() < 0.5 for _ in range(8)), appuser_id,
+      )
+
+  def availabilities(self, shard: int, first_id: int, last_id: int) -> Iterator[tuple]:
+    rng = self._rng("availability", shard)
+    today = self.config.now.date()
+    horizon = 366
+    perSitter = min(self.config.availability_per_sitter, horizon)
+
+    for appuser_id in range(first_id, last_id + 1):
+      sitter_number = self.config.sitter_number(appuser_id)
+      if sitter_number is None:
+        continue
+      first = (sitter_number - 1) * perSitter + 1
+      for offset, dayOffset in enumerate(sorted(rng.sample(range(horizon), perSitter))): # distinct dates per sitter
+        yield (first + offset, appuser_id, today + timedelta(days=dayOffset))
+
+  def pets(self, shard: int, first_id: int, last_id: int) -> Iterator[tuple]:
+    rng = self._rng("pet", shard)
+    decade_start = datetime(self.config.now.year - self.config.now.year % 10, 1, 1, tzinfo=timezone.utc)
+
+    for appuser_id in range(first_id, last_id + 1):
+      for pet_id in self.config.pet_ids(appuser_id):
+        animal = rng.choice(["dog", "cat", "fish", "bird", "rabbit"])
+        posted = self._before_now(rng)
+        yield (
+          pet_id, rng.choice(seeds.top_pet_names[animal]), animal, rng.choice(seeds.animal_breeds[animal]), rng.choice(["male", "female"]),
+          float(rng.randint(1, 30)), self._between(rng, decade_start, self.config.now).date(), "None", "None", "None",
+          rng.choice(seeds.pets[animal]), [rng.choice(seeds.yard), rng.choice(seeds.exterior), rng.choice(seeds.yard)],
+          appuser_id, posted, posted, rng.choice(seeds.pet_biographies),
+        )
+
+  def inquiries(self, shard: int, first_id: int, last_id: int) -> Dict[str, Iterator[tuple]]:
+    # inquiries, their messages and their reviews are generated together from one pass over the inquiry ids
+    rng = self._rng("inquiry", shard)
+    config = self.config
+    inquiryRows, inquiryPetRows, messageRows, reviewRows = [], [], [], []
+
+    for inquiry_id in range(first_id, last_id + 1):
+      owner_id = rng.randint(1, config.appusers)
+      sitter_id = config.sitter_appuser_id(rng.randint(1, config.sitters))
+      start, end = sorted((self._before_now(rng), self._after_now(rng)))
+      status = rng.choice(["requested", "approved", "rejected"])
+      submitted = self._before_now(rng)
+      petIDs = config.pet_ids(owner_id)
+
+      inquiryRows.append((
+        inquiry_id, owner_id, sitter_id, status, start.date(), end.date(), rng.choice(["owner_house", "sitter_house", "visit"]),
+        ",".join(str(pet_id) for pet_id in petIDs), rng.choice(seeds.pet_biographies),
+        submitted, self._before_now(rng) if status != "requested" else None,
+      ))
+
+      firstInquiryPet = (inquiry_id - 1) * config.max_pets_per_appuser + 1 # fixed id slots, like pets
+      for position, pet_id in enumerate(petIDs):
+        inquiryPetRows.append((firstInquiryPet + position, inquiry_id, pet_id, position))
+
+      initiator, recipient = (owner_id, sitter_id) if inquiry_id % 2 == 0 else (sitter_id, owner_id)
+      firstMessage = (inquiry_id - 1) * config.messages_per_inquiry + 1
+      for offset in range(config.messages_per_inquiry):
+        author, to = (initiator, recipient) if offset % 2 == 0 else (recipient, initiator)
+        content = f"Hey, how are you doing, {self.names.firstname(config.seed, to)}?" if offset % 2 == 0 else f"I'm doing great! How about you, {self.names.firstname(config.seed, to)}?"
+        messageRows.append((firstMessage + offset, inquiry_id, author, to, content, submitted + timedelta(minutes=offset)))
+
+      if status == "approved":
+        for offset, (author, to, recipient_type, comments) in enumerate([(owner_id, sitter_id, "sitter", seeds.fakeOwnerCommentsList), (sitter_id, owner_id, "owner", seeds.fakeSitterCommentsList)]):
+          score = rng.randint(1, 5)
+          reviewRows.append(((inquiry_id - 1) * 2 + offset + 1, author, recipient_type, comments[score - 1], score, to, self._before_now(rng)))
+
+    return {"inquiry": iter(inquiryRows), "inquiry_pet": iter(inquiryPetRows), "message": iter(messageRows), "review": iter(reviewRows)}
+
+TABLE_COLUMNS = {
+  "appuser": APPUSER_COLUMNS,
+  "sitter": SITTER_COLUMNS,
+  "availability": AVAILABILITY_COLUMNS,
+  "pet": PET_COLUMNS,
+  "inquiry": INQUIRY_COLUMNS,
+  "inquiry_pet": INQUIRY_PET_COLUMNS,
+  "message": MESSAGE_COLUMNS,
+  "review": REVIEW_COLUMNS,
+}
+
+# each phase only references tables loaded by an earlier phase, so shards within a phase can load in parallel
+PHASES: List[Tuple[str, List[str]]] = [
+  ("appusers", ["appuser"]),
+  ("appuser_children", ["sitter", "availability", "pet"]),
+  ("inquiries", ["inquiry"]),
+]
+
+def shard_rows(generator: RowGenerator, phase: str, shard: int, first_id: int, last_id: int) -> Dict[str, Iterator[tuple]]:
+  if phase == "appusers":
+    return {"appuser": generator.appusers(shard, first_id, last_id)}
+  if phase == "appuser_children":
+    return {
+      "sitter": generator.sitters(shard, first_id, last_id),
+      "availability": generator.availabilities(shard, first_id, last_id),
+      "pet": generator.pets(shard, first_id, last_id),
+    }
+  return generator.inquiries(shard, first_id, last_id)
+
+def csv_value(value):
+  if value is None:
+    return ""
+  if isinstance(value, bool):
+    return "t" if value else "f"
+  if isinstance(value, (date, datetime)):
+    return value.isoformat()
+  if isinstance(value, list): # a postgres array literal, for the text[] picture list columns
+    return "{" + ",".join('"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"' for item in value) + "}"
+  return value
+
+def write_csv_shard(out_dir: str, table: str, shard: int, rows: Iterator[tuple]) -> int:
+  os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+  count = 0
+  with open(os.path.join(out_dir, table, f"part-{shard:05d}.csv"), "w", newline="") as out:
+    writer = csv.writer(out)
+    writer.writerow(TABLE_COLUMNS[table])
+    for row in rows:
+      writer.writerow([csv_value(value) for value in row])
+      count += 1
+  return count
+
+async def copy_shard(dsn: str, rowsByTable: Dict[str, Iterator[tuple]], batch_size: int = 50000) -> Dict[str, int]:
+  import asyncpg # type: ignore
+
+  counts = {}
+  connection = await asyncpg.connect(dsn)
+  try:
+    for table, rows in rowsByTable.items():
+      counts[table] = 0
+      batch = []
+      for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size: # streamed in batches so a shard never holds a whole table in memory
+          await connection.copy_records_to_table(table, records=batch, columns=TABLE_COLUMNS[table])
+          counts[table] += len(batch)
+          batch = []
+      if batch:
+        await connection.copy_records_to_table(table, records=batch, columns=TABLE_COLUMNS[table])
+        counts[table] += len(batch)
+  finally:
+    await connection.close()
+  return counts
+
+_worker_generator: RowGenerator | None = None
+
+def _init_worker(config: DatasetConfig):
+  global _worker_generator
+  _worker_generator = RowGenerator(config)
+
+def _run_shard(task: tuple) -> Dict[str, int]:
+  phase, shard, first_id, last_id, output_format, target = task
+  rowsByTable = shard_rows(_worker_generator, phase, shard, first_id, last_id)
+
+  if output_format == "csv":
+    return {table: write_csv_shard(target, table, shard, rows) for table, rows in rowsByTable.items()}
+  return asyncio.run(copy_shard(target, rowsByTable))
+
+def shard_tasks(config: DatasetConfig, phase: str, output_format: str, target: str) -> List[tuple]:
+  total = config.inquiries if phase == "inquiries" else config.appusers
+  return [
+    (phase, shard, first_id, min(first_id + config.shard_size - 1, total), output_format, target)
+    for shard, first_id in enumerate(range(1, total + 1, config.shard_size))
+  ]
+
+async def prepare_database(dsn: str):
+  import asyncpg # type: ignore
+
+  connection = await asyncpg.connect(dsn)
+  try:
+    for table in TABLE_COLUMNS:
+      if await connection.fetchval(f'SELECT EXISTS (SELECT 1 FROM "{table}")'):
+        raise SystemExit(f'Table "{table}" is not empty; the generator assigns ids from 1 and needs empty tables')
+  finally:
+    await connection.close()
+
+async def finish_database(dsn: str):
+  import asyncpg # type: ignore
+
+  connection = await asyncpg.connect(dsn)
+  try:
+    for table in TABLE_COLUMNS:
+      await connection.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))")
+    await connection.execute(ratings.RECOMPUTE_SQL) # the review aggregates on appuser
+    await connection.execute(availability_calendar.REBUILD_MONTHS_SQL) # the month bitmaps beside the availability rows
+  finally:
+    await connection.close()
+
+def generate(config: DatasetConfig, output_format: str, target: str, processes: int, progress: Callable[[str], None] = print) -> Dict[str, int]:
+  if output_format == "postgres":
+    asyncio.run(prepare_database(target))
+
+  totals: Dict[str, int] = {}
+  with Pool(processes=processes, initializer=_init_worker, initargs=(config,)) as pool:
+    for phase, _ in PHASES:
+      tasks = shard_tasks(config, phase, output_format, target)
+      for done, counts in enumerate(pool.imap_unordered(_run_shard, tasks), start=1):
+        for table, count in counts.items():
+          totals[table] = totals.get(table, 0) + count
+        progress(f"{phase}: {done}/{len(tasks)} shards, rows so far {totals}")
+
+  if output_format == "postgres":
+    asyncio.run(finish_database(target))
+  return totals
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--appusers", type=int, default=1_000_000)
+  parser.add_argument("--sitters", type=int, default=300_000)
+  parser.add_argument("--inquiries", type=int, default=1_000_000)
+  parser.add_argument("--messages-per-inquiry", type=int, default=10)
+  parser.add_argument("--availability-per-sitter", type=int, default=67)
+  parser.add_argument("--max-pets-per-appuser", type=int, default=3)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--shard-size", type=int, default=100_000)
+  parser.add_argument("--processes", type=int, default=os.cpu_count())
+  parser.add_argument("--format", choices=["csv", "postgres"], default="csv")
+  parser.add_argument("--out", default="dataset", help="output directory for --format csv")
+  parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="database for --format postgres (defaults to DATABASE_URL)")
+  parser.add_argument("--now", default=None, help="ISO date the dataset is generated relative to, for byte-identical reruns")
+  args = parser.parse_args()
+
+  now = datetime.fromisoformat(args.now) if args.now else datetime.now()
+  config = DatasetConfig(
+    appusers=args.appusers,
+    sitters=args.sitters,
+    inquiries=args.inquiries,
+    messages_per_inquiry=args.messages_per_inquiry,
+    availability_per_sitter=args.availability_per_sitter,
+    max_pets_per_appuser=args.max_pets_per_appuser,
+    seed=args.seed,
+    shard_size=args.shard_size,
+    now=now.replace(tzinfo=timezone.utc) if now.tzinfo is None else now,
+  )
+
+  if args.format == "postgres" and not args.dsn:
+    parser.error("--dsn or DATABASE_URL is required for --format postgres")
+
+  totals = generate(config, args.format, args.out if args.format == "csv" else args.dsn, args.processes)
+  print(f"Generated {totals}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,76 @@
+from typing import Dict
+import pet_sitter.locations as locations
+import functools
+import unicodedata
+import re
+
+# Lookup tables built once from locations.py: every accepted spelling of a prefecture or city, reduced by
+# _key(), maps to its English name. Lookups never raise; an unknown name gives None.
+
+_JAPANESE_SUFFIX = re.compile(r"(県|府|都|市|区|町|村)$")
+_ENGLISH_SUFFIX = re.compile(r"[\s\-](prefecture|city|ward|town|village|ken|fu|to|shi|ku|machi|cho|mura)$")
+_SEPARATORS = re.compile(r"[\s\-‐・']+")
+
+def _key(name: str) -> str:
+  # NFKC folds full-width letters and half-width kana, casefold the letter case; separators are ignored
+  return _SEPARATORS.sub("", unicodedata.normalize("NFKC", name).strip().casefold())
+
+def _add(table: Dict[str, str], name: str, english: str):
+  table.setdefault(_key(name), english)
+  stripped = _JAPANESE_SUFFIX.sub("", name)
+  if stripped:
+    table.setdefault(_key(stripped), english)
+
+def _build_prefectures():
+  to_english: Dict[str, str] = {}
+  to_japanese: Dict[str, str] = {}
+  for japanese, english in locations.prefecture_mapping.items():
+    _add(to_english, english, english)
+    _add(to_english, japanese, english)
+    to_japanese[english] = japanese
+  return to_english, to_japanese
+
+def _build_cities():
+  to_english: Dict[str, Dict[str, str]] = {}
+  to_japanese: Dict[str, Dict[str, str]] = {}
+  for prefecture, mapping in locations.city_mapping.items():
+    table = to_english[prefecture] = {}
+    for english, japanese in mapping.items():
+      _add(table, english, english)
+      _add(table, japanese, english)
+    to_japanese[prefecture] = dict(mapping)
+  return to_english, to_japanese
+
+_prefectures, _prefectures_japanese = _build_prefectures()
+_cities, _cities_japanese = _build_cities()
+
+def _find(table: Dict[str, str], name: str) -> str | None:
+  normalized = unicodedata.normalize("NFKC", name).strip().casefold()
+  english = table.get(_key(normalized))
+  if english is None: # retry without an administrative suffix such as 市 or -ku
+    stripped = _JAPANESE_SUFFIX.sub("", _ENGLISH_SUFFIX.sub("", normalized))
+    if stripped and stripped != normalized:
+      english = table.get(_key(stripped))
+  return english
+
+@functools.lru_cache(maxsize=1024)
+def prefecture_to_english(prefecture: str | None) -> str | None:
+  """English prefecture name for any English or Japanese spelling of it, or None when unknown"""
+  if not isinstance(prefecture, str):
+    return None
+  return _find(_prefectures, prefecture)
+
+@functools.lru_cache(maxsize=8192)
+def city_ward_to_english(city_ward: str | None, prefecture: str | None) -> str | None:
+  """English city_ward name within the prefecture (in any spelling), or None when either is unknown"""
+  if not isinstance(city_ward, str):
+    return None
+  table = _cities.get(prefecture_to_english(prefecture))
+  return _find(table, city_ward) if table else None
+
+def prefecture_to_japanese(prefecture: str | None) -> str | None:
+  return _prefectures_japanese.get(prefecture_to_english(prefecture))
+
+def city_ward_to_japanese(city_ward: str | None, prefecture: str | None) -> str | None:
+  english_prefecture = prefecture_to_english(prefecture)
+  return _cities_japanese.get(english_prefecture, {}).get(city_ward_to_english(city_ward, english_prefecture))
@@ -1295,4 +1295,615 @@ city_mapping = {
     "Nanjo": "南城",
     "Ginoza": "宜野座"
   }
-}
\ No newline at end of file
+}
+
+# approximate (latitude, longitude) of each city in japan_prefectures_cities, for proximity search. Cities that are
+# not a place in their listed prefecture (Fukuoka's Nagasaki, Shiga's Tachikawa ...) or that could not be pinned down
+# are left out rather than given another city's location: nearby search never returns sitters there, and a search
+# from one starts at its prefecture's capital. They are listed in unplaced_cities.
+city_coordinates = {
+  "Hokkaido": {
+    "Sapporo": (43.06, 141.35),
+    "Hakodate": (41.77, 140.73),
+    "Asahikawa": (43.77, 142.36),
+    "Otaru": (43.19, 141.00),
+    "Muroran": (42.32, 140.97),
+    "Kitami": (43.80, 143.89),
+    "Kushiro": (42.98, 144.38),
+    "Obihiro": (42.92, 143.20),
+    "Chitose": (42.82, 141.65),
+    "Tomakomai": (42.63, 141.60),
+    "Bihoro": (43.82, 144.10),
+    "Suttsu": (42.80, 140.23),
+    "Nakashibetsu": (43.55, 144.97),
+    "Yubari": (43.06, 141.97),
+    "Engaru": (44.06, 143.53),
+    "Shiraoi": (42.55, 141.36),
+    "Iwamizawa": (43.20, 141.76),
+    "Nakafurano": (43.41, 142.42),
+    "Tsubetsu": (43.70, 144.02),
+    "Rishiri": (45.18, 141.24),
+  },
+  "Aomori": {
+    "Aomori": (40.82, 140.74),
+    "Hachinohe": (40.51, 141.49),
+    "Hirosaki": (40.60, 140.46),
+    "Towada": (40.61, 141.21),
+    "Mutsu": (41.29, 141.18),
+    "Misawa": (40.68, 141.37),
+    "Goshogawara": (40.81, 140.44),
+    "Shichinohe": (40.74, 141.16),
+    "Kuroishi": (40.64, 140.59),
+    "Oirase": (40.60, 141.40),
+  },
+  "Iwate": {
+    "Morioka": (39.70, 141.15),
+    "Ichinoseki": (38.93, 141.13),
+    "Kamaishi": (39.28, 141.89),
+    "Oshu": (39.14, 141.14),
+    "Hanamaki": (39.39, 141.12),
+    "Miyako": (39.64, 141.96),
+    "Tono": (39.33, 141.53),
+    "Ninohe": (40.27, 141.30),
+    "Shizukuishi": (39.70, 140.98),
+    "Yamada": (39.47, 141.95),
+  },
+  "Miyagi": {
+    "Sendai": (38.27, 140.87),
+    "Ishinomaki": (38.43, 141.30),
+    "Shiogama": (38.31, 141.02),
+    "Tome": (38.69, 141.19),
+    "Kurihara": (38.73, 141.02),
+    "Shiroishi": (38.00, 140.62),
+    "Zao": (38.10, 140.66),
+    "Natori": (38.17, 140.89),
+    "Tagajo": (38.29, 141.00),
+    "Sakata": (38.91, 139.84),
+  },
+  "Akita": {
+    "Akita": (39.72, 140.10),
+    "Yokote": (39.31, 140.55),
+    "Noshiro": (40.21, 140.03),
+    "Kazuno": (40.22, 140.79),
+    "Daisen": (39.45, 140.48),
+    "Semboku": (39.70, 140.73),
+    "Mitane": (40.10, 140.03),
+    "Takanosu": (40.22, 140.37),
+    "Odate": (40.27, 140.56),
+  },
+  "Yamagata": {
+    "Yamagata": (38.24, 140.36),
+    "Yonezawa": (37.92, 140.12),
+    "Tendo": (38.36, 140.38),
+    "Zao": (38.17, 140.40),
+    "Kaminoyama": (38.15, 140.27),
+    "Sagae": (38.38, 140.27),
+    "Murayama": (38.48, 140.38),
+    "Shinjo": (38.76, 140.30),
+    "Nanyo": (38.05, 140.15),
+  },
+  "Fukushima": {
+    "Fukushima": (37.76, 140.47),
+    "Koriyama": (37.40, 140.36),
+    "Aizuwakamatsu": (37.49, 139.93),
+    "Shirakawa": (37.13, 140.21),
+    "Kawamata": (37.67, 140.60),
+    "Ishikawa": (37.16, 140.45),
+    "Soma": (37.80, 140.92),
+    "Minamisoma": (37.64, 140.96),
+    "Nihonmatsu": (37.58, 140.43),
+    "Tadami": (37.35, 139.32),
+  },
+  "Ibaraki": {
+    "Mito": (36.37, 140.47),
+    "Tsukuba": (36.08, 140.11),
+    "Hitachi": (36.60, 140.65),
+    "Kashima": (35.97, 140.64),
+    "Sakuragawa": (36.33, 140.09),
+    "Naka": (36.46, 140.49),
+    "Koga": (36.18, 139.76),
+    "Hitachiota": (36.54, 140.53),
+    "Tsuchiura": (36.08, 140.20),
+    "Oarai": (36.31, 140.57),
+  },
+  "Tochigi": {
+    "Utsunomiya": (36.56, 139.88),
+    "Ashikaga": (36.34, 139.45),
+    "Nikko": (36.72, 139.70),
+    "Sano": (36.31, 139.58),
+    "Nakagawa": (36.74, 140.17),
+    "Kanuma": (36.57, 139.75),
+    "Moka": (36.44, 140.01),
+    "Kuroiso": (36.97, 140.06),
+  },
+  "Gunma": {
+    "Maebashi": (36.39, 139.06),
+    "Takasaki": (36.32, 139.00),
+    "Isesaki": (36.31, 139.20),
+    "Kiryu": (36.41, 139.33),
+    "Tatebayashi": (36.25, 139.54),
+    "Numata": (36.65, 139.04),
+    "Ota": (36.29, 139.38),
+    "Shibukawa": (36.49, 139.00),
+    "Minakami": (36.68, 138.97),
+    "Fujioka": (36.26, 139.07),
+  },
+  "Saitama": {
+    "Saitama": (35.86, 139.65),
+    "Kawaguchi": (35.81, 139.72),
+    "Koshigaya": (35.89, 139.79),
+    "Omiya": (35.91, 139.63),
+    "Kasukabe": (35.98, 139.75),
+    "Urawa": (35.86, 139.66),
+    "Kawagoe": (35.93, 139.49),
+    "Higashimatsuyama": (36.04, 139.40),
+    "Soka": (35.83, 139.81),
+    "Ageo": (35.98, 139.59),
+  },
+  "Chiba": {
+    "Chiba": (35.61, 140.12),
+    "Narita": (35.78, 140.32),
+    "Matsudo": (35.79, 139.90),
+    "Kashiwa": (35.87, 139.98),
+    "Funabashi": (35.69, 139.98),
+    "Ichikawa": (35.72, 139.93),
+    "Sakura": (35.72, 140.22),
+    "Tateyama": (34.99, 139.87),
+    "Urayasu": (35.65, 139.90),
+    "Kamagaya": (35.78, 140.00),
+  },
+  "Tokyo": {
+    "Shinjuku": (35.69, 139.70),
+    "Shibuya": (35.66, 139.70),
+    "Chiyoda": (35.69, 139.75),
+    "Setagaya": (35.65, 139.65),
+    "Ikebukuro": (35.73, 139.71),
+    "Ota": (35.56, 139.72),
+    "Toshima": (35.73, 139.72),
+    "Koto": (35.67, 139.82),
+    "Bunkyo": (35.71, 139.75),
+    "Edogawa": (35.71, 139.87),
+    "Sumida": (35.71, 139.80),
+    "Chuo": (35.67, 139.77),
+    "Arakawa": (35.74, 139.78),
+    "Adachi": (35.78, 139.80),
+    "Nakano": (35.71, 139.66),
+    "Suginami": (35.70, 139.64),
+    "Meguro": (35.64, 139.70),
+    "Kita": (35.75, 139.73),
+    "Taito": (35.71, 139.78),
+  },
+  "Kanagawa": {
+    "Yokohama": (35.44, 139.64),
+    "Kawasaki": (35.53, 139.70),
+    "Sagamihara": (35.57, 139.37),
+    "Odawara": (35.26, 139.16),
+    "Yokosuka": (35.28, 139.67),
+    "Fujisawa": (35.34, 139.49),
+    "Chigasaki": (35.33, 139.40),
+    "Zushi": (35.30, 139.58),
+    "Atsugi": (35.44, 139.36),
+    "Kamakura": (35.32, 139.55),
+    "Minamiashigara": (35.32, 139.10),
+    "Hayama": (35.27, 139.59),
+    "Totsuka": (35.40, 139.53),
+    "Hadano": (35.37, 139.22),
+    "Ebina": (35.45, 139.39),
+    "Isehara": (35.40, 139.31),
+    "Miura": (35.14, 139.62),
+    "Sakae": (35.36, 139.55),
+    "Tama": (35.62, 139.56),
+  },
+  "Niigata": {
+    "Niigata": (37.92, 139.04),
+    "Joetsu": (37.15, 138.24),
+    "Nagaoka": (37.45, 138.85),
+    "Tsubame": (37.67, 138.88),
+    "Sanjo": (37.64, 138.96),
+    "Murakami": (38.22, 139.48),
+    "Sado": (38.02, 138.37),
+    "Niitsu": (37.80, 139.12),
+    "Agano": (37.83, 139.23),
+    "Kamo": (37.67, 139.04),
+  },
+  "Toyama": {
+    "Toyama": (36.70, 137.21),
+    "Takaoka": (36.75, 137.02),
+    "Uozu": (36.83, 137.41),
+    "Fushiki": (36.79, 137.06),
+    "Imizu": (36.73, 137.08),
+    "Nanto": (36.56, 136.88),
+    "Tonami": (36.65, 136.96),
+    "Kurobe": (36.87, 137.45),
+    "Shinminato": (36.78, 137.09),
+    "Kamiichi": (36.70, 137.36),
+  },
+  "Ishikawa": {
+    "Kanazawa": (36.56, 136.66),
+    "Wajima": (37.39, 136.90),
+    "Tsubata": (36.67, 136.73),
+    "Nonoichi": (36.52, 136.61),
+    "Suematsu": (36.51, 136.60),
+    "Shika": (37.01, 136.78),
+    "Hakusan": (36.51, 136.57),
+    "Kaga": (36.30, 136.31),
+    "Anamizu": (37.23, 136.91),
+  },
+  "Fukui": {
+    "Fukui": (36.06, 136.22),
+    "Sakai": (36.17, 136.23),
+    "Echizen": (35.97, 136.13), # Echizen town; Echizen city is listed by its centre, Takefu
+    "Takahama": (35.49, 135.55),
+    "Ono": (35.98, 136.49),
+    "Katsuyama": (36.06, 136.50),
+    "Obama": (35.50, 135.75),
+    "Sabae": (35.96, 136.19),
+    "Takefu": (35.90, 136.17),
+  },
+  "Yamanashi": {
+    "Kofu": (35.66, 138.57),
+    "Fujiyoshida": (35.49, 138.81),
+    "Minami Alps": (35.61, 138.46),
+    "Katsunuma": (35.66, 138.73),
+    "Yamanashi": (35.69, 138.69),
+    "Fujikawaguchiko": (35.50, 138.76),
+    "Nirasaki": (35.71, 138.45),
+    "Nanbu": (35.29, 138.45),
+  },
+  "Nagano": {
+    "Nagano": (36.65, 138.19),
+    "Matsumoto": (36.24, 137.97),
+    "Suwa": (36.04, 138.11),
+    "Shiojiri": (36.12, 137.95),
+    "Iida": (35.51, 137.82),
+    "Karuizawa": (36.35, 138.60),
+    "Ueda": (36.40, 138.25),
+    "Okaya": (36.07, 138.05),
+    "Azumino": (36.30, 137.91),
+  },
+  "Gifu": {
+    "Gifu": (35.42, 136.76),
+    "Takayama": (36.15, 137.25),
+    "Ogaki": (35.36, 136.61),
+    "Kakamigahara": (35.40, 136.86),
+    "Seki": (35.50, 136.92),
+    "Gero": (35.81, 137.24),
+    "Tarui": (35.37, 136.53),
+    "Toki": (35.35, 137.18),
+    "Minokamo": (35.44, 137.02),
+  },
+  "Shizuoka": {
+    "Shizuoka": (34.98, 138.38),
+    "Hamamatsu": (34.71, 137.73),
+    "Numazu": (35.10, 138.86),
+    "Fujinomiya": (35.22, 138.62),
+    "Kakegawa": (34.77, 138.01),
+    "Mishima": (35.12, 138.92),
+    "Ito": (34.97, 139.10),
+    "Fujieda": (34.87, 138.26),
+    "Iwata": (34.72, 137.85),
+    "Toyohashi": (34.77, 137.39),
+  },
+  "Aichi": {
+    "Nagoya": (35.18, 136.91),
+    "Toyota": (35.08, 137.16),
+    "Okazaki": (34.95, 137.17),
+    "Ichinomiya": (35.30, 136.80),
+    "Nagakute": (35.18, 137.05),
+    "Toyokawa": (34.83, 137.38),
+    "Seto": (35.22, 137.08),
+    "Kariya": (34.99, 137.00),
+    "Tahara": (34.67, 137.26),
+    "Anjo": (34.96, 137.08),
+    "Gamou": (34.83, 137.22),
+    "Nishio": (34.86, 137.06),
+    "Inazawa": (35.25, 136.78),
+    "Togo": (35.10, 137.05),
+    "Shinshiro": (34.90, 137.50),
+    "Aisai": (35.15, 136.73),
+    "Komaki": (35.29, 136.91),
+  },
+  "Mie": {
+    "Tsu": (34.72, 136.51),
+    "Ise": (34.49, 136.71),
+    "Yokkaichi": (34.97, 136.62),
+    "Kameyama": (34.86, 136.45),
+    "Iga": (34.77, 136.13),
+    "Shima": (34.33, 136.84),
+    "Owase": (34.07, 136.19),
+    "Kuwana": (35.06, 136.68),
+    "Taki": (34.50, 136.55),
+  },
+  "Shiga": {
+    "Otsu": (35.02, 135.85),
+    "Kusatsu": (35.02, 135.96),
+    "Hikone": (35.27, 136.26),
+    "Omihachiman": (35.13, 136.10),
+    "Koka": (34.97, 136.17),
+    "Inuyama": (35.38, 136.94),
+    "Yasu": (35.07, 136.03),
+    "Nagahama": (35.38, 136.27),
+  },
+  "Kyoto": {
+    "Kyoto": (35.01, 135.77),
+    "Uji": (34.88, 135.80),
+    "Kameoka": (35.01, 135.57),
+    "Maizuru": (35.47, 135.39),
+    "Fushimi": (34.94, 135.76),
+    "Nagaokakyo": (34.93, 135.70),
+    "Kizugawa": (34.74, 135.82),
+    "Kyotanabe": (34.81, 135.77),
+    "Seika": (34.76, 135.79),
+    "Sakyo": (35.05, 135.79),
+    "Joyo": (34.85, 135.78),
+    "Wazuka": (34.82, 135.91),
+    "Nantan": (35.11, 135.48),
+    "Oyamazaki": (34.90, 135.69),
+    "Mukaijima": (34.92, 135.77),
+  },
+  "Osaka": {
+    "Osaka": (34.69, 135.50),
+    "Sakai": (34.57, 135.48),
+    "Takaishi": (34.52, 135.44),
+    "Hirakata": (34.81, 135.65),
+    "Toyonaka": (34.78, 135.47),
+    "Takatsuki": (34.85, 135.62),
+    "Ibaraki": (34.82, 135.57),
+    "Suita": (34.76, 135.52),
+    "Daito": (34.71, 135.62),
+    "Suminoe": (34.61, 135.48),
+    "Ikeda": (34.82, 135.43),
+    "Settsu": (34.78, 135.56),
+    "Kadoma": (34.74, 135.59),
+    "Kishiwada": (34.46, 135.37),
+    "Kawachinagano": (34.45, 135.56),
+    "Osakasayama": (34.50, 135.56),
+    "Minoh": (34.83, 135.47),
+    "Sumoto": (34.34, 134.90),
+    "Tondabayashi": (34.50, 135.60),
+  },
+  "Hyogo": {
+    "Kobe": (34.69, 135.20),
+    "Himeji": (34.82, 134.69),
+    "Amagasaki": (34.73, 135.41),
+    "Takarazuka": (34.80, 135.36),
+    "Nishinomiya": (34.74, 135.34),
+    "Sanda": (34.89, 135.23),
+    "Toyooka": (35.54, 134.82),
+    "Tatsuno": (34.86, 134.55),
+    "Minamiawaji": (34.27, 134.78),
+  },
+  "Nara": {
+    "Nara": (34.69, 135.80),
+    "Yamatokoriyama": (34.65, 135.78),
+    "Sakurai": (34.52, 135.84),
+    "Tenri": (34.60, 135.84),
+    "Kashihara": (34.51, 135.79),
+    "Ikoma": (34.69, 135.70),
+    "Koryo": (34.56, 135.75),
+    "Heguri": (34.63, 135.70),
+    "Gose": (34.46, 135.74),
+    "Sango": (34.60, 135.70),
+  },
+  "Wakayama": {
+    "Wakayama": (34.23, 135.17),
+    "Shingu": (33.72, 135.99),
+    "Kainan": (34.16, 135.21),
+    "Tanabe": (33.73, 135.38),
+    "Arida": (34.08, 135.13),
+    "Gobo": (33.89, 135.15),
+    "Kihoku": (34.27, 135.40),
+    "Kozagawa": (33.58, 135.81),
+    "Yura": (33.96, 135.12),
+  },
+  "Tottori": {
+    "Tottori": (35.50, 134.24),
+    "Kurayoshi": (35.43, 133.82),
+    "Yonago": (35.43, 133.33),
+    "Sakaiminato": (35.54, 133.23),
+    "Hojyo": (35.50, 133.77),
+    "Koyama": (35.52, 134.19),
+  },
+  "Shimane": {
+    "Matsue": (35.47, 133.05),
+    "Izumo": (35.37, 132.75),
+    "Unnan": (35.31, 132.90),
+    "Hamada": (34.90, 132.08),
+    "Oki": (36.21, 133.32),
+    "Masuda": (34.67, 131.84),
+    "Mihonoseki": (35.56, 133.30),
+    "Yatsuka": (35.50, 133.17),
+    "Taki": (35.28, 132.63),
+  },
+  "Okayama": {
+    "Okayama": (34.66, 133.93),
+    "Kurashiki": (34.58, 133.77),
+    "Tamano": (34.49, 133.95),
+    "Sanyo": (34.72, 134.00),
+    "Kibichuo": (34.86, 133.69),
+    "Mimasaka": (35.01, 134.15),
+    "Osafune": (34.69, 134.10),
+    "Seto": (34.75, 134.05),
+    "Bizen": (34.75, 134.19),
+  },
+  "Hiroshima": {
+    "Hiroshima": (34.39, 132.46),
+    "Kure": (34.25, 132.57),
+    "Fukuyama": (34.49, 133.36),
+    "Onomichi": (34.41, 133.20),
+    "Takehara": (34.34, 132.91),
+    "Miyoshi": (34.81, 132.85),
+    "Mihara": (34.40, 133.08),
+    "Akiota": (34.57, 132.23),
+    "Saeki": (34.36, 132.36),
+    "Hatsukaichi": (34.35, 132.33),
+  },
+  "Yamaguchi": {
+    "Yamaguchi": (34.18, 131.47),
+    "Shimonoseki": (33.96, 130.94),
+    "Ube": (33.95, 131.25),
+    "Shuho": (34.05, 131.31),
+    "Iwakuni": (34.17, 132.22),
+    "Hofu": (34.05, 131.56),
+    "Yoshiki": (34.12, 131.45),
+    "Sanyo": (34.00, 131.18),
+    "Tabuse": (33.95, 132.04),
+    "Kudamatsu": (34.02, 131.87),
+  },
+  "Tokushima": {
+    "Tokushima": (34.07, 134.55),
+    "Anan": (33.92, 134.66),
+    "Mugi": (33.67, 134.42),
+    "Komatsu": (34.00, 134.59),
+    "Awa": (34.10, 134.30),
+    "Toba": (34.48, 136.84),
+    "Nio": (34.21, 133.63),
+  },
+  "Kagawa": {
+    "Takamatsu": (34.34, 134.05),
+    "Marugame": (34.29, 133.80),
+    "Tobe": (34.27, 133.75),
+    "Sakaide": (34.32, 133.86),
+    "Kanonji": (34.13, 133.66),
+    "Mitoyo": (34.18, 133.72),
+    "Sanuki": (34.32, 134.17),
+    "Zentsuji": (34.23, 133.79),
+    "Kotohira": (34.19, 133.82),
+  },
+  "Ehime": {
+    "Matsuyama": (33.84, 132.77),
+    "Imabari": (34.07, 133.00),
+    "Niihama": (33.96, 133.28),
+    "Uwajima": (33.22, 132.56),
+    "Shikokuchuo": (33.98, 133.55),
+    "Ozu": (33.51, 132.54),
+    "Saijyo": (33.92, 133.18),
+    "Tobe": (33.75, 132.79),
+    "Yawatahama": (33.46, 132.42),
+    "Matsuno": (33.23, 132.71),
+  },
+  "Kochi": {
+    "Kochi": (33.56, 133.53),
+    "Nankoku": (33.58, 133.64),
+    "Niyodogawa": (33.57, 133.14),
+    "Aki": (33.50, 133.90),
+    "Sukumo": (32.92, 132.73),
+    "Konan": (33.56, 133.70),
+    "Mihara": (32.91, 132.85),
+    "Tosa": (33.50, 133.43),
+  },
+  "Fukuoka": {
+    "Fukuoka": (33.59, 130.40),
+    "Kitakyushu": (33.88, 130.88),
+    "Kurume": (33.32, 130.51),
+    "Koga": (33.73, 130.47),
+    "Onojo": (33.54, 130.48),
+    "Chikuzen": (33.46, 130.60),
+    "Dazaifu": (33.51, 130.52),
+    "Yame": (33.21, 130.56),
+    "Yanagawa": (33.16, 130.41),
+  },
+  "Saga": {
+    "Saga": (33.26, 130.30),
+    "Karatsu": (33.45, 129.97),
+    "Imari": (33.26, 129.88),
+    "Tosu": (33.38, 130.51),
+    "Shiroishi": (33.18, 130.14),
+    "Ureshino": (33.13, 129.99),
+    "Takeo": (33.19, 130.02),
+  },
+  "Nagasaki": {
+    "Nagasaki": (32.75, 129.88),
+    "Sasebo": (33.18, 129.72),
+    "Isahaya": (32.84, 130.05),
+    "Taku": (33.29, 130.11),
+    "Unzen": (32.75, 130.26),
+    "Shimabara": (32.79, 130.37),
+    "Omura": (32.90, 129.96),
+    "Nagayo": (32.83, 129.88),
+    "Goto": (32.70, 128.84),
+  },
+  "Kumamoto": {
+    "Kumamoto": (32.80, 130.71),
+    "Yatsushiro": (32.51, 130.60),
+    "Amakusa": (32.46, 130.19),
+    "Kikuchi": (32.98, 130.81),
+    "Arao": (32.99, 130.43),
+    "Hitoyoshi": (32.21, 130.76),
+    "Uto": (32.69, 130.66),
+    "Takamori": (32.83, 131.12),
+    "Kosa": (32.64, 130.81),
+    "Kamimashiki": (32.72, 130.88),
+  },
+  "Oita": {
+    "Oita": (33.24, 131.61),
+    "Beppu": (33.28, 131.49),
+    "Nakatsu": (33.60, 131.19),
+    "Usa": (33.53, 131.35),
+    "Saiki": (32.96, 131.90),
+    "Hita": (33.32, 130.94),
+    "Kokonoe": (33.23, 131.19),
+    "Taketa": (32.97, 131.40),
+    "Kunisaki": (33.56, 131.73),
+    "Bungotakada": (33.56, 131.45),
+  },
+  "Miyazaki": {
+    "Miyazaki": (31.91, 131.42),
+    "Nichinan": (31.60, 131.38),
+    "Kobayashi": (31.99, 130.97),
+    "Nobeoka": (32.58, 131.67),
+    "Saito": (32.11, 131.40),
+    "Hyuga": (32.42, 131.62),
+    "Mimata": (31.73, 131.13),
+    "Ebino": (32.05, 130.81),
+    "Takanabe": (32.13, 131.50),
+  },
+  "Kagoshima": {
+    "Kagoshima": (31.60, 130.56),
+    "Kanoya": (31.38, 130.85),
+    "Izumi": (32.09, 130.35),
+    "Satsumasendai": (31.81, 130.30),
+    "Makurazaki": (31.27, 130.30),
+    "Koshikijima": (31.83, 129.88),
+    "Kirishima": (31.74, 130.76),
+    "Amami": (28.38, 129.49),
+    "Tarumizu": (31.49, 130.70),
+  },
+  "Okinawa": {
+    "Naha": (26.21, 127.68),
+    "Okinawa": (26.33, 127.80),
+    "Nago": (26.59, 127.98),
+    "Kadena": (26.36, 127.75),
+    "Uruma": (26.38, 127.86),
+    "Itoman": (26.12, 127.67),
+    "Motobu": (26.66, 127.90),
+    "Onna": (26.50, 127.85),
+    "Nanjo": (26.16, 127.77),
+    "Ginoza": (26.48, 127.97),
+  },
+}
+
+unplaced_cities = {
+  "Akita": ["Inaba"],
+  "Tochigi": ["Tama", "Tatebayashi"],
+  "Ishikawa": ["Takaoka"],
+  "Fukui": ["Awano"],
+  "Yamanashi": ["Tomi", "Fujinomiya"],
+  "Gifu": ["Ichinomiya"],
+  "Aichi": ["Aichi", "Tojo", "Mikawa"],
+  "Mie": ["Kashihara"],
+  "Shiga": ["Tachikawa", "Minami-Kyoto"],
+  "Kyoto": ["Ibaraki"],
+  "Osaka": ["Amagasaki"],
+  "Hyogo": ["Kozu"],
+  "Tottori": ["Tatsuno", "Bunroku", "Kamo"],
+  "Shimane": ["Kara"],
+  "Okayama": ["Fukuda"],
+  "Tokushima": ["Tatsuno", "Takamatsu", "Zentsuji"],
+  "Kagawa": ["Tamaoka"],
+  "Kochi": ["Ooka"],
+  "Fukuoka": ["Nagasaki"],
+  "Saga": ["Kawasaki", "Kudoyama"],
+  "Nagasaki": ["Yukawa"],
+  "Miyazaki": ["Kirishima"],
+}
@@ -1,46 +1,121 @@
-from random import randint
-from typing import List
-from fastapi import FastAPI, HTTPException, Request, status, Depends, WebSocket, WebSocketDisconnect # type: ignore
+import time
+_import_started = time.perf_counter()
+
+from typing import Dict, List
+from contextlib import contextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, status, Depends, Query, WebSocket, WebSocketDisconnect # type: ignore
 import uvicorn # type: ignore
 from tortoise import Tortoise # type: ignore
+from tortoise.expressions import Q, Subquery # type: ignore
+from tortoise.transactions import in_transaction # type: ignore
 from dotenv import load_dotenv # type: ignore
 import os
 import pet_sitter.models as models
 import pet_sitter.basemodels as basemodels
-import pet_sitter.seeds as seeds
+import pet_sitter.migrations as migrations
+import pet_sitter.proximity as proximity
+import pet_sitter.availability_calendar as availability_calendar
+import pet_sitter.ratings as ratings
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from datetime import datetime
+from fastapi.encoders import jsonable_encoder # type: ignore
+from pydantic import ValidationError # type: ignore
+from datetime import datetime, date, timedelta
+import functools
+import asyncio
+import bisect
+import secrets
+import heapq
+import threading
+import logging
 import base64
 import json
-import pet_sitter.locations as locations
-from pet_sitter.messaging import inquiry_messages_manager
+from pet_sitter.messaging import inquiry_messages_manager, create_message_broker, message_payload
+from pet_sitter.authentication import VerifiedTokenCache, TokenRevocationChecker, TokenVerifier, TokenVerificationTimeout, SigningKeyStore, SigningKeysUnavailable, UnknownSigningKeyError, AppuserIdCache
+from pet_sitter.sitter_index import sitter_index, capability_mask, flags_mask, RankingWeights, ranking_score, top_k
+from pet_sitter.search_cache import create_search_cache, search_cache_key
+from pet_sitter.pet_feed import pet_feed
 
 load_dotenv()
 
-fb_cred_raw = json.loads(base64.b64decode(os.getenv("FIREBASE_CREDENTIALS")).decode())
-fb_cred = credentials.Certificate(fb_cred_raw)
+logger = logging.getLogger(__name__)
+
+# milliseconds spent in each startup phase, reported by /health
+startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def timed_phase(name: str):
+  started = time.perf_counter()
+  try:
+    yield
+  finally:
+    startup_timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+@functools.lru_cache(maxsize=None)
+def firebase_credentials() -> dict | None:
+  encoded = os.getenv("FIREBASE_CREDENTIALS")
+  if not encoded:
+    return None
+  return json.loads(base64.b64decode(encoded).decode())
+
+_firebase_app_lock = threading.Lock()
+
+# firebase_admin is initialized on first use rather than at import, so a worker without credentials still boots
+def ensure_firebase_app():
+  with _firebase_app_lock:
+    try:
+      return firebase_admin.get_app()
+    except ValueError: # no default app yet
+      pass
+
+    fb_cred_raw = firebase_credentials()
+    if fb_cred_raw is None:
+      raise RuntimeError("FIREBASE_CREDENTIALS is not set")
+
+    with timed_phase("firebase"):
+      return firebase_admin.initialize_app(credentials.Certificate(fb_cred_raw))
+
+router = APIRouter()
 
-firebase_admin.initialize_app(fb_cred)
+verified_token_cache = VerifiedTokenCache(max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "4096")))
+signing_key_store = SigningKeyStore(
+  project_id=os.getenv("FIREBASE_PROJECT_ID"), # falls back to the credentials' project_id at startup
+  key_file=os.getenv("FIREBASE_SIGNING_KEYS_FILE"),
+)
+appuser_id_cache = AppuserIdCache(max_entries=int(os.getenv("APPUSER_ID_CACHE_MAX_ENTRIES", "16384")))
+use_sitter_index = os.getenv("SITTER_INDEX", "on").lower() != "off"
+search_cache = create_search_cache(
+  os.getenv("SEARCH_CACHE", "memory"),
+  ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "60")),
+  max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048")),
+)
 
-app = FastAPI()
+# the time before which uid's ID tokens were revoked, in seconds; a deleted user's tokens are all revoked
+def lookup_tokens_valid_after_blocking(uid: str) -> float | None:
+  ensure_firebase_app()
+  try:
+    return (auth.get_user(uid).tokens_valid_after_timestamp or 0) / 1000
+  except auth.UserNotFoundError:
+    return float("inf")
 
-origins = [
-  os.getenv("FRONTEND_BASE_URL"),
-  "http://localhost:5173",
-]
+token_revocation_checker = TokenRevocationChecker(
+  lookup_tokens_valid_after_blocking,
+  interval=float(os.getenv("TOKEN_REVOCATION_CHECK_SECONDS", "60")),
+)
 
-app.add_middleware(
-  CORSMiddleware,
-  allow_origins=origins,
-  allow_credentials=True,
-  allow_methods=["*"],
-  allow_headers=["*"],
+# every verification checks against the key store's certificates, whose fetches are shared by all of them
+token_verifier = TokenVerifier(
+  signing_key_store.verify,
+  max_workers=int(os.getenv("TOKEN_VERIFY_WORKERS", "4")),
+  max_concurrency=int(os.getenv("TOKEN_VERIFY_MAX_CONCURRENCY", "16")),
+  timeout=float(os.getenv("TOKEN_VERIFY_TIMEOUT_SECONDS", "5")),
 )
 
 async def verify_firebase_token(request: Request):
-  auth_header = request.headers.get("Authorization")
+  return await verify_authorization_header(request.headers.get("Authorization"))
+
+async def verify_authorization_header(auth_header: str | None):
   if not auth_header:
       raise HTTPException(
           status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,7 +130,17 @@ async def verify_firebase_token(request: Request):
               detail="Invalid authentication scheme.",
               headers={"WWW-Authenticate": "Bearer"},
           )
-      decoded_token = auth.verify_id_token(id_token)
+      decoded_token = verified_token_cache.get(id_token)
+      if decoded_token is None:
+        await signing_key_store.ensure_ready()
+        try:
+          decoded_token = await token_verifier.verify(id_token)
+        except UnknownSigningKeyError:
+          if not await signing_key_store.refresh_for_unknown_key():
+            raise
+          decoded_token = await token_verifier.verify(id_token)
+        validUntil = await token_revocation_checker.check(decoded_token)
+        verified_token_cache.put(id_token, decoded_token, validUntil) # re-verified once its revocation check is due
       return decoded_token
   except ValueError:
       raise HTTPException(
@@ -69,6 +154,18 @@ async def verify_firebase_token(request: Request):
           detail="Invalid ID token.",
           headers={"WWW-Authenticate": "Bearer"},
       )
+  except TokenVerificationTimeout:
+      raise HTTPException(
+          status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+          detail="Authentication service timed out.",
+          headers={"Retry-After": "1"},
+      )
+  except SigningKeysUnavailable:
+      raise HTTPException(
+          status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+          detail="Authentication service unavailable.",
+          headers={"Retry-After": str(int(signing_key_store.min_refresh_interval))},
+      )
   except Exception as e:
       raise HTTPException(
           status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,11 +173,47 @@ async def verify_firebase_token(request: Request):
           headers={"WWW-Authenticate": "Bearer"},
       )
 
-@app.get("/") 
+@router.get("/") 
 async def main_route():     
   return "Welcome to Mugi! むぎへようこそ！"
 
-@app.post("/signup", status_code=201, responses={401: {"description": "Email mismatch."}, 400: {"description": "User already exists in the database."}, 500: {"description": "Failed to Add User"}}) 
+@router.get("/health", status_code=200)
+async def health_check():
+  return {"status": "ok", "startup_ms": startup_timings}
+
+@router.get("/metrics", status_code=200)
+async def get_metrics():
+  return {
+    "search_cache": await search_cache.stats() if search_cache else None,
+    "sitter_index": sitter_index.stats(),
+    "pet_feed": pet_feed.stats(),
+    "messaging": inquiry_messages_manager.stats(),
+    "token_cache": verified_token_cache.stats(),
+    "token_revocations": token_revocation_checker.stats(),
+    "appuser_id_cache": appuser_id_cache.stats(),
+    "signing_keys": signing_key_store.stats(),
+  }
+
+admin_token = os.getenv("ADMIN_TOKEN")
+
+# the admin routes below only exist for callers presenting ADMIN_TOKEN as X-Admin-Token, and act on the worker that serves them
+async def require_admin_token(request: Request):
+  if not admin_token or not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token):
+    raise HTTPException(status_code=404, detail="Not Found")
+
+@router.get("/admin/sitter-index", status_code=200, responses={404: {"description": "Not Found"}}, dependencies=[Depends(require_admin_token)])
+async def check_sitter_index():
+  return {**await sitter_index.check(), **sitter_index.stats()}
+
+@router.post("/admin/sitter-index/rebuild", status_code=200, responses={404: {"description": "Not Found"}, 500: {"description": "Failed to Rebuild Sitter Index"}}, dependencies=[Depends(require_admin_token)])
+async def rebuild_sitter_index():
+  try:
+    await sitter_index.rebuild()
+  except Exception as e:
+    raise HTTPException(status_code=500, detail=f'Failed to Rebuild Sitter Index: {str(e)}')
+  return sitter_index.stats()
+
+@router.post("/signup", status_code=201, responses={401: {"description": "Email mismatch."}, 400: {"description": "User already exists in the database."}, 500: {"description": "Failed to Add User"}}) 
 async def sign_user_up(reqBody: basemodels.SignUpBody, decoded_token: dict = Depends(verify_firebase_token)):  
   if decoded_token.get('email') != reqBody.email:
       raise HTTPException(status_code=401, detail="Email mismatch.")
@@ -95,6 +228,8 @@ async def sign_user_up(reqBody: basemodels.SignUpBody, decoded_token: dict = Dep
   )
       
   if appuser:      
+      appuser_id_cache.invalidate(decoded_token['uid'])
+      appuser_id_cache.put(decoded_token['uid'], appuser.id)
       return {"status":"ok", "appuser": basemodels.FullAppuserResponseObject.from_orm(appuser)}
   else:
       raise HTTPException(status_code=500, detail='Failed to Add User')
@@ -106,18 +241,39 @@ def check_logged_in(decoded_token: dict):
     if not email or not uid: # no email or UID found in the token
         raise HTTPException(status_code=401, detail="Must Be Logged In")
     
-def check_is_authorized(decoded_token: dict, requestedUserFirebaseID):
-  if decoded_token['uid'] != requestedUserFirebaseID: # the calling user is not the same as the user whose properties are being targeted by the action
-    raise HTTPException(status_code=403, detail="User Not Authorized")
-
-async def check_is_authorized_for_inquiry(decoded_token: dict, ownerID, sitterID):
+# resolves the calling user's Appuser id from their token, at most one query per uid until the cache evicts it
+async def get_caller_appuser_id(decoded_token: dict = Depends(verify_firebase_token)) -> int | None:
   uid = decoded_token.get('uid')
-  appuser = await models.Appuser.filter(firebase_user_id=uid).first()
+  if not uid:
+    return None
+
+  appuser_id = appuser_id_cache.get(uid)
+  if appuser_id is None:
+    appuser_id = await models.Appuser.filter(firebase_user_id=uid).first().values_list("id", flat=True)
+    if appuser_id is not None: # unknown uids are not cached so that a later signup is picked up
+      appuser_id_cache.put(uid, appuser_id)
 
-  if appuser.id != ownerID and appuser.id != sitterID: #the calling user is neither the inquiry's owner_appuser nor the inquiry's sitter_appuser
+  return appuser_id
+
+def check_is_authorized(callerAppuserID: int | None, requestedAppuserID: int):
+  if callerAppuserID is None or callerAppuserID != requestedAppuserID: # the calling user is not the same as the user whose properties are being targeted by the action
+    raise HTTPException(status_code=403, detail="User Not Authorized")
+
+def check_is_authorized_for_inquiry(callerAppuserID: int | None, ownerID: int, sitterID: int):
+  if callerAppuserID is None or (callerAppuserID != ownerID and callerAppuserID != sitterID): #the calling user is neither the inquiry's owner_appuser nor the inquiry's sitter_appuser
     raise HTTPException(status_code=403, detail="User Not Authorized")
+
+# drops the cached sitter searches of the prefectures a changed sitter was or now is in
+async def invalidate_sitter_search(*prefectures: str | None):
+  if search_cache:
+    await search_cache.invalidate(*prefectures)
+
+async def invalidate_sitter_search_for(appuser_id: int):
+  prefecture = await models.Appuser.filter(id=appuser_id, is_sitter=True).first().values_list("prefecture", flat=True)
+  if prefecture is not None:
+    await invalidate_sitter_search(prefecture)
     
-@app.post("/login", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={401: {"description": "Invalid token data."}, 404: {"description": "User Not Found"}}) 
+@router.post("/login", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={401: {"description": "Invalid token data."}, 404: {"description": "User Not Found"}}) 
 async def log_user_in(decoded_token: dict = Depends(verify_firebase_token)):  
     email = decoded_token.get('email')
     uid = decoded_token.get('uid')
@@ -129,12 +285,15 @@ async def log_user_in(decoded_token: dict = Depends(verify_firebase_token)):
     if user:
         user.last_login = datetime.now()
         await user.save()
+        sitter_index.update_appuser(user) # last_login feeds ranked sitter search
+        if user.is_sitter:
+          await invalidate_sitter_search(user.prefecture)
     
         return user
     else:
         raise HTTPException(status_code=404, detail='User Not Found')
-  
-@app.get("/appuser/{id}", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={404: {"description": "Appuser Not Found"}}) 
+
+@router.get("/appuser/{id}", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={404: {"description": "Appuser Not Found"}}) 
 async def get_appuser_by_id(id: int, decoded_token: dict = Depends(verify_firebase_token)):
   check_logged_in(decoded_token)
   appuser = await models.Appuser.filter(id=id).first() 
@@ -144,38 +303,43 @@ async def get_appuser_by_id(id: int, decoded_token: dict = Depends(verify_fireba
   else:
     raise HTTPException(status_code=404, detail=f'Appuser Not Found')
 
-# returns english prefecture name if received in japanese
-def validate_prefecture(prefecture: str):
-  if prefecture in locations.prefecture_mapping:
-    return locations.prefecture_mapping[prefecture]
-  else:
-    return prefecture
+# returns the english prefecture name for any spelling of it (japanese, full-width, lower case, with 県/府/都 ...), otherwise the value as received
+def validate_prefecture(prefecture: str | None):
+  import pet_sitter.location_lookup as location_lookup # the location tables are only needed once a request uses them
+
+  return location_lookup.prefecture_to_english(prefecture) or prefecture
   
-# returns english city_ward name if received in japanese
-def validate_city_ward(city_ward: str, prefecture: str):
-  if city_ward in locations.city_mapping[prefecture].values():
-    return next(key for key, value in locations.city_mapping[prefecture].items() if value == city_ward)
-  else:
-    return city_ward
+# returns the english city_ward name for any spelling of it within the prefecture, otherwise the value as received
+def validate_city_ward(city_ward: str | None, prefecture: str | None):
+  import pet_sitter.location_lookup as location_lookup
+
+  return location_lookup.city_ward_to_english(city_ward, prefecture) or city_ward
   
-@app.put("/appuser/{id}", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={404: {"description": "Appuser Not Found"}, 403: {"description": "User Not Authorized"}}) 
-async def update_appuser_info(id: int, appuserReqBody: basemodels.UpdateAppuserBody, decoded_token: dict = Depends(verify_firebase_token)):  
+@router.put("/appuser/{id}", response_model=basemodels.FullAppuserResponseObject, status_code=200, responses={404: {"description": "Appuser Not Found"}, 403: {"description": "User Not Authorized"}}) 
+async def update_appuser_info(id: int, appuserReqBody: basemodels.UpdateAppuserBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
   appuser = await models.Appuser.filter(id=id).first()
   
   if not appuser:
     raise HTTPException(status_code=404, detail='Appuser Not Found')
   
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+  check_is_authorized(caller_appuser_id, id)
+  previousPrefecture = appuser.prefecture
 
-  appuserReqBody.prefecture = validate_prefecture(appuserReqBody.prefecture)
-  appuserReqBody.city_ward = validate_city_ward(appuserReqBody.city_ward, appuserReqBody.prefecture)
+  # only the location fields that were sent are normalized, so a partial update leaves the others untouched
+  if "prefecture" in appuserReqBody.model_fields_set:
+    appuserReqBody.prefecture = validate_prefecture(appuserReqBody.prefecture)
+  if "city_ward" in appuserReqBody.model_fields_set:
+    appuserReqBody.city_ward = validate_city_ward(appuserReqBody.city_ward, appuserReqBody.prefecture or appuser.prefecture)
 
   await appuser.update_from_dict(appuserReqBody.dict(exclude_unset=True))
   await appuser.save()
   latestAppuser = await models.Appuser.get(id=id)
+  sitter_index.update_appuser(latestAppuser) # location and language flags are part of the sitter search
+  if latestAppuser.is_sitter:
+    await invalidate_sitter_search(previousPrefecture, latestAppuser.prefecture)
   return latestAppuser
   
-@app.get("/sitter/{appuser_id}", status_code=200, responses={404: {"description": "Sitter Not Found"}}) 
+@router.get("/sitter/{appuser_id}", status_code=200, responses={404: {"description": "Sitter Not Found"}}) 
 async def get_sitter_by_appuser_id(appuser_id: int):   
   sitter = await models.Sitter.filter(appuser_id=appuser_id).first()
   
@@ -184,17 +348,19 @@ async def get_sitter_by_appuser_id(appuser_id: int):
   else:
     raise HTTPException(status_code=404, detail=f'Sitter Not Found')
 
-@app.post("/sitter/{appuser_id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "sitter_profile_bio is Mandatory"}}) 
-async def set_user_info(appuser_id: int, sitterReqBody: basemodels.SetSitterBody, decoded_token: dict = Depends(verify_firebase_token)):  
-  sitter = await models.Sitter.filter(appuser_id=appuser_id).first()
+@router.post("/sitter/{appuser_id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "sitter_profile_bio is Mandatory"}}) 
+async def set_user_info(appuser_id: int, sitterReqBody: basemodels.SetSitterBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
+  check_is_authorized(caller_appuser_id, appuser_id)
 
-  appuser = await models.Appuser.filter(id=appuser_id).first()
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+  sitter = await models.Sitter.filter(appuser_id=appuser_id).first()
 
   if sitter: # the sitter already exists, so update it
     await sitter.update_from_dict(sitterReqBody.dict(exclude_unset=True))
     await sitter.save()
     latestSitter = await models.Sitter.get(appuser_id=appuser_id)
+    sitterAppuser = await models.Appuser.get(id=appuser_id)
+    sitter_index.upsert_sitter(latestSitter, sitterAppuser)
+    await invalidate_sitter_search(sitterAppuser.prefecture)
     return latestSitter
   elif sitterReqBody.sitter_profile_bio: #the sitter does not yet exist, so create it
     latestSitter = await models.Sitter.create(appuser_id=appuser_id, **sitterReqBody.dict(exclude_unset=True))
@@ -202,6 +368,8 @@ async def set_user_info(appuser_id: int, sitterReqBody: basemodels.SetSitterBody
     user = await models.Appuser.filter(id=appuser_id).first()
     user.is_sitter = True
     await user.save()
+    sitter_index.upsert_sitter(latestSitter, user)
+    await invalidate_sitter_search(user.prefecture)
 
     response = {}
     response["sitter"] = latestSitter
@@ -210,7 +378,7 @@ async def set_user_info(appuser_id: int, sitterReqBody: basemodels.SetSitterBody
   else:
     raise HTTPException(status_code=400, detail=f'sitter_profile_bio is Mandatory')
 
-@app.get("/appuser-extended/{id}", status_code=200, responses={404: {"description": "User Not Found"}}) 
+@router.get("/appuser-extended/{id}", status_code=200, responses={404: {"description": "User Not Found"}}) 
 async def get_detailed_user_info_by_id(id: int):     
   appuser = await models.Appuser.filter(id=id).first()
   
@@ -236,32 +404,27 @@ def validate_pet_fields(type_of_animal: str, weight: float, gender: str):
   if gender and gender not in ["male", "female"]:
     raise HTTPException(status_code=400, detail=f'Pet gender should be "male" or "female"')
 
-@app.post("/appuser/{appuser_id}/pet", status_code=201, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Type of Animal, Invalid Pet Gender, or Weight is Nonpositive"}, 404: {"description": "User Does Not Exist"}, 500: {"description": "Failed to Add Pet"}}) 
-async def create_pet_profile(appuser_id: int, reqBody: basemodels.CreatePetBody, decoded_token: dict = Depends(verify_firebase_token)):  
-  appuser = await models.Appuser.filter(id=appuser_id).first()
-
-  if not appuser:
-    raise HTTPException(status_code=404, detail=f'User Does Not Exist')
-  
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+@router.post("/appuser/{appuser_id}/pet", status_code=201, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Type of Animal, Invalid Pet Gender, or Weight is Nonpositive"}, 500: {"description": "Failed to Add Pet"}}) 
+async def create_pet_profile(appuser_id: int, reqBody: basemodels.CreatePetBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
+  check_is_authorized(caller_appuser_id, appuser_id) # the caller's id comes from the database, so a match also means the user exists
   validate_pet_fields(reqBody.type_of_animal, reqBody.weight, reqBody.gender)
 
   newPet = await models.Pet.create(appuser_id=appuser_id, **reqBody.dict(exclude_unset=True))
 
   if newPet:
+    pet_feed.add(newPet.id)
     return newPet
   else:
     raise HTTPException(status_code=500, detail=f'Failed to Add Pet')
   
-@app.put("/pet/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Type of Animal, Invalid Pet Gender, or Weight is Nonpositive"}, 404: {"description": "Pet Not Found"}, 500: {"description": "Failed to Update Pet Profile"}}) 
-async def update_pet_profile(id: int, reqBody: basemodels.UpdatePetBody, decoded_token: dict = Depends(verify_firebase_token)):  
+@router.put("/pet/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Type of Animal, Invalid Pet Gender, or Weight is Nonpositive"}, 404: {"description": "Pet Not Found"}, 500: {"description": "Failed to Update Pet Profile"}}) 
+async def update_pet_profile(id: int, reqBody: basemodels.UpdatePetBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
   pet = await models.Pet.filter(id=id).first()
 
   if not pet:
     raise HTTPException(status_code=404, detail=f'Pet Not Found')
   
-  appuser = await models.Appuser.filter(id=pet.appuser_id).first()
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+  check_is_authorized(caller_appuser_id, pet.appuser_id)
 
   validate_pet_fields(reqBody.type_of_animal, reqBody.weight, reqBody.gender)
 
@@ -275,22 +438,17 @@ async def update_pet_profile(id: int, reqBody: basemodels.UpdatePetBody, decoded
   else:
     raise HTTPException(status_code=500, detail=f'Failed to Update Pet Profile')
   
-@app.get("/appuser/{appuser_id}/pet", status_code=200, responses={400: {"description": "Invalid Request"}, 403: {"description": "User Not Authorized"}, 404: {"description": "User Does Not Exist"}}) 
-async def get_all_pets_for_user(appuser_id: int, decoded_token: dict = Depends(verify_firebase_token), inquiry_id: int | None = None): 
-  appuser = await models.Appuser.filter(id=appuser_id).first()
-
-  if not appuser:
-    raise HTTPException(status_code=404, detail=f'User Does Not Exist')
-  
+@router.get("/appuser/{appuser_id}/pet", status_code=200, responses={400: {"description": "Invalid Request"}, 403: {"description": "User Not Authorized"}}) 
+async def get_all_pets_for_user(appuser_id: int, caller_appuser_id: int | None = Depends(get_caller_appuser_id), inquiry_id: int | None = None): 
   if not inquiry_id:
-    check_is_authorized(decoded_token, appuser.firebase_user_id)
+    check_is_authorized(caller_appuser_id, appuser_id)
   else: # for when a sitter needs to access an owner's pet data on their shared inquiry
     inquiry = await models.Inquiry.filter(id=inquiry_id).first()
 
     if not inquiry or inquiry.owner_appuser_id != appuser_id: # ensure that the owner data being requested matches the owner of the inquiry
       raise HTTPException(status_code=400, detail=f'Invalid Request')
     
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
 
   userPetsArray = await models.Pet.filter(appuser_id=appuser_id).order_by('id') # to stabilize display order when pet profiles are updated
   if userPetsArray:
@@ -298,7 +456,7 @@ async def get_all_pets_for_user(appuser_id: int, decoded_token: dict = Depends(v
   else:
     return []
   
-@app.get("/pet/{id}", status_code=200, responses={404: {"description": "Pet Not Found"}}) 
+@router.get("/pet/{id}", status_code=200, responses={404: {"description": "Pet Not Found"}}) 
 async def get_pet_by_id(id: int): 
   pet = await models.Pet.filter(id=id).first()
 
@@ -307,35 +465,72 @@ async def get_pet_by_id(id: int):
   
   return pet
 
-@app.get("/pet", status_code=200) 
-async def get_all_pets(numOfPets: int = 500): 
-  petsPerPage = numOfPets
-  totalPets = await models.Pet.all().count()
-  totalPages = totalPets // petsPerPage
-  randomPage = randint(0, totalPages - 1)
-  offset = randomPage * petsPerPage
+pet_feed_max_page_size = 500
 
-  petsArray = await models.Pet.all().limit(numOfPets).offset(offset) # limit the results to a random subset of all pets
+# a random feed of pets: pass the X-Feed-Seed response header back as seed, with page incremented, to continue the same order
+#numOfPets above pet_feed_max_page_size is served as a page of that size, so older clients asking for more keep working
+@router.get("/pet", status_code=200, responses={400: {"description": "numOfPets or page Out of Range"}}) 
+async def get_all_pets(response: Response, numOfPets: int = 500, seed: int | None = None, page: int = 0): 
+  if numOfPets < 1:
+    raise HTTPException(status_code=400, detail=f'numOfPets should be at least 1')
+  numOfPets = min(numOfPets, pet_feed_max_page_size)
+  if page < 0:
+    raise HTTPException(status_code=400, detail=f'page should not be negative')
 
-  if petsArray:
-    return petsArray
-  else:
+  if seed is None:
+    seed = secrets.randbelow(2**31)
+  response.headers["X-Feed-Seed"] = str(seed)
+
+  if not pet_feed.ready:
+    await pet_feed.reload()
+
+  petIDs = pet_feed.page(seed, page, numOfPets)
+  if not petIDs:
     return []
+
+  petsByID = {pet.id: pet for pet in await models.Pet.filter(id__in=petIDs)}
+  return [petsByID[petID] for petID in petIDs if petID in petsByID] # a pet deleted by another worker is skipped until the next reload
   
-@app.delete("/pet/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Delete Pet Profile"}}) 
-async def delete_pet_by_id(id: int, decoded_token: dict = Depends(verify_firebase_token)): 
+@router.delete("/pet/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Delete Pet Profile"}}) 
+async def delete_pet_by_id(id: int, caller_appuser_id: int | None = Depends(get_caller_appuser_id)): 
   try:
     pet = await models.Pet.get(id=id)
-    appuser = await models.Appuser.get(id=pet.appuser_id)
-    check_is_authorized(decoded_token, appuser.firebase_user_id)
+    check_is_authorized(caller_appuser_id, pet.appuser_id)
     await pet.delete()
+    pet_feed.remove(id)
     return f'Pet profile #{id} has been deleted'
   except Exception as e:
     raise HTTPException(status_code=500, detail=f'Failed to Delete Pet Profile: {str(e)}')
 
+sitter_search_page_size = int(os.getenv("SITTER_SEARCH_PAGE_SIZE", "50"))
+sitter_search_max_page_size = int(os.getenv("SITTER_SEARCH_MAX_PAGE_SIZE", "200"))
+
+# loads the sitters found in the sitter index in ascending appuser id order; rows are rechecked against the search
+# so that a sitter changed by another worker since that worker's last index refresh is never returned wrongly
+async def load_indexed_sitters(appuserIDs: List[int], sitter_search_conditions: dict, location_matches) -> List[models.Sitter]:
+  required = flags_mask(sitter_search_conditions)
+  candidates = await models.Sitter.filter(appuser_id__in=appuserIDs).select_related("appuser").order_by("appuser_id")
+  return [sitter for sitter in candidates if location_matches(sitter.appuser) and capability_mask(sitter, sitter.appuser) & required == required]
+
+# search cursors are opaque to clients: base64 of the last appuser_id on the previous page
+def encode_search_cursor(last_appuser_id: int) -> str:
+  return base64.urlsafe_b64encode(json.dumps({"after": last_appuser_id}).encode()).decode().rstrip("=")
+
+def decode_search_cursor(cursor: str) -> int:
+  try:
+    after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    if not isinstance(after, int):
+      raise ValueError
+    return after
+  except Exception:
+    raise HTTPException(status_code=400, detail=f'Invalid cursor')
+
 #expects to receive the prefecture and city_ward of the user conducting the search + any booleans that are true (meaning the user wants to find a sitter meeting those conditions)
-@app.get("/appuser-sitters", status_code=200) 
-async def get_all_matching_sitters(prefecture: str, city_ward: str | None = None, sitter_house_ok: bool | None = None, owner_house_ok: bool | None  = None, visit_ok: bool | None  = None, dogs_ok: bool | None  = None, cats_ok: bool | None  = None, fish_ok: bool | None  = None, birds_ok: bool | None  = None, rabbits_ok: bool | None  = None):
+#with start_date and end_date, only sitters available on every one of those dates are returned, or on at least min_days of them
+#results are ordered by appuser id and paged: X-Next-Cursor holds the cursor for the next page (absent on the last page), X-Total-Count the number of matches when include_total is set
+#with rank, only the top limit sitters by sitter rating, speaking the searcher's language and recent login (each weighted) are returned, best first, each with its score
+@router.get("/appuser-sitters", status_code=200, responses={400: {"description": "Invalid cursor, limit, language or date range"}}) 
+async def get_all_matching_sitters(response: Response, prefecture: str, city_ward: str | None = None, sitter_house_ok: bool | None = None, owner_house_ok: bool | None  = None, visit_ok: bool | None  = None, dogs_ok: bool | None  = None, cats_ok: bool | None  = None, fish_ok: bool | None  = None, birds_ok: bool | None  = None, rabbits_ok: bool | None  = None, start_date: date | None = None, end_date: date | None = None, min_days: int | None = None, limit: int | None = None, cursor: str | None = None, include_total: bool = False, rank: bool = False, language: str | None = None, rating_weight: float | None = None, language_weight: float | None = None, recency_weight: float | None = None):
       sitter_search_conditions = {}
       if sitter_house_ok:
         sitter_search_conditions["sitter_house_ok"] = True
@@ -354,7 +549,36 @@ async def get_all_matching_sitters(prefecture: str, city_ward: str | None = None
       if rabbits_ok:
         sitter_search_conditions["rabbits_ok"] = True
 
+      if limit is None:
+        limit = sitter_search_page_size
+      if limit < 1 or limit > sitter_search_max_page_size:
+        raise HTTPException(status_code=400, detail=f'limit should be between 1 and {sitter_search_max_page_size}')
+
+      after = decode_search_cursor(cursor) if cursor else None
+
+      if rank:
+        if cursor:
+          raise HTTPException(status_code=400, detail=f'cursor cannot be combined with rank')
+        if language and language not in ["english", "japanese"]:
+          raise HTTPException(status_code=400, detail=f'language should be "english" or "japanese"')
+        weights = RankingWeights()
+        for field, weight in [("rating", rating_weight), ("language", language_weight), ("recency", recency_weight)]:
+          if weight is not None:
+            setattr(weights, field, weight)
+
+      requiredDays = None
+      if start_date or end_date:
+        if not start_date or not end_date or end_date < start_date:
+          raise HTTPException(status_code=400, detail=f'start_date and end_date are both required, with end_date on or after start_date')
+        rangeDays = (end_date - start_date).days + 1
+        requiredDays = rangeDays if min_days is None else min_days
+        if requiredDays < 1 or requiredDays > rangeDays:
+          raise HTTPException(status_code=400, detail=f'min_days should be between 1 and {rangeDays}')
+      elif min_days is not None:
+        raise HTTPException(status_code=400, detail=f'min_days requires start_date and end_date')
+
       prefecture = validate_prefecture(prefecture)
+      city_ward = city_ward or None # ?city_ward= searches the whole prefecture, like leaving it out, on every path and in the cache key
 
       appuser_search_conditions = {}
       appuser_search_conditions["appuser__prefecture"] = prefecture
@@ -363,68 +587,205 @@ async def get_all_matching_sitters(prefecture: str, city_ward: str | None = None
         city_ward = validate_city_ward(city_ward, prefecture)
         appuser_search_conditions["appuser__city_ward"] = city_ward
 
-      matchingSitterArray = await models.Sitter.filter(**sitter_search_conditions).select_related("appuser").filter(**appuser_search_conditions) ## Ex. Can use matchingSitterArray[0].appuser.email to get email from Appuser table for one user
+      if search_cache:
+        cacheKey = search_cache_key("appuser-sitters", prefecture, city_ward, sorted(sitter_search_conditions), start_date, end_date, requiredDays, limit, after, include_total, rank and (language, weights.rating, weights.language, weights.recency))
+        cached = await search_cache.get(prefecture, cacheKey)
+        if cached:
+          return Response(content=cached["body"], media_type="application/json", headers=cached["headers"])
+
+      hasMore = False
+
+      if use_sitter_index and sitter_index.ready:
+        matchingIDs = sitter_index.search(prefecture, city_ward, sitter_search_conditions)
+        if requiredDays:
+          availableIDs = set(await availability_calendar.available_sitters_query(start_date, end_date, requiredDays, appuser_search_conditions))
+          matchingIDs = [appuserID for appuserID in matchingIDs if appuserID in availableIDs]
+        if include_total:
+          response.headers["X-Total-Count"] = str(len(matchingIDs))
+
+        if rank:
+          ranked = sitter_index.top_ranked(matchingIDs, limit, weights, language)
+          pageIDs = [appuserID for _, appuserID in ranked]
+        else:
+          pageStart = bisect.bisect_right(matchingIDs, after) if after is not None else 0
+          pageIDs = matchingIDs[pageStart:pageStart + limit]
+          hasMore = pageStart + limit < len(matchingIDs)
+
+        matchingSitterArray = []
+        if pageIDs:
+          matchingSitterArray = await load_indexed_sitters(pageIDs, sitter_search_conditions, lambda appuser: appuser.prefecture == prefecture and (not city_ward or appuser.city_ward == city_ward))
+          lastID = pageIDs[-1] # from the index rather than the rows, so a dropped row cannot repeat a page
+      elif rank:
+        query = models.Sitter.filter(**sitter_search_conditions).filter(**appuser_search_conditions)
+        if requiredDays:
+          query = query.filter(appuser_id__in=Subquery(availability_calendar.available_sitters_query(start_date, end_date, requiredDays, appuser_search_conditions)))
+
+        # only the ranking columns are read for every match; full rows are loaded for the top limit alone
+        rows = await query.values_list("appuser_id", "appuser__sitter_review_count", "appuser__sitter_score_sum", "appuser__last_login", f"appuser__{language or 'english'}_ok")
+        if include_total:
+          response.headers["X-Total-Count"] = str(len(rows))
+
+        now = time.time()
+        ranked = top_k(((ranking_score((ratings.role_rating(reviewCount, scoreSum) or 0.0, lastLogin.timestamp() if lastLogin else 0.0), bool(language and speaksLanguage), weights, now), appuserID) for appuserID, reviewCount, scoreSum, lastLogin, speaksLanguage in rows), limit)
+        matchingSitterArray = await models.Sitter.filter(appuser_id__in=[appuserID for _, appuserID in ranked]).select_related("appuser") if ranked else []
+      else:
+        query = models.Sitter.filter(**sitter_search_conditions).select_related("appuser").filter(**appuser_search_conditions) ## Ex. Can use matchingSitterArray[0].appuser.email to get email from Appuser table for one user
+        if requiredDays:
+          query = query.filter(appuser_id__in=Subquery(availability_calendar.available_sitters_query(start_date, end_date, requiredDays, appuser_search_conditions)))
+        if include_total:
+          response.headers["X-Total-Count"] = str(await query.count())
+        if after is not None:
+          query = query.filter(appuser_id__gt=after)
+
+        matchingSitterArray = await query.order_by("appuser_id").limit(limit + 1) # one extra row tells whether another page exists
+        hasMore = len(matchingSitterArray) > limit
+        matchingSitterArray = matchingSitterArray[:limit]
+        if matchingSitterArray:
+          lastID = matchingSitterArray[-1].appuser_id
+
+      if rank:
+        scores = {appuserID: score for score, appuserID in ranked}
+        matchingSitterArray = sorted((sitter for sitter in matchingSitterArray if sitter.appuser_id in scores), key=lambda sitter: (-scores[sitter.appuser_id], sitter.appuser_id))
+        result = [{"sitter": matchingSitter, "appuser": basemodels.ReducedAppuserResponseObject.from_orm(matchingSitter.appuser), "score": round(scores[matchingSitter.appuser_id], 4)} for matchingSitter in matchingSitterArray]
+      else:
+        if hasMore:
+          response.headers["X-Next-Cursor"] = encode_search_cursor(lastID)
+        result = [{"sitter": matchingSitter, "appuser": basemodels.ReducedAppuserResponseObject.from_orm(matchingSitter.appuser)} for matchingSitter in matchingSitterArray]
+
+      if not search_cache:
+        return result
+
+      # cached already serialized, so a hit skips both the queries and the encoding
+      headers = {header: response.headers[header] for header in ["X-Next-Cursor", "X-Total-Count"] if header in response.headers}
+      body = json.dumps(jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")) # as JSONResponse renders it
+      await search_cache.set(prefecture, cacheKey, {"body": body, "headers": headers})
+      return Response(content=body, media_type="application/json", headers=headers)
+
+sitter_search_max_radius_km = float(os.getenv("SITTER_SEARCH_MAX_RADIUS_KM", "200"))
+
+# sitters in the cities with a centroid within radius_km of the searcher's city, or the nearest ones when nearest is set
+# results are ordered by distance between city centroids, then appuser id, each with its distance_km
+@router.get("/appuser-sitters/nearby", status_code=200, responses={400: {"description": "Unknown location or invalid radius_km, nearest or limit"}}) 
+async def get_nearby_matching_sitters(response: Response, prefecture: str, city_ward: str | None = None, radius_km: float | None = None, nearest: int | None = None, sitter_house_ok: bool | None = None, owner_house_ok: bool | None  = None, visit_ok: bool | None  = None, dogs_ok: bool | None  = None, cats_ok: bool | None  = None, fish_ok: bool | None  = None, birds_ok: bool | None  = None, rabbits_ok: bool | None  = None, limit: int | None = None, include_total: bool = False):
+  sitter_search_conditions = {flag: True for flag, wanted in [("sitter_house_ok", sitter_house_ok), ("owner_house_ok", owner_house_ok), ("visit_ok", visit_ok), ("dogs_ok", dogs_ok), ("cats_ok", cats_ok), ("fish_ok", fish_ok), ("birds_ok", birds_ok), ("rabbits_ok", rabbits_ok)] if wanted}
+
+  if nearest is not None:
+    if nearest < 1 or nearest > sitter_search_max_page_size:
+      raise HTTPException(status_code=400, detail=f'nearest should be between 1 and {sitter_search_max_page_size}')
+    limit = nearest
+  elif limit is None:
+    limit = sitter_search_page_size
+  if limit < 1 or limit > sitter_search_max_page_size:
+    raise HTTPException(status_code=400, detail=f'limit should be between 1 and {sitter_search_max_page_size}')
+
+  if radius_km is None:
+    radius_km = sitter_search_max_radius_km if nearest is not None else 10
+  if radius_km <= 0 or radius_km > sitter_search_max_radius_km:
+    raise HTTPException(status_code=400, detail=f'radius_km should be greater than 0 and at most {sitter_search_max_radius_km:g}')
+
+  prefecture = validate_prefecture(prefecture)
+  city_ward = city_ward or None
+  if city_ward:
+    city_ward = validate_city_ward(city_ward, prefecture)
+
+  grid = proximity.city_grid()
+  origin = grid.locate(prefecture, city_ward)
+  if origin is None:
+    raise HTTPException(status_code=400, detail=f'Unknown prefecture')
+
+  # for nearest, the radius grows from 5km until enough sitters are found, so a dense city never measures the whole country
+  searchRadius = min(5.0, radius_km) if nearest is not None else radius_km
+  while True:
+    cities = grid.within(origin, searchRadius)
+    cityDistances = {location: distance for distance, location in cities}
+
+    if use_sitter_index and sitter_index.ready:
+      candidates = [(distance, appuserID) for distance, (cityPrefecture, city) in cities for appuserID in sitter_index.search(cityPrefecture, city, sitter_search_conditions)]
+    elif cities:
+      inCities = Q(*[Q(appuser__prefecture=cityPrefecture, appuser__city_ward=city) for cityPrefecture, city in cityDistances], join_type="OR")
+      rows = await models.Sitter.filter(inCities, **sitter_search_conditions).values_list("appuser_id", "appuser__prefecture", "appuser__city_ward")
+      candidates = [(cityDistances[(rowPrefecture, rowCity)], appuserID) for appuserID, rowPrefecture, rowCity in rows]
+    else:
+      candidates = []
 
-      if matchingSitterArray:
-        responseArray = []
+    if nearest is None or len(candidates) >= limit or searchRadius >= radius_km:
+      break
+    searchRadius = min(searchRadius * 2, radius_km)
 
-        for matchingSitter in matchingSitterArray:
-          sitterAppuserPair = {}
-          sitterAppuserPair["sitter"] = matchingSitter
-          sitterAppuserPair["appuser"] = basemodels.ReducedAppuserResponseObject.from_orm(matchingSitter.appuser)
-          responseArray.append(sitterAppuserPair)
-          
-        return responseArray
-      else:
-        return []
+  if include_total:
+    response.headers["X-Total-Count"] = str(len(candidates))
 
-@app.get("/appuser/{id}/inquiry", status_code=200, responses={403: {"description": "User Not Authorized"}}) 
-async def get_all_relevant_inquiries_for_user(id: int, is_sitter: bool, decoded_token: dict = Depends(verify_firebase_token)):
-  appuser = await models.Appuser.filter(id=id).first()
+  page = heapq.nsmallest(limit, candidates)
+  pageDistances = {appuserID: distance for distance, appuserID in page}
+  matchingSitterArray = await load_indexed_sitters(list(pageDistances), sitter_search_conditions, lambda appuser: (appuser.prefecture, appuser.city_ward) in cityDistances)
+  matchingSitterArray.sort(key=lambda sitter: (pageDistances[sitter.appuser_id], sitter.appuser_id))
 
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+  return [{"sitter": matchingSitter, "appuser": basemodels.ReducedAppuserResponseObject.from_orm(matchingSitter.appuser), "distance_km": round(pageDistances[matchingSitter.appuser_id], 1)} for matchingSitter in matchingSitterArray]
+
+@router.get("/appuser/{id}/inquiry", status_code=200, responses={403: {"description": "User Not Authorized"}}) 
+async def get_all_relevant_inquiries_for_user(id: int, is_sitter: bool, caller_appuser_id: int | None = Depends(get_caller_appuser_id), pet_id: int | None = None):
+  check_is_authorized(caller_appuser_id, id)
+
+  if pet_id is not None: # only the inquiries involving this pet, found through inquiry_pet's pet_id index
+    inquiryQuery = models.Inquiry.filter(inquiry_pets__pet_id=pet_id)
+  else:
+    inquiryQuery = models.Inquiry.all()
 
   if is_sitter:
-      sitterInquiryArray = await models.Inquiry.filter(sitter_appuser_id=id).order_by('id')
+      sitterInquiryArray = await inquiryQuery.filter(sitter_appuser_id=id).order_by('id')
       if sitterInquiryArray:
         return sitterInquiryArray
       else:
         return []
   else:
-      ownerInquiryArray = await models.Inquiry.filter(owner_appuser_id=id).order_by('id')
+      ownerInquiryArray = await inquiryQuery.filter(owner_appuser_id=id).order_by('id')
       if ownerInquiryArray:
         return ownerInquiryArray
       else:
         return []
 
-@app.get("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Not Found"}}) 
-async def get_inquiry_by_id(id: int, decoded_token: dict = Depends(verify_firebase_token)):     
+@router.get("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Not Found"}}) 
+async def get_inquiry_by_id(id: int, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):     
   inquiry = await models.Inquiry.filter(id=id).first()
   if inquiry:
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
     return inquiry
   else:
     raise HTTPException(status_code=404, detail=f'Inquiry Not Found')
 
-@app.post("/inquiry", status_code=201, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Failed to Add Inquiry"}}) 
-async def create_inquiry(reqBody: basemodels.CreateInquiryBody, decoded_token: dict = Depends(verify_firebase_token)):
-  appuser = await models.Appuser.get(id=reqBody.owner_appuser_id)
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+def parse_pet_id_list(pet_id_list: str | None) -> List[int]:
+  # each entry becomes an inquiry_pet row, so anything that is not a pet id is refused rather than stored
+  petIDs = [petID.strip() for petID in (pet_id_list or "").split(",") if petID.strip()]
+  if not all(petID.isdecimal() for petID in petIDs):
+    raise HTTPException(status_code=400, detail=f'Invalid pet_id_list: expected comma separated pet ids')
+  return list(dict.fromkeys(int(petID) for petID in petIDs))
+
+async def set_inquiry_pets(inquiry_id: int, petIDs: List[int], connection):
+  await models.InquiryPet.filter(inquiry_id=inquiry_id).using_db(connection).delete()
+  if petIDs:
+    await models.InquiryPet.bulk_create([models.InquiryPet(inquiry_id=inquiry_id, pet_id=petID, position=position) for position, petID in enumerate(petIDs)], using_db=connection)
+
+@router.post("/inquiry", status_code=201, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid pet_id_list"}, 404: {"description": "Failed to Add Inquiry"}}) 
+async def create_inquiry(reqBody: basemodels.CreateInquiryBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
+  check_is_authorized(caller_appuser_id, reqBody.owner_appuser_id)
+  petIDs = parse_pet_id_list(reqBody.pet_id_list)
   try:
-    inquiry = await models.Inquiry.create(**reqBody.dict())     
+    async with in_transaction() as connection:
+      inquiry = await models.Inquiry.create(**{**reqBody.dict(), "pet_id_list": ",".join(map(str, petIDs))}, using_db=connection)
+      await set_inquiry_pets(inquiry.id, petIDs, connection)
     return inquiry
   except Exception as e:
     raise HTTPException(status_code=500, detail=f'Failed to Add Inquiry: {str(e)}')
 
-@app.patch("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Status Received or Inquiry Already Finalized"}, 404: {"description": "Inquiry Not Found"}}) 
-async def update_inquiry_status(id: int, reqBody: basemodels.UpdateInquiryStatusBody, decoded_token: dict = Depends(verify_firebase_token)):  
+@router.patch("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Status Received or Inquiry Already Finalized"}, 404: {"description": "Inquiry Not Found"}}) 
+async def update_inquiry_status(id: int, reqBody: basemodels.UpdateInquiryStatusBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
   if reqBody.inquiry_status not in ["approved", "rejected"]:
     raise HTTPException(status_code=400, detail=f'Invalid Status Received')
 
   inquiry = await models.Inquiry.filter(id=id).first()
 
   if inquiry:
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
 
     if inquiry.inquiry_status not in [models.InquiryStatus.REQUESTED]:
        raise HTTPException(status_code=400, detail=f'Inquiry Already Finalized')
@@ -437,143 +798,255 @@ async def update_inquiry_status(id: int, reqBody: basemodels.UpdateInquiryStatus
   else:
     raise HTTPException(status_code=404, detail=f'Inquiry Not Found')
 
-@app.put("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Not Found"}}) 
-async def update_inquiry_content(id: int, reqBody: basemodels.UpdateInquiryContentBody, decoded_token: dict = Depends(verify_firebase_token)):  
+@router.put("/inquiry/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid pet_id_list"}, 404: {"description": "Inquiry Not Found"}}) 
+async def update_inquiry_content(id: int, reqBody: basemodels.UpdateInquiryContentBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):  
   inquiry = await models.Inquiry.filter(id=id).first()
 
   if inquiry:
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
-    await inquiry.update_from_dict(reqBody.dict(exclude_unset=True))
-    await inquiry.save()
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    updates = reqBody.dict(exclude_unset=True)
+    petIDs = parse_pet_id_list(updates["pet_id_list"]) if "pet_id_list" in updates else None
+    if petIDs is not None:
+      updates["pet_id_list"] = ",".join(map(str, petIDs))
+
+    async with in_transaction() as connection:
+      await inquiry.update_from_dict(updates)
+      await inquiry.save(using_db=connection)
+      if petIDs is not None:
+        await set_inquiry_pets(id, petIDs, connection)
     updatedInquiry = await models.Inquiry.get(id=id)
     return updatedInquiry
   else:
     raise HTTPException(status_code=404, detail=f'Inquiry Not Found')
   
-@app.post("/inquiry/{id}/message", status_code=201, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Add Message"}}) 
-async def create_message(id: int, reqBody: basemodels.CreateMessageBody, decoded_token: dict = Depends(verify_firebase_token)):
+@router.post("/inquiry/{id}/message", status_code=201, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Add Message"}}) 
+async def create_message(id: int, reqBody: basemodels.CreateMessageBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
   try:
     inquiry = await models.Inquiry.filter(id=id).first()
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
     message = await models.Message.create(inquiry_id=id, **reqBody.dict())
 
-    broadcast_payload = {
-      "id": message.id,
-      "inquiry_id": message.inquiry_id,
-      "content": message.content,
-      "author_appuser_id": message.author_appuser_id,
-      "recipient_appuser_id": message.recipient_appuser_id,
-      "time_sent": message.time_sent.isoformat()
-    }
-
-    await inquiry_messages_manager.broadcast(broadcast_payload)
+    await inquiry_messages_manager.broadcast(message_payload(message))
 
     return message
   except Exception as e:
     raise HTTPException(status_code=500, detail=f'Failed to Add (or Broadcast) Message: {str(e)}')
   
-@app.get("/inquiry/{id}/message", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Does Not Exist"}}) 
-async def get_all_messages_from_inquiry(id: int, decoded_token: dict = Depends(verify_firebase_token)):
+message_page_size = int(os.getenv("MESSAGE_PAGE_SIZE", "100"))
+message_max_page_size = int(os.getenv("MESSAGE_MAX_PAGE_SIZE", "500"))
+
+#without after_id, before_id or limit the whole history is returned; otherwise one page, always in ascending id order:
+#after_id gives the oldest messages newer than it (to catch up after a reconnect), before_id the newest older than it (to scroll back),
+#limit alone the newest messages. X-Has-More is "true" when the page stopped at limit with more messages in that direction
+@router.get("/inquiry/{id}/message", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid limit"}, 404: {"description": "Inquiry Does Not Exist"}}) 
+async def get_all_messages_from_inquiry(response: Response, id: int, after_id: int | None = None, before_id: int | None = None, limit: int | None = None, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
   inquiry = await models.Inquiry.filter(id=id).first()
 
   if not inquiry:
     raise HTTPException(status_code=404, detail=f'Inquiry Does Not Exist')
 
-  await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+  check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+
+  query = models.Message.filter(inquiry_id=id)
+  if after_id is None and before_id is None and limit is None:
+    return await query.order_by('id')
+
+  if limit is None:
+    limit = message_page_size
+  if limit < 1 or limit > message_max_page_size:
+    raise HTTPException(status_code=400, detail=f'limit should be between 1 and {message_max_page_size}')
 
-  inquiryMessagesArray = await models.Message.filter(inquiry_id=id).order_by('id')
-  if inquiryMessagesArray:
-    return inquiryMessagesArray
+  # each page is a range scan of idx_message_inquiry_id (inquiry_id, id), reading one extra row to tell whether more remain
+  if after_id is not None:
+    query = query.filter(id__gt=after_id)
+  if before_id is not None:
+    query = query.filter(id__lt=before_id)
+
+  if after_id is not None:
+    messagesArray = await query.order_by('id').limit(limit + 1)
+    hasMore = len(messagesArray) > limit
+    messagesArray = messagesArray[:limit]
   else:
-    return []
+    messagesArray = await query.order_by('-id').limit(limit + 1)
+    hasMore = len(messagesArray) > limit
+    messagesArray = messagesArray[:limit][::-1]
+
+  response.headers["X-Has-More"] = "true" if hasMore else "false"
+  return messagesArray
   
-@app.websocket("/ws/inquiry/{id}")
+socket_auth_timeout_seconds = 10
+
+# the text of the socket's next frame, or None for a binary frame
+async def receive_socket_text(websocket: WebSocket) -> str | None:
+  message = await websocket.receive()
+  if message["type"] == "websocket.disconnect":
+    raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+  return message.get("text")
+
+#browsers cannot set headers on a WebSocket, so without an Authorization header the first frame must be {"token": <ID token>}
+#(never a query parameter, which ends up in access logs); a socket that does not authenticate in time is closed
+async def read_socket_authorization_header(websocket: WebSocket) -> str | None:
+  if websocket.headers.get("Authorization"):
+    return websocket.headers.get("Authorization")
+  try:
+    frame = await asyncio.wait_for(receive_socket_text(websocket), timeout=socket_auth_timeout_seconds)
+  except asyncio.TimeoutError:
+    return None
+  if frame is None:
+    return None
+  try:
+    return f"Bearer {basemodels.SocketAuthFrame.model_validate_json(frame).token}"
+  except ValidationError:
+    return None
+
+#the socket is authenticated once, at connect; each {"content": ..., "client_id": ...} frame it sends is stored as a message
+#from the caller to the other party of the inquiry, acknowledged with {"type": "ack", "id": ..., "client_id": ...} and broadcast
+@router.websocket("/ws/inquiry/{id}")
 async def get_realtime_messages_from_inquiry(websocket: WebSocket, id: int):
+  await websocket.accept()
   try:
+    decoded_token = await verify_authorization_header(await read_socket_authorization_header(websocket))
+    caller_appuser_id = await get_caller_appuser_id(decoded_token)
     inquiry = await models.Inquiry.filter(id=id).first()
-    
+
     if not inquiry:
       raise HTTPException(status_code=404, detail=f'Inquiry Does Not Exist')
-    
-    await inquiry_messages_manager.connect(id, websocket)
-
-    try:
-      while True:
-        await websocket.receive_json()
-    except WebSocketDisconnect:
-      inquiry_messages_manager.disconnect(id, websocket)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+  except WebSocketDisconnect:
+    return
   except HTTPException as e:
-    await websocket.send_text('{"status_code": 400, "detail": "Inquiry Does Not Exist or User Not Authorized"}')
+    await websocket.send_text(json.dumps({"status_code": e.status_code, "detail": e.detail}))
+    await websocket.close(code=1008)
+    return
 
-    if websocket.client_state != "DISCONNECTED":
-      await websocket.close(code=1008)
-  
-@app.get("/inquiry/{id}/pet", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Does Not Exist"}}) 
-async def get_all_pets_from_inquiry(id: int, decoded_token: dict = Depends(verify_firebase_token)):
+  recipientAppuserID = inquiry.sitter_appuser_id if caller_appuser_id == inquiry.owner_appuser_id else inquiry.owner_appuser_id
+  await inquiry_messages_manager.connect(id, websocket)
+
+  try:
+    while True:
+      frame = await receive_socket_text(websocket)
+      if frame is None:
+        inquiry_messages_manager.send(id, websocket, {"type": "error", "detail": "Expected a text frame"})
+        continue
+      try:
+        reqBody = basemodels.SocketMessageFrame.model_validate_json(frame)
+      except ValidationError:
+        inquiry_messages_manager.send(id, websocket, {"type": "error", "detail": 'Expected {"content": ..., "client_id": ...}'})
+        continue
+      if not reqBody.content.strip():
+        inquiry_messages_manager.send(id, websocket, {"type": "error", "detail": "Empty message", "client_id": reqBody.client_id})
+        continue
+
+      try:
+        message = await models.Message.create(inquiry_id=id, author_appuser_id=caller_appuser_id, recipient_appuser_id=recipientAppuserID, content=reqBody.content)
+      except Exception as e:
+        inquiry_messages_manager.send(id, websocket, {"type": "error", "detail": f'Failed to Add Message: {str(e)}', "client_id": reqBody.client_id})
+        continue
+
+      inquiry_messages_manager.send(id, websocket, {"type": "ack", "id": message.id, "client_id": reqBody.client_id})
+      await inquiry_messages_manager.broadcast(message_payload(message))
+  except WebSocketDisconnect:
+    pass
+  finally:
+    await inquiry_messages_manager.disconnect(id, websocket)
+
+@router.get("/inquiry/{id}/pet", status_code=200, responses={403: {"description": "User Not Authorized"}, 404: {"description": "Inquiry Does Not Exist"}}) 
+async def get_all_pets_from_inquiry(id: int, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
   inquiry = await models.Inquiry.filter(id=id).first()
 
   if inquiry:
-    await check_is_authorized_for_inquiry(decoded_token, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
+    check_is_authorized_for_inquiry(caller_appuser_id, inquiry.owner_appuser_id, inquiry.sitter_appuser_id)
 
-    petsCSVStr = inquiry.pet_id_list
+    petIDList = await models.InquiryPet.filter(inquiry_id=id).order_by("position").values_list("pet_id", flat=True)
 
-    if petsCSVStr:
-      petIDList = petsCSVStr.split(",")
-      response = {}
-      response["pets_not_found"] = ""
-      response["pets_array"] = []
-      petsArray = []
+    if petIDList:
+      # one query for every pet, limited to the inquiry owner's so another user's pet id reads as not found
+      petsByID = {pet.id: pet for pet in await models.Pet.filter(id__in=petIDList, appuser_id=inquiry.owner_appuser_id)}
 
-      for i in range(len(petIDList)):
-        try:
-          petObject = await get_pet_by_id(petIDList[i])
-          
-          if petObject:
-            petsArray.append(petObject)
-        except:
-            if not response["pets_not_found"]:
-              response["pets_not_found"] += petIDList[i]
-            else:
-              response["pets_not_found"] += ","+ petIDList[i]
-      
-      if petsArray:
-        response["pets_array"] = petsArray
+      response = {}
+      response["pets_not_found"] = ",".join(str(petID) for petID in petIDList if petID not in petsByID)
+      response["pets_array"] = [petsByID[petID] for petID in petIDList if petID in petsByID]
 
       return response
 
   else:
     raise HTTPException(status_code=404, detail=f'Inquiry Does Not Exist')
       
-@app.post("/appuser/{id}/availability", status_code=201, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Add Availability"}}) 
-async def create_availabilities(id: int, reqBody: List[basemodels.CreateAvailabilityBody], decoded_token: dict = Depends(verify_firebase_token)):
-  appuser = await models.Appuser.filter(id=id).first()
-  check_is_authorized(decoded_token, appuser.firebase_user_id)
+@router.post("/appuser/{id}/availability", status_code=201, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Add Availability"}}) 
+async def create_availabilities(id: int, reqBody: List[basemodels.CreateAvailabilityBody], caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
+  check_is_authorized(caller_appuser_id, id)
+
+  requestedDates = [body.available_date.date() for body in reqBody]
+  try: # one insert for every date
+    async with in_transaction() as connection:
+      createdArray = await availability_calendar.insert_availabilities(connection, id, requestedDates)
+  except Exception as e:
+    raise HTTPException(status_code=500, detail=f'Failed to Add Availability: {str(e)}')
 
-  responseArray = []
-  
-  for i in range(len(reqBody)):
-    availability = await models.Availability.filter(appuser_id=id, available_date=reqBody[i].available_date).first()
-    if not availability:
-      try:
-        newAvailability = await models.Availability.create(appuser_id=id, **reqBody[i].dict())
-        responseArray.append(newAvailability)
-      except Exception as e:
-        raise HTTPException(status_code=500, detail=f'Failed to Add Availability: {str(e)}')
+  if createdArray: # date-filtered sitter searches depend on availability
+    await invalidate_sitter_search_for(id)
     
-  return responseArray
+  return created_and_skipped(requestedDates, createdArray)
+
+# the created rows, and the requested dates that were skipped because the sitter already had them
+def created_and_skipped(requestedDates: List[date], createdArray: List[dict]) -> dict:
+  createdDates = {created["available_date"] for created in createdArray}
+  return {"created": createdArray, "skipped": sorted({requestedDate for requestedDate in requestedDates if requestedDate not in createdDates})}
+
+def validate_availability_range(start_date: date, end_date: date, weekdays: List[int] | None):
+  if end_date < start_date:
+    raise HTTPException(status_code=400, detail=f'"end_date" should not be before "start_date"')
+  if (end_date - start_date).days >= availability_calendar.MAX_RANGE_DAYS:
+    raise HTTPException(status_code=400, detail=f'A range should span at most {availability_calendar.MAX_RANGE_DAYS} days')
+  if weekdays is not None and not all(0 <= weekday <= 6 for weekday in weekdays):
+    raise HTTPException(status_code=400, detail=f'"weekdays" should be between 0 (Monday) and 6 (Sunday)')
+
+@router.post("/appuser/{id}/availability/range", status_code=201, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Date Range"}, 500: {"description": "Failed to Add Availability"}}) 
+async def create_availability_range(id: int, reqBody: basemodels.AvailabilityRangeBody, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
+  check_is_authorized(caller_appuser_id, id)
+  validate_availability_range(reqBody.start_date, reqBody.end_date, reqBody.weekdays)
+
+  requestedDates = availability_calendar.dates_in_range(reqBody.start_date, reqBody.end_date, reqBody.weekdays)
+  try:
+    async with in_transaction() as connection:
+      createdArray = await availability_calendar.insert_availabilities(connection, id, requestedDates)
+  except Exception as e:
+    raise HTTPException(status_code=500, detail=f'Failed to Add Availability: {str(e)}')
+
+  if createdArray:
+    await invalidate_sitter_search_for(id)
+
+  return created_and_skipped(requestedDates, createdArray)
+
+@router.delete("/appuser/{id}/availability", status_code=200, responses={403: {"description": "User Not Authorized"}, 400: {"description": "Invalid Date Range"}, 500: {"description": "Failed to Delete Availability"}})
+async def delete_availability_range(id: int, start_date: date, end_date: date, weekdays: List[int] | None = Query(None), caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
+  check_is_authorized(caller_appuser_id, id)
+  validate_availability_range(start_date, end_date, weekdays)
+
+  try:
+    async with in_transaction() as connection:
+      deletedDates = await availability_calendar.delete_availabilities(connection, id, start_date, end_date, weekdays)
+  except Exception as e:
+    raise HTTPException(status_code=500, detail=f'Failed to Delete Availability: {str(e)}')
+
+  if deletedDates:
+    await invalidate_sitter_search_for(id)
+
+  return {"deleted": deletedDates}
   
-@app.delete("/availability/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Delete Availability"}})
-async def delete_availability(id: int, decoded_token: dict = Depends(verify_firebase_token)):
+@router.delete("/availability/{id}", status_code=200, responses={403: {"description": "User Not Authorized"}, 500: {"description": "Failed to Delete Availability"}})
+async def delete_availability(id: int, caller_appuser_id: int | None = Depends(get_caller_appuser_id)):
   try:
     availability = await models.Availability.get(id=id)
-    appuser = await models.Appuser.filter(id=availability.appuser_id).first()
-    check_is_authorized(decoded_token, appuser.firebase_user_id)
-    await availability.delete()
+    check_is_authorized(caller_appuser_id, availability.appuser_id)
+    async with in_transaction() as connection: # clears the date from the month bitmap too
+      await availability_calendar.delete_availabilities(connection, availability.appuser_id, availability.available_date, availability.available_date)
+    await invalidate_sitter_search_for(availability.appuser_id)
     return f'Availabilty #{id} has been deleted'
   except Exception as e:
     raise HTTPException(status_code=500, detail=f'Failed to Delete Availability: {str(e)}')
 
-@app.get("/appuser/{id}/availability", status_code=200, responses={400: {"description": "The User is Not a Sitter"}})
+@router.get("/appuser/{id}/availability", status_code=200, responses={400: {"description": "The User is Not a Sitter"}})
 async def get_all_availabilities_for_sitter(id: int):
   appuser = await models.Appuser.get(id=id)
 
@@ -585,8 +1058,22 @@ async def get_all_availabilities_for_sitter(id: int):
       return []
   else:
     raise HTTPException(status_code=400, detail=f'The User is Not a Sitter')
+
+#months maps "YYYY-MM" to a bitmap of the available days within start_date to end_date: bit 0 is the 1st, bit 30 the 31st
+@router.get("/appuser/{id}/availability/calendar", status_code=200, responses={400: {"description": "The User is Not a Sitter or Invalid Date Range"}})
+async def get_availability_calendar_for_sitter(id: int, start_date: date | None = None, end_date: date | None = None):
+  appuser = await models.Appuser.get(id=id)
+
+  if not appuser.is_sitter:
+    raise HTTPException(status_code=400, detail=f'The User is Not a Sitter')
+
+  start_date = start_date or date.today()
+  end_date = end_date or start_date + timedelta(days=availability_calendar.MAX_RANGE_DAYS - 1)
+  validate_availability_range(start_date, end_date, None)
+
+  return {"start_date": start_date, "end_date": end_date, "months": await availability_calendar.calendar(id, start_date, end_date)}
   
-@app.post("/appuser/{id}/review", status_code=201, responses={401: {"description": "Must Be Logged In"}, 400: {"description": "Invalid Recipient Appuser Type or Review Score Not 1-5"}, 404: {"description": "User(s) Not Found"}, 500: {"description": "Failed to Add Review"}}) 
+@router.post("/appuser/{id}/review", status_code=201, responses={401: {"description": "Must Be Logged In"}, 400: {"description": "Invalid Recipient Appuser Type or Review Score Not 1-5"}, 404: {"description": "User(s) Not Found"}, 500: {"description": "Failed to Add Review"}}) 
 async def create_review(id: int, reqBody: basemodels.CreateReviewBody, decoded_token: dict = Depends(verify_firebase_token)):
   check_logged_in(decoded_token)
 
@@ -605,30 +1092,25 @@ async def create_review(id: int, reqBody: basemodels.CreateReviewBody, decoded_t
   response = {}
 
   try:
-    review = await models.Review.create(recipient_appuser_id=id, **reqBody.dict())
+    # the review and the recipient's rating aggregates are written together or not at all
+    async with in_transaction() as connection:
+      review = await models.Review.create(recipient_appuser_id=id, **reqBody.dict(), using_db=connection)
+      aggregates = await ratings.record_review(connection, id, reqBody.recipient_appuser_type, review.score)
     response["review"] = review
 
-    if not recipient.average_user_rating:
-      recipient.average_user_rating = review.score
-      await recipient.save()
-      response["appuser"] = recipient
-    else:
-      reviewArray = await get_all_reviews_for_user(id)
-      reviewCount = len(reviewArray)
-      scoreSum = 0
-
-      for i in range(reviewCount):
-        scoreSum += reviewArray[i].score
+    for field, value in aggregates.items():
+      setattr(recipient, field, value)
+    sitter_index.update_appuser(recipient)
+    response["appuser"] = recipient
 
-      recipient.average_user_rating = scoreSum / reviewCount
-      await recipient.save()
-      response["appuser"] = recipient
+    if recipient.is_sitter: # the rating is part of the sitter search results
+      await invalidate_sitter_search(recipient.prefecture)
 
     return response
   except Exception as e:
     raise HTTPException(status_code=500, detail=f'Failed to Add Review: {str(e)}')
   
-@app.get("/appuser/{id}/review", status_code=200, responses={404: {"description": "User Not Found"}}) 
+@router.get("/appuser/{id}/review", status_code=200, responses={404: {"description": "User Not Found"}}) 
 async def get_all_reviews_for_user(id: int, recipient_appuser_type: str | None = None):
   appuser = await models.Appuser.get(id=id)
 
@@ -647,19 +1129,83 @@ async def get_all_reviews_for_user(id: int, recipient_appuser_type: str | None =
   else:
     return []
 
-@app.on_event("startup")
+def seeding_enabled() -> bool:
+  # production sets SEED_DATABASE=false so that Faker and the seed data are never imported there
+  return os.getenv("SEED_DATABASE", "true").lower() in ("1", "true", "yes")
+
 async def startup():
   # Initialize Tortoise ORM with the database connection
-  await Tortoise.init(db_url=os.getenv("DATABASE_URL"), modules={"models": ["pet_sitter.models"]})
-  await Tortoise.generate_schemas()
-  appusers = await models.Appuser.all()
-  if not appusers:
-    await seeds.seed_db()
+  with timed_phase("database"):
+    await Tortoise.init(db_url=os.getenv("DATABASE_URL"), modules={"models": ["pet_sitter.models"]})
+  with timed_phase("migrations"):
+    applied = await migrations.migrate()
+    if applied:
+      logger.info("Applied migrations: %s", applied)
+
+  with timed_phase("signing_keys"):
+    if not signing_key_store.project_id:
+      signing_key_store.project_id = (firebase_credentials() or {}).get("project_id")
+    await signing_key_store.start()
+
+  if seeding_enabled():
+    with timed_phase("seed"):
+      if not await models.Appuser.exists():
+        import pet_sitter.seeds as seeds
+        await seeds.seed_db()
+
+  if use_sitter_index:
+    with timed_phase("sitter_index"):
+      await sitter_index.rebuild()
+    sitter_index.start_refreshing(float(os.getenv("SITTER_INDEX_REFRESH_SECONDS", "300")))
+
+  with timed_phase("city_grid"):
+    proximity.city_grid()
+
+  with timed_phase("pet_feed"):
+    await pet_feed.reload()
+  pet_feed.start_refreshing(float(os.getenv("PET_FEED_REFRESH_SECONDS", "300")))
+
+  with timed_phase("message_broker"):
+    await inquiry_messages_manager.start(create_message_broker(os.getenv("MESSAGE_BROKER", "memory"), os.getenv("DATABASE_URL")), int(os.getenv("MESSAGE_SOCKET_QUEUE_SIZE", "64")))
+
+  logger.info("Startup timings (ms): %s", startup_timings)
 
-@app.on_event("shutdown")
 async def shutdown():
   # Close the Tortoise connection when shutting down the app
+  await sitter_index.stop()
+  await pet_feed.stop()
+  await inquiry_messages_manager.close()
+  if search_cache:
+    await search_cache.close()
   await Tortoise.close_connections()
+  await signing_key_store.stop()
+  token_verifier.shutdown()
+
+def create_app() -> FastAPI:
+  app = FastAPI()
+
+  origins = [
+    os.getenv("FRONTEND_BASE_URL"),
+    "http://localhost:5173",
+  ]
+
+  app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Feed-Seed", "X-Has-More"], # sitter search, pet feed and message history paging
+  )
+
+  app.include_router(router)
+  app.add_event_handler("startup", startup)
+  app.add_event_handler("shutdown", shutdown)
+  return app
+
+app = create_app()
+
+startup_timings["import"] = round((time.perf_counter() - _import_started) * 1000, 2)
 
 def start():
   """Launched with poetry run start at root level"""
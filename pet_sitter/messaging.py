@@ -1,26 +1,299 @@
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List, Set
 from fastapi import WebSocket # type: ignore
+from tortoise import Tortoise # type: ignore
+import pet_sitter.models as models
+import asyncio
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+# Messages reach the sockets of every worker through a broker: broadcast publishes a message on its inquiry's
+# channel, and each worker delivers what arrives on the channels it subscribes to, which are only the
+# inquiries it holds sockets for. Brokers share start/subscribe/unsubscribe/publish/close/stats.
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+def message_payload(message: models.Message) -> dict:
+  return {
+    "id": message.id,
+    "inquiry_id": message.inquiry_id,
+    "content": message.content,
+    "author_appuser_id": message.author_appuser_id,
+    "recipient_appuser_id": message.recipient_appuser_id,
+    "time_sent": message.time_sent.isoformat()
+  }
+
+class InProcessBroker:
+  """Hands every message straight back to this worker, which is all a single process needs"""
 
-class InquiryMessagesManager:
   def __init__(self):
-    self.active_connections: Dict[int, List[WebSocket]] = {}
+    self._deliver: Deliver | None = None
+    self._channels: Set[int] = set()
 
-  async def connect(self, inquiry_id: int, websocket: WebSocket):
-    await websocket.accept()
-    self.active_connections.setdefault(inquiry_id, []).append(websocket)
+  async def start(self, deliver: Deliver):
+    self._deliver = deliver
 
-  def disconnect(self, inquiry_id: int, websocket: WebSocket):
-    if inquiry_id in self.active_connections:
-      self.active_connections[inquiry_id].remove(websocket)
+  async def subscribe(self, inquiry_id: int):
+    self._channels.add(inquiry_id)
 
-      if not self.active_connections[inquiry_id]:
-        del self.active_connections[inquiry_id]
+  async def unsubscribe(self, inquiry_id: int):
+    self._channels.discard(inquiry_id)
 
-  async def broadcast(self, message: dict):
+  async def publish(self, message: dict):
+    if self._deliver and message["inquiry_id"] in self._channels:
+      await self._deliver(message)
+
+  async def close(self):
+    pass
+
+  def stats(self) -> dict:
+    return {"backend": "memory", "subscriptions": len(self._channels)}
+
+class PostgresBroker:
+  """PostgreSQL LISTEN/NOTIFY, one channel per inquiry, so every worker on the same database takes part. Listening
+  holds one dedicated connection per worker; notifications sent while it reconnects are missed, and clients
+  catch up through GET /inquiry/{id}/message?after_id="""
+
+  PAYLOAD_LIMIT = 7900 # NOTIFY payloads must stay under 8000 bytes; longer messages are sent by id and loaded
+
+  def __init__(self, dsn: str, reconnect_delay: float = 1.0):
+    self.dsn = dsn.replace("asyncpg://", "postgresql://", 1) # Tortoise's alias for the same driver
+    self.reconnect_delay = reconnect_delay
+    self._deliver: Deliver | None = None
+    self._connection = None
+    self._lock = asyncio.Lock() # asyncpg runs one operation at a time per connection
+    self._channels: Set[int] = set()
+    self._received: asyncio.Queue = asyncio.Queue()
+    self._tasks: List[asyncio.Task] = []
+    self._closed = False
+    self.published = 0
+    self.received = 0
+    self.reconnects = 0
+
+  @staticmethod
+  def _channel(inquiry_id: int) -> str:
+    return f"inquiry_messages_{inquiry_id}"
+
+  async def start(self, deliver: Deliver):
+    self._deliver = deliver
+    await self._connect()
+    self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+
+  async def _connect(self):
+    import asyncpg # type: ignore
+
+    connection = await asyncpg.connect(self.dsn)
+    connection.add_termination_listener(self._on_termination)
+    async with self._lock:
+      self._connection = connection
+      for inquiry_id in self._channels:
+        await connection.add_listener(self._channel(inquiry_id), self._on_notify)
+
+  def _on_termination(self, connection):
+    if not self._closed:
+      logger.warning("Message broker connection lost, reconnecting")
+      self._tasks.append(asyncio.create_task(self._reconnect()))
+
+  async def _reconnect(self):
+    while not self._closed:
+      await asyncio.sleep(self.reconnect_delay)
+      try:
+        await self._connect()
+        self.reconnects += 1
+        return
+      except Exception as e:
+        logger.warning("Message broker reconnect failed: %s", e)
+
+  async def subscribe(self, inquiry_id: int):
+    async with self._lock:
+      if inquiry_id not in self._channels:
+        self._channels.add(inquiry_id)
+        if not self._connection.is_closed(): # otherwise the reconnect listens on it
+          await self._connection.add_listener(self._channel(inquiry_id), self._on_notify)
+
+  async def unsubscribe(self, inquiry_id: int):
+    async with self._lock:
+      if inquiry_id in self._channels:
+        self._channels.discard(inquiry_id)
+        if not self._connection.is_closed():
+          await self._connection.remove_listener(self._channel(inquiry_id), self._on_notify)
+
+  async def publish(self, message: dict):
+    payload = json.dumps(message)
+    if len(payload.encode()) > self.PAYLOAD_LIMIT:
+      payload = json.dumps({"id": message["id"], "inquiry_id": message["inquiry_id"]})
+    # sent through the ORM's pool, so publishing never waits on the listening connection
+    await Tortoise.get_connection("default").execute_query("SELECT pg_notify($1, $2)", [self._channel(message["inquiry_id"]), payload])
+    self.published += 1
+
+  def _on_notify(self, connection, pid, channel, payload):
+    self._received.put_nowait(payload)
+
+  async def _dispatch_loop(self):
+    # one consumer, so messages are delivered in the order they were notified
+    while True:
+      payload = await self._received.get()
+      try:
+        message = json.loads(payload)
+        if "content" not in message:
+          stored = await models.Message.get_or_none(id=message["id"])
+          if stored is None:
+            continue
+          message = message_payload(stored)
+        self.received += 1
+        await self._deliver(message)
+      except Exception as e:
+        logger.warning("Failed to deliver a broadcast message: %s", e)
+
+  async def close(self):
+    self._closed = True
+    for task in self._tasks:
+      task.cancel()
+    self._tasks = []
+    if self._connection and not self._connection.is_closed():
+      await self._connection.close()
+
+  def stats(self) -> dict:
+    return {"backend": "postgres", "subscriptions": len(self._channels), "published": self.published, "received": self.received, "reconnects": self.reconnects}
+
+def create_message_broker(setting: str, dsn: str | None):
+  """MESSAGE_BROKER setting: "memory" or "postgres" (LISTEN/NOTIFY on the DATABASE_URL database)"""
+  if setting == "postgres":
+    if not dsn:
+      raise RuntimeError("MESSAGE_BROKER=postgres needs DATABASE_URL")
+    return PostgresBroker(dsn)
+  return InProcessBroker()
+
+class _Connection:
+  """One socket's outbound queue and the writer task draining it"""
+
+  __slots__ = ("queue", "writer")
+
+  def __init__(self, queue_size: int):
+    self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    self.writer: asyncio.Task | None = None
+
+class InquiryMessagesManager:
+  """Holds this worker's sockets per inquiry. Delivery only queues a message per socket, so no socket waits on
+  another: a socket whose queue overflows is closed as too slow, and one that fails to send is dropped"""
+
+  EVICTED_CLOSE_CODE = 1013 # "try again later": the client reconnects and catches up with after_id
+
+  def __init__(self, broker=None, queue_size: int = 64):
+    self.active_connections: Dict[int, Dict[WebSocket, _Connection]] = {}
+    self.broker = broker or InProcessBroker()
+    self.queue_size = queue_size
+    self._subscribed: Set[int] = set()
+    self._subscription_lock = asyncio.Lock()
+    self._tasks: Set[asyncio.Task] = set()
+    self.evicted = 0
+    self.failed = 0
+
+  async def start(self, broker=None, queue_size: int | None = None):
+    if broker is not None:
+      self.broker = broker
+    if queue_size is not None:
+      self.queue_size = queue_size
+    await self.broker.start(self.deliver)
+
+  async def close(self):
+    for connections in self.active_connections.values():
+      for connection in connections.values():
+        connection.writer.cancel()
+    for task in list(self._tasks):
+      task.cancel()
+    await self.broker.close()
+
+  def _spawn(self, coroutine):
+    task = asyncio.create_task(coroutine)
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _update_subscription(self, inquiry_id: int):
+    # brings the broker in line with whether any socket is still open, however connects and drops interleave
+    async with self._subscription_lock:
+      if inquiry_id in self.active_connections and inquiry_id not in self._subscribed:
+        await self.broker.subscribe(inquiry_id)
+        self._subscribed.add(inquiry_id)
+      elif inquiry_id not in self.active_connections and inquiry_id in self._subscribed:
+        self._subscribed.discard(inquiry_id)
+        await self.broker.unsubscribe(inquiry_id)
+
+  def _drop(self, inquiry_id: int, websocket: WebSocket):
+    connections = self.active_connections.get(inquiry_id)
+    connection = connections.pop(websocket, None) if connections is not None else None
+    if connection is None:
+      return
+    if not connections:
+      del self.active_connections[inquiry_id]
+    if connection.writer is not asyncio.current_task():
+      connection.writer.cancel()
+
+  async def connect(self, inquiry_id: int, websocket: WebSocket): # the socket is already accepted and authenticated
+    connection = _Connection(self.queue_size)
+    connection.writer = asyncio.create_task(self._write(inquiry_id, websocket, connection.queue))
+    self.active_connections.setdefault(inquiry_id, {})[websocket] = connection
+    await self._update_subscription(inquiry_id)
+
+  async def disconnect(self, inquiry_id: int, websocket: WebSocket):
+    self._drop(inquiry_id, websocket)
+    await self._update_subscription(inquiry_id)
+
+  async def _write(self, inquiry_id: int, websocket: WebSocket, queue: asyncio.Queue):
+    try:
+      while True:
+        await websocket.send_json(await queue.get())
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      self.failed += 1
+      logger.info("Dropping a socket of inquiry %d that failed to send: %s", inquiry_id, e)
+      self._drop(inquiry_id, websocket)
+      await self._update_subscription(inquiry_id)
+
+  async def _evict(self, inquiry_id: int, websocket: WebSocket):
     try:
-      for connection in self.active_connections.get(message["inquiry_id"], []):
-        await connection.send_json(message)
+      await asyncio.wait_for(websocket.close(code=self.EVICTED_CLOSE_CODE), timeout=5)
+    except Exception:
+      pass # the socket is gone either way
+    await self._update_subscription(inquiry_id)
+
+  async def broadcast(self, message: dict):
+    try: # the message is already stored, so a failed broadcast only delays it until the client next fetches
+      await self.broker.publish(message)
     except Exception as e:
-      print(e)
+      logger.warning("Failed to broadcast a message: %s", e)
+
+  def _enqueue(self, inquiry_id: int, websocket: WebSocket, connection: _Connection, frame: dict):
+    try:
+      connection.queue.put_nowait(frame)
+    except asyncio.QueueFull:
+      self.evicted += 1
+      logger.info("Closing a socket of inquiry %d that fell %d messages behind", inquiry_id, self.queue_size)
+      self._drop(inquiry_id, websocket)
+      self._spawn(self._evict(inquiry_id, websocket))
+
+  def send(self, inquiry_id: int, websocket: WebSocket, frame: dict):
+    # a reply to one socket, queued behind what its writer is already sending so that frames never interleave
+    connection = self.active_connections.get(inquiry_id, {}).get(websocket)
+    if connection is not None:
+      self._enqueue(inquiry_id, websocket, connection, frame)
+
+  async def deliver(self, message: dict):
+    # queues the message for each socket this worker holds on its inquiry, without waiting on any of them
+    for websocket, connection in list(self.active_connections.get(message["inquiry_id"], {}).items()):
+      self._enqueue(message["inquiry_id"], websocket, connection, message)
+
+  def stats(self) -> dict:
+    return {
+      "inquiries": len(self.active_connections),
+      "sockets": sum(len(connections) for connections in self.active_connections.values()),
+      "queued": sum(connection.queue.qsize() for connections in self.active_connections.values() for connection in connections.values()),
+      "evicted": self.evicted,
+      "failed": self.failed,
+      "queue_size": self.queue_size,
+      "broker": self.broker.stats(),
+    }
 
-inquiry_messages_manager = InquiryMessagesManager()
\ No newline at end of file
+inquiry_messages_manager = InquiryMessagesManager()
@@ -0,0 +1,103 @@
+# The schema as Tortoise.generate_schemas() created it before migrations existed. Every statement is
+# IF NOT EXISTS, so databases that were created by generate_schemas are adopted as they are.
+
+BASELINE_SQL = """
+CREATE TABLE IF NOT EXISTS "appuser" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "firstname" VARCHAR(40) NOT NULL,
+    "lastname" VARCHAR(40) NOT NULL,
+    "email" VARCHAR(40) NOT NULL UNIQUE,
+    "firebase_user_id" VARCHAR(200) NOT NULL UNIQUE,
+    "average_user_rating" DOUBLE PRECISION,
+    "user_profile_bio" TEXT,
+    "user_bio_picture_src_list" TEXT,
+    "account_created" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "last_login" TIMESTAMPTZ,
+    "profile_picture_src" VARCHAR(200),
+    "prefecture" VARCHAR(40),
+    "city_ward" VARCHAR(40),
+    "street_address" VARCHAR(40),
+    "postal_code" VARCHAR(40),
+    "account_language" VARCHAR(8)   DEFAULT 'english',
+    "english_ok" BOOL   DEFAULT False,
+    "japanese_ok" BOOL   DEFAULT False,
+    "is_sitter" BOOL   DEFAULT False
+);
+COMMENT ON COLUMN "appuser"."account_language" IS 'ENGLISH: english\\nJAPANESE: japanese';
+CREATE TABLE IF NOT EXISTS "availability" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "available_date" DATE NOT NULL,
+    "appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "inquiry" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "inquiry_status" VARCHAR(9) NOT NULL  DEFAULT 'requested',
+    "start_date" DATE NOT NULL,
+    "end_date" DATE NOT NULL,
+    "desired_service" VARCHAR(12) NOT NULL,
+    "pet_id_list" VARCHAR(80),
+    "additional_info" TEXT,
+    "inquiry_submitted" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "inquiry_finalized" TIMESTAMPTZ,
+    "owner_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE,
+    "sitter_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+COMMENT ON COLUMN "inquiry"."inquiry_status" IS 'REQUESTED: requested\\nAPPROVED: approved\\nREJECTED: rejected';
+COMMENT ON COLUMN "inquiry"."desired_service" IS 'OWNER_HOUSE: owner_house\\nSITTER_HOUSE: sitter_house\\nVISIT: visit';
+CREATE TABLE IF NOT EXISTS "message" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "content" TEXT NOT NULL,
+    "time_sent" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "author_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE,
+    "inquiry_id" INT NOT NULL REFERENCES "inquiry" ("id") ON DELETE CASCADE,
+    "recipient_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "pet" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(40) NOT NULL,
+    "type_of_animal" VARCHAR(6) NOT NULL,
+    "subtype" VARCHAR(40),
+    "gender" VARCHAR(6),
+    "weight" DOUBLE PRECISION,
+    "birthday" DATE,
+    "known_allergies" VARCHAR(80),
+    "medications" VARCHAR(80),
+    "special_needs" TEXT,
+    "profile_picture_src" VARCHAR(200),
+    "pet_bio_picture_src_list" TEXT,
+    "posted_date" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "last_updated" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "profile_bio" TEXT,
+    "appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+COMMENT ON COLUMN "pet"."type_of_animal" IS 'DOG: dog\\nCAT: cat\\nFISH: fish\\nRABBIT: rabbit\\nBIRD: bird';
+COMMENT ON COLUMN "pet"."gender" IS 'MALE: male\\nFEMALE: female';
+CREATE TABLE IF NOT EXISTS "review" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "recipient_appuser_type" VARCHAR(6) NOT NULL,
+    "comment" TEXT,
+    "score" INT NOT NULL,
+    "submission_date" TIMESTAMPTZ   DEFAULT CURRENT_TIMESTAMP,
+    "author_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE,
+    "recipient_appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+COMMENT ON COLUMN "review"."recipient_appuser_type" IS 'OWNER: owner\\nSITTER: sitter';
+CREATE TABLE IF NOT EXISTS "sitter" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "sitter_profile_bio" TEXT NOT NULL,
+    "sitter_bio_picture_src_list" TEXT,
+    "sitter_house_ok" BOOL   DEFAULT False,
+    "owner_house_ok" BOOL   DEFAULT False,
+    "visit_ok" BOOL   DEFAULT False,
+    "dogs_ok" BOOL   DEFAULT False,
+    "cats_ok" BOOL   DEFAULT False,
+    "fish_ok" BOOL   DEFAULT False,
+    "birds_ok" BOOL   DEFAULT False,
+    "rabbits_ok" BOOL   DEFAULT False,
+    "appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE
+);
+"""
+
+async def upgrade(connection):
+  await connection.execute_script(BASELINE_SQL)
@@ -0,0 +1,27 @@
+# Indexes for the sitter search, inquiry list, message history and availability lookups, plus one availability row per sitter per day.
+# Plain CREATE INDEX (not CONCURRENTLY) so the whole migration stays in one transaction; the tables are briefly write locked.
+
+SITTER_FLAGS = ["sitter_house_ok", "owner_house_ok", "visit_ok", "dogs_ok", "cats_ok", "fish_ok", "birds_ok", "rabbits_ok"]
+
+async def upgrade(connection):
+  # keep the oldest row of each duplicate (appuser_id, available_date) pair before enforcing uniqueness
+  await connection.execute_script("""
+    DELETE FROM "availability" duplicate
+    USING "availability" original
+    WHERE duplicate."appuser_id" = original."appuser_id"
+      AND duplicate."available_date" = original."available_date"
+      AND duplicate."id" > original."id";
+    ALTER TABLE "availability" ADD CONSTRAINT "uid_availabilit_appuser_9bccc0" UNIQUE ("appuser_id", "available_date");
+
+    CREATE INDEX IF NOT EXISTS "idx_appuser_prefecture_city_ward" ON "appuser" ("prefecture", "city_ward");
+    CREATE INDEX IF NOT EXISTS "idx_sitter_appuser_id" ON "sitter" ("appuser_id");
+    CREATE INDEX IF NOT EXISTS "idx_inquiry_owner_id" ON "inquiry" ("owner_appuser_id", "id");
+    CREATE INDEX IF NOT EXISTS "idx_inquiry_sitter_id" ON "inquiry" ("sitter_appuser_id", "id");
+    CREATE INDEX IF NOT EXISTS "idx_message_inquiry_id" ON "message" ("inquiry_id", "id");
+    CREATE INDEX IF NOT EXISTS "idx_pet_appuser_id" ON "pet" ("appuser_id", "id");
+    CREATE INDEX IF NOT EXISTS "idx_review_recipient_type" ON "review" ("recipient_appuser_id", "recipient_appuser_type");
+  """)
+
+  # one small partial index per capability flag: each only holds the sitters offering that service
+  for flag in SITTER_FLAGS:
+    await connection.execute_script(f'CREATE INDEX IF NOT EXISTS "idx_sitter_{flag}" ON "sitter" ("appuser_id") WHERE "{flag}" = true')
@@ -0,0 +1,33 @@
+# The comma separated list columns move to relational storage: picture lists become text[] columns, and the
+# pets of an inquiry get an inquiry_pet row each so that "inquiries involving pet X" is an index lookup.
+# inquiry.pet_id_list stays, widened from VARCHAR(80), as the string the API returns.
+
+PICTURE_LIST_COLUMNS = [("appuser", "user_bio_picture_src_list"), ("sitter", "sitter_bio_picture_src_list"), ("pet", "pet_bio_picture_src_list")]
+
+async def upgrade(connection):
+  for table, column in PICTURE_LIST_COLUMNS:
+    await connection.execute_script(f"""
+      ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE TEXT[]
+      USING CASE WHEN "{column}" IS NULL THEN NULL ELSE array_remove(regexp_split_to_array(trim("{column}"), '\\s*,\\s*'), '') END
+    """)
+
+  await connection.execute_script("""
+    ALTER TABLE "inquiry" ALTER COLUMN "pet_id_list" TYPE TEXT;
+
+    CREATE TABLE IF NOT EXISTS "inquiry_pet" (
+      "id" SERIAL NOT NULL PRIMARY KEY,
+      "inquiry_id" INT NOT NULL REFERENCES "inquiry" ("id") ON DELETE CASCADE,
+      "pet_id" INT NOT NULL,
+      "position" INT NOT NULL,
+      CONSTRAINT "uid_inquiry_pet_inquiry_pet" UNIQUE ("inquiry_id", "pet_id")
+    );
+    CREATE INDEX IF NOT EXISTS "idx_inquiry_pet_pet_id" ON "inquiry_pet" ("pet_id");
+
+    -- entries that are not pet ids cannot be rows; the first occurrence of a repeated id keeps its position
+    INSERT INTO "inquiry_pet" ("inquiry_id", "pet_id", "position")
+    SELECT "inquiry"."id", trim(entry.value)::INT, entry.position - 1
+    FROM "inquiry", unnest(string_to_array("inquiry"."pet_id_list", ',')) WITH ORDINALITY AS entry(value, position)
+    WHERE trim(entry.value) ~ '^[0-9]{1,9}$'
+    ORDER BY "inquiry"."id", entry.position
+    ON CONFLICT DO NOTHING;
+  """)
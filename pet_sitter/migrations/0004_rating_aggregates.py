@@ -0,0 +1,39 @@
+# Per-role review counts and score sums on appuser, backfilled from the existing reviews. Appusers with reviews
+# get average_user_rating recomputed from them; the rest keep theirs. The backfill is a copy of
+# ratings.RECOMPUTE_SQL as it stood when this migration was written, so later changes there do not alter it.
+
+async def upgrade(connection):
+  await connection.execute_script("""
+    ALTER TABLE "appuser"
+      ADD COLUMN IF NOT EXISTS "owner_review_count" INT NOT NULL DEFAULT 0,
+      ADD COLUMN IF NOT EXISTS "owner_score_sum" INT NOT NULL DEFAULT 0,
+      ADD COLUMN IF NOT EXISTS "sitter_review_count" INT NOT NULL DEFAULT 0,
+      ADD COLUMN IF NOT EXISTS "sitter_score_sum" INT NOT NULL DEFAULT 0;
+  """)
+  await connection.execute_script("""
+    WITH totals AS (
+      SELECT "appuser"."id",
+        count("review"."id") FILTER (WHERE "review"."recipient_appuser_type" = 'owner') AS owner_count,
+        COALESCE(sum("review"."score") FILTER (WHERE "review"."recipient_appuser_type" = 'owner'), 0) AS owner_sum,
+        count("review"."id") FILTER (WHERE "review"."recipient_appuser_type" = 'sitter') AS sitter_count,
+        COALESCE(sum("review"."score") FILTER (WHERE "review"."recipient_appuser_type" = 'sitter'), 0) AS sitter_sum
+      FROM "appuser" LEFT JOIN "review" ON "review"."recipient_appuser_id" = "appuser"."id"
+      GROUP BY "appuser"."id"
+    ), fixed AS (
+      SELECT totals.*,
+        CASE WHEN owner_count + sitter_count > 0 THEN (owner_sum + sitter_sum)::DOUBLE PRECISION / (owner_count + sitter_count) END AS average
+      FROM totals
+    )
+    UPDATE "appuser" SET
+      "owner_review_count" = fixed.owner_count,
+      "owner_score_sum" = fixed.owner_sum,
+      "sitter_review_count" = fixed.sitter_count,
+      "sitter_score_sum" = fixed.sitter_sum,
+      "average_user_rating" = COALESCE(fixed.average, "appuser"."average_user_rating")
+    FROM fixed
+    WHERE "appuser"."id" = fixed."id" AND (
+      ("appuser"."owner_review_count", "appuser"."owner_score_sum", "appuser"."sitter_review_count", "appuser"."sitter_score_sum")
+        IS DISTINCT FROM (fixed.owner_count, fixed.owner_sum, fixed.sitter_count, fixed.sitter_sum)
+      OR (fixed.average IS NOT NULL AND "appuser"."average_user_rating" IS DISTINCT FROM fixed.average)
+    );
+  """)
@@ -0,0 +1,27 @@
+# One availability bitmap per sitter per month, kept beside the per-day availability rows and backfilled from them.
+# The backfill is a copy of availability_calendar.REBUILD_MONTHS_SQL as it stood when this migration was written,
+# so later changes there do not alter it.
+
+async def upgrade(connection):
+  await connection.execute_script("""
+    CREATE TABLE IF NOT EXISTS "availability_month" (
+      "id" SERIAL NOT NULL PRIMARY KEY,
+      "appuser_id" INT NOT NULL REFERENCES "appuser" ("id") ON DELETE CASCADE,
+      "month" DATE NOT NULL,
+      "days" INT NOT NULL DEFAULT 0,
+      CONSTRAINT "uid_availabilit_appuser_month" UNIQUE ("appuser_id", "month")
+    );
+  """)
+  await connection.execute_script("""
+    WITH months AS (
+      SELECT "appuser_id", date_trunc('month', "available_date")::DATE AS month, bit_or(1 << (EXTRACT(DAY FROM "available_date")::INT - 1)) AS days
+      FROM "availability"
+      GROUP BY 1, 2
+    ), emptied AS (
+      DELETE FROM "availability_month"
+      WHERE NOT EXISTS (SELECT 1 FROM months WHERE months."appuser_id" = "availability_month"."appuser_id" AND months.month = "availability_month"."month")
+    )
+    INSERT INTO "availability_month" ("appuser_id", "month", "days")
+    SELECT "appuser_id", month, days FROM months
+    ON CONFLICT ("appuser_id", "month") DO UPDATE SET "days" = EXCLUDED."days" WHERE "availability_month"."days" <> EXCLUDED."days";
+  """)
@@ -0,0 +1,55 @@
+from tortoise import Tortoise # type: ignore
+from tortoise.transactions import in_transaction # type: ignore
+from dotenv import load_dotenv # type: ignore
+from typing import List
+import importlib
+import asyncio
+import pkgutil
+import re
+import os
+
+# Versioned schema migrations. Each module in this package named NNNN_description.py defines
+# `async def upgrade(connection)`; pending versions are applied in order, each recorded in schema_migration.
+
+MIGRATION_LOCK_ID = 727_001 # pg advisory lock key, so concurrently starting workers apply migrations once
+
+def available_migrations() -> List[str]:
+  return sorted(module.name for module in pkgutil.iter_modules(__path__) if re.match(r"^\d{4}_", module.name))
+
+async def migrate() -> List[str]:
+  applied = []
+
+  async with in_transaction() as connection:
+    await connection.execute_query("SELECT pg_advisory_xact_lock($1)", [MIGRATION_LOCK_ID])
+    await connection.execute_script("""
+      CREATE TABLE IF NOT EXISTS "schema_migration" (
+        "version" VARCHAR(100) NOT NULL PRIMARY KEY,
+        "applied_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+      )
+    """)
+    _, rows = await connection.execute_query('SELECT "version" FROM "schema_migration"')
+    done = {row["version"] for row in rows}
+
+    for version in available_migrations():
+      if version in done:
+        continue
+      module = importlib.import_module(f"{__name__}.{version}")
+      await module.upgrade(connection)
+      await connection.execute_query('INSERT INTO "schema_migration" ("version") VALUES ($1)', [version])
+      applied.append(version)
+
+  return applied
+
+def main():
+  """Launched with poetry run migrate, to apply migrations without starting the app"""
+  load_dotenv()
+
+  async def run():
+    await Tortoise.init(db_url=os.getenv("DATABASE_URL"), modules={"models": ["pet_sitter.models"]})
+    try:
+      applied = await migrate()
+      print(f"Applied migrations: {applied}" if applied else "Database schema is up to date")
+    finally:
+      await Tortoise.close_connections()
+
+  asyncio.run(run())
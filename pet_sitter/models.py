@@ -1,5 +1,26 @@
 from tortoise import fields, models # type: ignore
+from tortoise.indexes import Index, PartialIndex # type: ignore
+from tortoise.contrib.postgres.fields import ArrayField # type: ignore
 from enum import Enum
+from pet_sitter.ratings import role_rating
+
+# Indexes and constraints are created by pet_sitter/migrations; the Meta declarations below mirror them
+
+class CSVArrayField(ArrayField):
+  """A text[] column that reads and writes as the comma separated string the API has always used"""
+
+  def __init__(self, **kwargs):
+    super().__init__(element_type="text", **kwargs)
+
+  def to_db_value(self, value, instance):
+    if isinstance(value, str):
+      return [item.strip() for item in value.split(",") if item.strip()]
+    return value
+
+  def to_python_value(self, value):
+    if isinstance(value, list):
+      return ",".join(value)
+    return value
 
 class InquiryStatus(Enum):
   REQUESTED = "requested"
@@ -36,9 +57,9 @@ class Appuser(models.Model):
   lastname = fields.CharField(max_length=40)
   email = fields.CharField(unique=True, max_length=40)
   firebase_user_id = fields.CharField(unique=True, max_length=200)
-  average_user_rating = fields.FloatField(null=True)
+  average_user_rating = fields.FloatField(null=True) # legacy mean over reviews in both roles; see sitter_rating and owner_rating
   user_profile_bio = fields.TextField(null=True)
-  user_bio_picture_src_list = fields.TextField(null=True)
+  user_bio_picture_src_list = CSVArrayField(null=True)
   account_created = fields.DatetimeField(null=True, auto_now_add=True)
   last_updated = fields.DatetimeField(null=True, auto_now=True)
   last_login = fields.DatetimeField(null=True)
@@ -51,11 +72,27 @@ class Appuser(models.Model):
   english_ok = fields.BooleanField(default=False, null=True)
   japanese_ok = fields.BooleanField(default=False, null=True)
   is_sitter = fields.BooleanField(default=False, null=True)
+  # review aggregates per recipient_appuser_type, maintained by pet_sitter/ratings.py
+  owner_review_count = fields.IntField(default=0)
+  owner_score_sum = fields.IntField(default=0)
+  sitter_review_count = fields.IntField(default=0)
+  sitter_score_sum = fields.IntField(default=0)
+
+  @property
+  def sitter_rating(self) -> float | None:
+    return role_rating(self.sitter_review_count, self.sitter_score_sum)
+
+  @property
+  def owner_rating(self) -> float | None:
+    return role_rating(self.owner_review_count, self.owner_score_sum)
+
+  class Meta:
+    indexes = (Index(fields=("prefecture", "city_ward"), name="idx_appuser_prefecture_city_ward"),)
 
 class Sitter(models.Model):
   id = fields.IntField(primary_key=True)
   sitter_profile_bio = fields.TextField()
-  sitter_bio_picture_src_list = fields.TextField(null=True)
+  sitter_bio_picture_src_list = CSVArrayField(null=True)
   sitter_house_ok = fields.BooleanField(default=False, null=True)
   owner_house_ok = fields.BooleanField(default=False, null=True)
   visit_ok = fields.BooleanField(default=False, null=True)
@@ -65,6 +102,12 @@ class Sitter(models.Model):
   birds_ok = fields.BooleanField(default=False, null=True)
   rabbits_ok = fields.BooleanField(default=False, null=True)
   appuser = fields.ForeignKeyField("models.Appuser", related_name="sitters", unique=True)
+
+  class Meta:
+    indexes = (Index(fields=("appuser_id",), name="idx_sitter_appuser_id"),) + tuple(
+      PartialIndex(fields=("appuser_id",), name=f"idx_sitter_{flag}", condition={flag: True})
+      for flag in ["sitter_house_ok", "owner_house_ok", "visit_ok", "dogs_ok", "cats_ok", "fish_ok", "birds_ok", "rabbits_ok"]
+    )
   
 class Pet(models.Model):
   id = fields.IntField(primary_key=True)
@@ -78,17 +121,34 @@ class Pet(models.Model):
   medications = fields.CharField(null=True, max_length=80)
   special_needs = fields.TextField(null=True)
   profile_picture_src = fields.CharField(null=True, max_length=200)
-  pet_bio_picture_src_list = fields.TextField(null=True)
+  pet_bio_picture_src_list = CSVArrayField(null=True)
   appuser = fields.ForeignKeyField("models.Appuser", related_name="pets")
   posted_date = fields.DatetimeField(auto_now_add=True, null=True)
   last_updated = fields.DatetimeField(auto_now=True, null=True)
   profile_bio = fields.TextField(null=True)
 
+  class Meta:
+    indexes = (Index(fields=("appuser_id", "id"), name="idx_pet_appuser_id"),)
+
 class Availability(models.Model):
   id = fields.IntField(primary_key=True)
   appuser = fields.ForeignKeyField("models.Appuser", related_name="availability")
   available_date = fields.DateField()
 
+  class Meta:
+    unique_together = (("appuser", "available_date"),)
+
+class AvailabilityMonth(models.Model):
+  # the same dates as the sitter's Availability rows, one bitmap per month: bit 0 is the 1st, bit 30 the 31st
+  id = fields.IntField(primary_key=True)
+  appuser = fields.ForeignKeyField("models.Appuser", related_name="availability_months", on_delete=fields.CASCADE)
+  month = fields.DateField() # first day of the month
+  days = fields.IntField(default=0)
+
+  class Meta:
+    table = "availability_month"
+    unique_together = (("appuser", "month"),)
+
 class Review(models.Model):
   id = fields.IntField(primary_key=True)
   author_appuser = fields.ForeignKeyField("models.Appuser", related_name="author_reviews")
@@ -98,6 +158,9 @@ class Review(models.Model):
   recipient_appuser = fields.ForeignKeyField("models.Appuser", related_name="recipient_reviews")
   submission_date = fields.DatetimeField(auto_now_add=True, null=True)
 
+  class Meta:
+    indexes = (Index(fields=("recipient_appuser_id", "recipient_appuser_type"), name="idx_review_recipient_type"),)
+
 class Inquiry(models.Model):
   id = fields.IntField(primary_key=True)
   owner_appuser = fields.ForeignKeyField("models.Appuser", related_name="owner_inquiries")
@@ -106,15 +169,35 @@ class Inquiry(models.Model):
   start_date = fields.DateField()
   end_date = fields.DateField()
   desired_service = fields.CharEnumField(PetServices)
-  pet_id_list = fields.CharField(max_length=80, null=True)
+  pet_id_list = fields.TextField(null=True) # kept in step with inquiry_pet, which is what queries use
   additional_info = fields.TextField(null=True)
   inquiry_submitted = fields.DatetimeField(auto_now_add=True, null=True)
   inquiry_finalized = fields.DatetimeField(null=True)
 
+  class Meta:
+    indexes = (
+      Index(fields=("owner_appuser_id", "id"), name="idx_inquiry_owner_id"),
+      Index(fields=("sitter_appuser_id", "id"), name="idx_inquiry_sitter_id"),
+    )
+
+class InquiryPet(models.Model):
+  id = fields.IntField(primary_key=True)
+  inquiry = fields.ForeignKeyField("models.Inquiry", related_name="inquiry_pets", on_delete=fields.CASCADE)
+  pet_id = fields.IntField() # not a foreign key: an inquiry keeps the ids of pets deleted since, reported as not found
+  position = fields.IntField() # order within pet_id_list
+
+  class Meta:
+    table = "inquiry_pet"
+    unique_together = (("inquiry", "pet_id"),)
+    indexes = (Index(fields=("pet_id",), name="idx_inquiry_pet_pet_id"),)
+
 class Message(models.Model):
   id = fields.IntField(primary_key=True)
   inquiry = fields.ForeignKeyField("models.Inquiry", related_name="messages")
   author_appuser = fields.ForeignKeyField("models.Appuser", related_name="author_messages")
   recipient_appuser = fields.ForeignKeyField("models.Appuser", related_name="recipient_messages")
   content = fields.TextField()
-  time_sent = fields.DatetimeField(auto_now_add=True, null=True)
\ No newline at end of file
+  time_sent = fields.DatetimeField(auto_now_add=True, null=True)
+
+  class Meta:
+    indexes = (Index(fields=("inquiry_id", "id"), name="idx_message_inquiry_id"),)
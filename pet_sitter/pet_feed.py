@@ -0,0 +1,117 @@
+from array import array
+from bisect import bisect_left
+from typing import List
+import pet_sitter.models as models
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MASK64 = (1 << 64) - 1
+
+def _round(seed: int, round_number: int, value: int) -> int:
+  # splitmix64 finalizer over the seed, round and half-block
+  z = (seed * 0x9E3779B97F4A7C15 + round_number * 0xD1B54A32D192ED03 + value) & MASK64
+  z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+  z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+  return z ^ (z >> 31)
+
+def seeded_position(index: int, size: int, seed: int) -> int:
+  """Where index lands in a pseudo-random permutation of range(size) chosen by seed, in constant time:
+  a 4-round Feistel network over the next even power of two, cycle-walked back into range"""
+  bits = max((size - 1).bit_length(), 2)
+  bits += bits % 2
+  half = bits // 2
+  half_mask = (1 << half) - 1
+
+  position = index
+  while True:
+    left, right = position >> half, position & half_mask
+    for round_number in range(4):
+      left, right = right, left ^ (_round(seed, round_number, right) & half_mask)
+    position = (left << half) | right
+    if position < size:
+      return position
+
+class PetFeed:
+  """Every pet id held in memory, so a page of a seeded random order costs the same however many pets exist"""
+
+  def __init__(self):
+    self._ids = array("q") # ascending, so every worker holding the same pets produces the same order
+    self._pending: List[tuple] | None = None # changes made while a reload is running, replayed onto its result
+    self.ready = False
+    self.last_loaded = 0.0
+    self._refresh_task: asyncio.Task | None = None
+
+  def __len__(self) -> int:
+    return len(self._ids)
+
+  @staticmethod
+  def _add(ids: array, pet_id: int):
+    position = bisect_left(ids, pet_id)
+    if position == len(ids) or ids[position] != pet_id:
+      ids.insert(position, pet_id)
+
+  @staticmethod
+  def _remove(ids: array, pet_id: int):
+    position = bisect_left(ids, pet_id)
+    if position < len(ids) and ids[position] == pet_id:
+      del ids[position]
+
+  def add(self, pet_id: int):
+    if self._pending is not None:
+      self._pending.append((True, pet_id))
+    self._add(self._ids, pet_id)
+
+  def remove(self, pet_id: int):
+    if self._pending is not None:
+      self._pending.append((False, pet_id))
+    self._remove(self._ids, pet_id)
+
+  async def reload(self):
+    self._pending = []
+    try:
+      ids = array("q", await models.Pet.all().order_by("id").values_list("id", flat=True))
+    except Exception:
+      self._pending = None
+      raise
+
+    for added, pet_id in self._pending:
+      if added:
+        self._add(ids, pet_id)
+      else:
+        self._remove(ids, pet_id)
+    self._ids = ids
+    self._pending = None
+    self.ready = True
+    self.last_loaded = time.time()
+
+  def page(self, seed: int, page: int, page_size: int) -> List[int]:
+    """Pet ids on page of the order chosen by seed; the same seed pages through every pet once"""
+    size = len(self._ids)
+    start = page * page_size
+    return [self._ids[seeded_position(index, size, seed)] for index in range(start, min(start + page_size, size))]
+
+  def start_refreshing(self, interval: float):
+    # picks up pets created or deleted by other workers
+    if interval > 0 and self._refresh_task is None:
+      self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+  async def stop(self):
+    if self._refresh_task:
+      self._refresh_task.cancel()
+      self._refresh_task = None
+
+  async def _refresh_loop(self, interval: float):
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        await self.reload()
+      except Exception as e:
+        logger.warning("Pet feed reload failed: %s", e)
+
+  def stats(self) -> dict:
+    return {"ready": self.ready, "pets": len(self._ids), "last_loaded": self.last_loaded}
+
+pet_feed = PetFeed()
@@ -0,0 +1,61 @@
+from typing import Dict, List, Tuple
+import functools
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LATITUDE = 111.2
+
+Coordinates = Tuple[float, float]
+Location = Tuple[str, str]
+
+def distance_km(a: Coordinates, b: Coordinates) -> float:
+  lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+  h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+class CityGrid:
+  """Uniform latitude/longitude grid of city centroids, so a radius query only measures the cities in nearby cells"""
+
+  def __init__(self, city_coordinates: Dict[str, Dict[str, Coordinates]], cell_degrees: float = 0.25):
+    self.cell_degrees = cell_degrees
+    self._cells: Dict[Tuple[int, int], List[Tuple[Location, Coordinates]]] = {}
+    self._coordinates: Dict[Location, Coordinates] = {}
+    self._first_city: Dict[str, Location] = {}
+
+    for prefecture, cities in city_coordinates.items():
+      for city, coordinates in cities.items():
+        self._coordinates[(prefecture, city)] = coordinates
+        self._first_city.setdefault(prefecture, (prefecture, city))
+        self._cells.setdefault(self._cell(coordinates), []).append(((prefecture, city), coordinates))
+
+  def _cell(self, coordinates: Coordinates) -> Tuple[int, int]:
+    return math.floor(coordinates[0] / self.cell_degrees), math.floor(coordinates[1] / self.cell_degrees)
+
+  def locate(self, prefecture: str, city: str | None = None) -> Coordinates | None:
+    # without a known city, the prefecture's first listed city stands in for it (its capital)
+    coordinates = self._coordinates.get((prefecture, city))
+    if coordinates is None and prefecture in self._first_city:
+      coordinates = self._coordinates[self._first_city[prefecture]]
+    return coordinates
+
+  def within(self, origin: Coordinates, radius_km: float) -> List[Tuple[float, Location]]:
+    """(distance, (prefecture, city)) of every city within radius_km of origin, nearest first"""
+    latitude_span = radius_km / KM_PER_DEGREE_LATITUDE
+    longitude_span = radius_km / (KM_PER_DEGREE_LATITUDE * max(math.cos(math.radians(origin[0])), 0.01))
+    low_lat, low_lon = self._cell((origin[0] - latitude_span, origin[1] - longitude_span))
+    high_lat, high_lon = self._cell((origin[0] + latitude_span, origin[1] + longitude_span))
+
+    matches = []
+    for cell_lat in range(low_lat, high_lat + 1):
+      for cell_lon in range(low_lon, high_lon + 1):
+        for location, coordinates in self._cells.get((cell_lat, cell_lon), ()):
+          distance = distance_km(origin, coordinates)
+          if distance <= radius_km:
+            matches.append((distance, location))
+    matches.sort()
+    return matches
+
+@functools.lru_cache(maxsize=None)
+def city_grid() -> CityGrid:
+  import pet_sitter.locations as locations # built on first proximity search, like the other location tables
+  return CityGrid(locations.city_coordinates)
@@ -0,0 +1,82 @@
+from tortoise import Tortoise # type: ignore
+from dotenv import load_dotenv # type: ignore
+import asyncio
+import os
+
+# Per-role review aggregates stored on the recipient appuser. A new review adds to them in one UPDATE, so its
+# cost does not depend on how many reviews the recipient already has. An appuser's sitter rating and owner rating
+# are each derived from their own role's aggregates; average_user_rating, the mean over both roles, is kept only
+# as a legacy field for existing clients and is not used for ranking. RECOMPUTE_SQL rebuilds every aggregate from
+# the review table to repair any drift.
+
+ROLE_COLUMNS = {
+  "owner": ("owner_review_count", "owner_score_sum"),
+  "sitter": ("sitter_review_count", "sitter_score_sum"),
+}
+
+RECOMPUTE_SQL = """
+WITH totals AS (
+  SELECT "appuser"."id",
+    count("review"."id") FILTER (WHERE "review"."recipient_appuser_type" = 'owner') AS owner_count,
+    COALESCE(sum("review"."score") FILTER (WHERE "review"."recipient_appuser_type" = 'owner'), 0) AS owner_sum,
+    count("review"."id") FILTER (WHERE "review"."recipient_appuser_type" = 'sitter') AS sitter_count,
+    COALESCE(sum("review"."score") FILTER (WHERE "review"."recipient_appuser_type" = 'sitter'), 0) AS sitter_sum
+  FROM "appuser" LEFT JOIN "review" ON "review"."recipient_appuser_id" = "appuser"."id"
+  GROUP BY "appuser"."id"
+), fixed AS (
+  SELECT totals.*,
+    CASE WHEN owner_count + sitter_count > 0 THEN (owner_sum + sitter_sum)::DOUBLE PRECISION / (owner_count + sitter_count) END AS average
+  FROM totals
+)
+UPDATE "appuser" SET
+  "owner_review_count" = fixed.owner_count,
+  "owner_score_sum" = fixed.owner_sum,
+  "sitter_review_count" = fixed.sitter_count,
+  "sitter_score_sum" = fixed.sitter_sum,
+  "average_user_rating" = COALESCE(fixed.average, "appuser"."average_user_rating")
+FROM fixed
+WHERE "appuser"."id" = fixed."id" AND (
+  ("appuser"."owner_review_count", "appuser"."owner_score_sum", "appuser"."sitter_review_count", "appuser"."sitter_score_sum")
+    IS DISTINCT FROM (fixed.owner_count, fixed.owner_sum, fixed.sitter_count, fixed.sitter_sum)
+  OR (fixed.average IS NOT NULL AND "appuser"."average_user_rating" IS DISTINCT FROM fixed.average)
+)
+RETURNING "appuser"."id"
+"""
+
+def role_rating(review_count: int | None, score_sum: int | None) -> float | None:
+  """Mean score of the reviews received in one role, or None without any"""
+  return score_sum / review_count if review_count else None
+
+async def record_review(connection, recipient_appuser_id: int, recipient_appuser_type: str, score: int) -> dict | None:
+  """Adds one review to the recipient's aggregates on connection (the review insert's transaction), returning
+  the recipient's updated aggregates and legacy average_user_rating, or None when the recipient does not exist"""
+  count_column, sum_column = ROLE_COLUMNS[recipient_appuser_type]
+  # the row lock taken by the UPDATE serializes concurrent reviews of the same recipient
+  rows = await connection.execute_query_dict(f"""
+    UPDATE "appuser" SET
+      "{count_column}" = "{count_column}" + 1,
+      "{sum_column}" = "{sum_column}" + $1,
+      -- legacy, over both roles; ranking reads the sitter aggregates instead
+      "average_user_rating" = ("owner_score_sum" + "sitter_score_sum" + $1)::DOUBLE PRECISION / ("owner_review_count" + "sitter_review_count" + 1)
+    WHERE "id" = $2
+    RETURNING "owner_review_count", "owner_score_sum", "sitter_review_count", "sitter_score_sum", "average_user_rating"
+  """, [score, recipient_appuser_id])
+  return rows[0] if rows else None
+
+async def recompute_ratings(connection) -> int:
+  """Rebuilds every appuser's aggregates from their reviews, returning how many appusers had drifted"""
+  return len(await connection.execute_query_dict(RECOMPUTE_SQL))
+
+def main():
+  """Launched with poetry run recompute-ratings, to repair the rating aggregates without starting the app"""
+  load_dotenv()
+
+  async def run():
+    await Tortoise.init(db_url=os.getenv("DATABASE_URL"), modules={"models": ["pet_sitter.models"]})
+    try:
+      fixed = await recompute_ratings(Tortoise.get_connection("default"))
+      print(f"Recomputed rating aggregates, {fixed} appusers corrected")
+    finally:
+      await Tortoise.close_connections()
+
+  asyncio.run(run())
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+from typing import Dict, Set, Tuple
+import hashlib
+import json
+import time
+
+# Cached sitter search responses, grouped by the prefecture searched so that a write to a sitter in a
+# prefecture invalidates exactly that prefecture's entries. Backends share get/set/invalidate/stats.
+
+def search_cache_key(*parts) -> str:
+  return hashlib.sha256(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+
+class _CacheStats:
+  def __init__(self):
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+    self.hit_age_total = 0.0 # seconds between storing an entry and serving it, summed over hits
+    self.hit_age_max = 0.0
+
+  def record_hit(self, stored_at: float):
+    age = max(time.time() - stored_at, 0.0)
+    self.hits += 1
+    self.hit_age_total += age
+    self.hit_age_max = max(self.hit_age_max, age)
+
+  def as_dict(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_ratio": self.hits / lookups if lookups else 0.0,
+      "invalidations": self.invalidations,
+      "mean_hit_age_seconds": self.hit_age_total / self.hits if self.hits else 0.0,
+      "max_hit_age_seconds": self.hit_age_max,
+    }
+
+class InProcessSearchCache:
+  """Bounded LRU with a TTL, local to this worker; other workers' writes reach it only through the TTL"""
+
+  def __init__(self, ttl: float = 60, max_entries: int = 2048):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict() # (prefecture, key) -> (stored_at, value)
+    self._keys: Dict[str, Set[str]] = {} # prefecture -> keys, for invalidation
+    self._stats = _CacheStats()
+
+  def _evict(self, entry_key: Tuple[str, str]):
+    if self._entries.pop(entry_key, None) is not None:
+      keys = self._keys.get(entry_key[0])
+      if keys is not None:
+        keys.discard(entry_key[1])
+        if not keys:
+          del self._keys[entry_key[0]]
+
+  async def get(self, prefecture: str, key: str) -> dict | None:
+    entry = self._entries.get((prefecture, key))
+    if entry is None or time.time() - entry[0] >= self.ttl:
+      if entry is not None:
+        self._evict((prefecture, key))
+      self._stats.misses += 1
+      return None
+
+    self._entries.move_to_end((prefecture, key))
+    self._stats.record_hit(entry[0])
+    return entry[1]
+
+  async def set(self, prefecture: str, key: str, value: dict):
+    self._evict((prefecture, key))
+    self._entries[(prefecture, key)] = (time.time(), value)
+    self._keys.setdefault(prefecture, set()).add(key)
+
+    while len(self._entries) > self.max_entries:
+      self._evict(next(iter(self._entries)))
+
+  async def invalidate(self, *prefectures: str | None):
+    for prefecture in set(prefectures):
+      for key in list(self._keys.get(prefecture, ())):
+        self._evict((prefecture, key))
+      self._stats.invalidations += 1
+
+  async def close(self):
+    pass
+
+  async def stats(self) -> dict:
+    return {"backend": "memory", "size": len(self._entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl, **self._stats.as_dict()}
+
+class RedisSearchCache:
+  """Shared by every worker through a Redis-compatible server; invalidation bumps a per-prefecture generation
+  that is part of every key, and the superseded entries expire through their TTL"""
+
+  def __init__(self, url: str, ttl: float = 60, prefix: str = "sitter-search"):
+    try:
+      import redis.asyncio as redis # type: ignore
+    except ImportError:
+      raise RuntimeError("SEARCH_CACHE is a redis URL but the redis package is not installed (poetry install --extras redis)")
+
+    self.ttl = ttl
+    self.prefix = prefix
+    self._client = redis.from_url(url)
+    self._stats = _CacheStats()
+
+  def _generation_key(self, prefecture: str | None) -> str:
+    return f"{self.prefix}:generation:{prefecture}"
+
+  async def _entry_key(self, prefecture: str, key: str) -> str:
+    generation = await self._client.get(self._generation_key(prefecture))
+    return f"{self.prefix}:{prefecture}:{int(generation or 0)}:{key}"
+
+  async def get(self, prefecture: str, key: str) -> dict | None:
+    raw = await self._client.get(await self._entry_key(prefecture, key))
+    if raw is None:
+      self._stats.misses += 1
+      return None
+
+    stored_at, value = json.loads(raw)
+    self._stats.record_hit(stored_at)
+    return value
+
+  async def set(self, prefecture: str, key: str, value: dict):
+    await self._client.set(await self._entry_key(prefecture, key), json.dumps([time.time(), value]), px=int(self.ttl * 1000))
+
+  async def invalidate(self, *prefectures: str | None):
+    for prefecture in set(prefectures):
+      await self._client.incr(self._generation_key(prefecture))
+      self._stats.invalidations += 1
+
+  async def close(self):
+    await self._client.aclose()
+
+  async def stats(self) -> dict:
+    return {"backend": "redis", "ttl_seconds": self.ttl, **self._stats.as_dict()} # counts are this worker's own
+
+def create_search_cache(setting: str, ttl: float, max_entries: int):
+  """SEARCH_CACHE setting: "memory", "off" (None is returned), or a redis:// URL"""
+  if setting == "off":
+    return None
+  if setting.startswith(("redis://", "rediss://", "unix://")):
+    return RedisSearchCache(setting, ttl=ttl)
+  return InProcessSearchCache(ttl=ttl, max_entries=max_entries)
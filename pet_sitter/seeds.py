@@ -1,36 +1,54 @@
 import pet_sitter.models as models
 from faker import Faker # type: ignore
-from enum import Enum
-from random import choice, randint
-from datetime import datetime, timedelta
+from tortoise.transactions import in_transaction # type: ignore
+from random import Random
+from datetime import date, datetime, timedelta
+import pet_sitter.availability_calendar as availability_calendar
 import pet_sitter.locations as locations
+import pet_sitter.ratings as ratings
+import os
 
 fake = Faker("en_US")  # English locale for names
 fake_jp = Faker("ja_JP")  # Japanese locale for addresses
 
+BATCH_SIZE = 1000
+
+# Helper function to generate a random datetime between start and end
+def random_datetime(rng: Random, start: datetime, end: datetime) -> datetime:
+  return start + timedelta(seconds=rng.randint(0, max(int((end - start).total_seconds()), 0)))
+
+# Helper functions mirroring Faker's date_time_this_year(before_now, after_now)
+def this_year_before_now(rng: Random, now: datetime) -> datetime:
+  return random_datetime(rng, datetime(now.year, 1, 1), now)
+
+def this_year_after_now(rng: Random, now: datetime) -> datetime:
+  return random_datetime(rng, now, datetime(now.year, 12, 31, 23, 59, 59))
+
 # Helper function to generate random date ranges
-def generate_date_range():
-    start_date = fake.date_time_this_year(before_now=True, after_now=False)
-    end_date = fake.date_time_this_year(before_now=False, after_now=True)
+def generate_date_range(rng: Random, now: datetime):
+    start_date = this_year_before_now(rng, now)
+    end_date = this_year_after_now(rng, now)
     if start_date > end_date:
         start_date, end_date = end_date, start_date
     return start_date, end_date
 
-async def create_messages(inquiry: int, initiator: int, recipient: int):
-  await models.Message.create(
-    inquiry=inquiry,
-    author_appuser=initiator,
-    recipient_appuser=recipient,
-    content=f"Hey, how are you doing, {recipient.firstname}?"
-  )
-  print(f"Message sent from Appuser {initiator.id} for Appuser {recipient.id}")
-  await models.Message.create(
-    inquiry=inquiry,
-    author_appuser=recipient,
-    recipient_appuser=initiator,
-    content=f"I'm doing great! How about you, {initiator.firstname}?"
-  )
-  print(f"Message sent from Appuser {recipient.id} for Appuser {initiator.id}")
+def build_messages(next_id: int, inquiry_id: int, initiator: models.Appuser, recipient: models.Appuser):
+  return [
+    models.Message(
+      id=next_id,
+      inquiry_id=inquiry_id,
+      author_appuser_id=initiator.id,
+      recipient_appuser_id=recipient.id,
+      content=f"Hey, how are you doing, {recipient.firstname}?"
+    ),
+    models.Message(
+      id=next_id + 1,
+      inquiry_id=inquiry_id,
+      author_appuser_id=recipient.id,
+      recipient_appuser_id=initiator.id,
+      content=f"I'm doing great! How about you, {initiator.firstname}?"
+    ),
+  ]
 
 fakeOwnerCommentsList = [
    "Absolutely horrible. Never again.",
@@ -48,20 +66,19 @@ fakeSitterCommentsList = [
    "Their pet is so cute and well behaved. I'd watch them for free."
 ]
 
-async def create_review(author: int, recipient: int, recipient_type: str):
-  randomScore = randint(1,5)
+def build_review(rng: Random, review_id: int, author: models.Appuser, recipient: models.Appuser, recipient_type: str):
+  randomScore = rng.randint(1,5)
   index = randomScore - 1
 
-  await models.Review.create(
-    author_appuser=author,
-    recipient_appuser=recipient,
+  return models.Review(
+    id=review_id,
+    author_appuser_id=author.id,
+    recipient_appuser_id=recipient.id,
     recipient_appuser_type=recipient_type,
     score=randomScore,
     comment=fakeOwnerCommentsList[index] if recipient_type == "sitter" else fakeSitterCommentsList[index]
   )
 
-  print(f"Appuser {author.id} left a {randomScore}-star review for Appuser {recipient.id}")
-
 animal_breeds = {
     "dog": ["Labrador Retriever", "German Shepherd", "Golden Retriever"],
     "cat": ["Persian", "Maine Coon", "Siamese"],
@@ -111,35 +128,26 @@ pet_biographies = [
     "Loyal to the core, always by your side, no matter where you go."
 ]
 
-async def create_pet(appuser: int):
-  randomAnimal = fake.random_element(elements=["dog", "cat", "fish", "bird", "rabbit"])
+def build_pet(rng: Random, pet_id: int, appuser: models.Appuser, now: datetime):
+  randomAnimal = rng.choice(["dog", "cat", "fish", "bird", "rabbit"])
 
-  pet = await models.Pet.create(
-    name=fake.random_element(elements=top_pet_names[randomAnimal]),
+  return models.Pet(
+    id=pet_id,
+    name=rng.choice(top_pet_names[randomAnimal]),
     type_of_animal=randomAnimal,
-    subtype=fake.random_element(elements=animal_breeds[randomAnimal]),
-    gender=fake.random_element(elements=["male", "female"]),
-    weight=randint(1,30),
-    birthday=fake.date_time_this_decade(True, False),
+    subtype=rng.choice(animal_breeds[randomAnimal]),
+    gender=rng.choice(["male", "female"]),
+    weight=rng.randint(1,30),
+    birthday=random_datetime(rng, datetime(now.year - now.year % 10, 1, 1), now).date(),
     known_allergies="None",
     medications="None",
     special_needs="None",
-    profile_picture_src=fake.random_element(elements=pets[randomAnimal]),
-    pet_bio_picture_src_list=f'{fake.random_element(elements=yard)},{fake.random_element(elements=exterior)},{fake.random_element(elements=yard)}',
-    appuser=appuser,
-    profile_bio=fake.random_element(elements=pet_biographies),
+    profile_picture_src=rng.choice(pets[randomAnimal]),
+    pet_bio_picture_src_list=f'{rng.choice(yard)},{rng.choice(exterior)},{rng.choice(yard)}',
+    appuser_id=appuser.id,
+    profile_bio=rng.choice(pet_biographies),
   )
 
-  print(f"Added {pet.name} the {pet.type_of_animal} ({pet.subtype}) for Appuser {appuser.id}")
-
-async def get_all_pets_for_user(appuser_id: int): 
-  userPetsArray = await models.Pet.filter(appuser_id=appuser_id)
-
-  if userPetsArray:
-    return userPetsArray
-  else:
-    return []
-
 people = [
 	"https://live.staticflickr.com/62/207176169_60738224b6_c.jpg",
 	"https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQmkRHRtkrvooPGjWA-GsLDUOyy8hV7F8fRQA&s",
@@ -316,109 +324,159 @@ bios = [
   'Provides pet care with a deep respect for the animal’s individual personality and needs.'
 ]
 
-async def seed_db():
-  userAndInquiryCount = 3000
-  appusers = []
+def seed_settings() -> tuple[int, int]:
+  return int(os.getenv("SEED_SCALE", "3000")), int(os.getenv("SEED_RANDOM_SEED", "0"))
+
+# inserts one table's rows in batches, reporting progress per batch instead of per row
+async def bulk_insert(model, rows: list, connection):
+  for start in range(0, len(rows), BATCH_SIZE):
+    await model.bulk_create(rows[start:start + BATCH_SIZE], using_db=connection)
+    print(f"Seeding {model._meta.db_table}: {min(start + BATCH_SIZE, len(rows))}/{len(rows)}")
+
+# rows are inserted with explicit ids, so move each id sequence past them afterwards
+async def reset_id_sequences(connection, tables: list[str]):
+  if connection.capabilities.dialect != "postgres":
+    return
+  for table in tables:
+    await connection.execute_script(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))")
 
-  for _ in range(userAndInquiryCount):
-    prefectureCategory = fake.random_element(elements=["major", "minor"]) # uses major/minor to push more of the random results into Kanto
-    prefecture = fake.random_element(elements=locations.japan_prefectures[prefectureCategory])
+# builds every row in memory, deterministically for a given scale and seed, then bulk inserts them in one transaction
+def generate_seed_rows(scale: int, seed: int, now: datetime) -> dict:
+  rng = Random(seed)
+  fake.seed_instance(seed)
+  fake_jp.seed_instance(seed)
+
+  appusers = []
+  for i in range(scale):
+    prefectureCategory = rng.choice(["major", "minor"]) # uses major/minor to push more of the random results into Kanto
+    prefecture = rng.choice(locations.japan_prefectures[prefectureCategory])
 
     firstname = fake.first_name()
     lastname = fake.last_name()
-    username = firstname.lower() + "." + lastname.lower() + str(randint(0,9999))
-    domain = "@" + fake.email().split("@")[1]
+    domain = "@" + fake.free_email_domain()
+    username = (firstname.lower() + "." + lastname.lower())[:39 - len(domain) - len(str(i))] + str(i) # the index keeps emails unique within the 40 character column
     email = username + domain
 
-    appuser = await models.Appuser.create(
+    appusers.append(models.Appuser(
+        id=i + 1,
         firstname=firstname,
         lastname=lastname,
         email=email,
         firebase_user_id=fake.uuid4(),
-        average_user_rating=randint(1,5),
-        user_profile_bio=f'{fake.random_element(elements=bios)}',
-        user_bio_picture_src_list=f'{fake.random_element(elements=interior)},{fake.random_element(elements=exterior)},{fake.random_element(elements=yard)}',
-        account_created=fake.date_time_this_year(True, False),
-        last_updated=fake.date_time_this_year(True, False),
-        last_login=fake.date_time_this_year(True, False),
-        profile_picture_src=fake.random_element(elements=people),
+        average_user_rating=rng.randint(1,5),
+        user_profile_bio=rng.choice(bios),
+        user_bio_picture_src_list=f'{rng.choice(interior)},{rng.choice(exterior)},{rng.choice(yard)}',
+        account_created=this_year_before_now(rng, now),
+        last_updated=this_year_before_now(rng, now),
+        last_login=this_year_before_now(rng, now),
+        profile_picture_src=rng.choice(people),
         prefecture=prefecture,
-        city_ward=fake.random_element(elements=locations.japan_prefectures_cities[prefecture]),
+        city_ward=rng.choice(locations.japan_prefectures_cities[prefecture]),
         street_address=fake.street_address(),
         postal_code=fake_jp.zipcode(),  # Fake Japanese postal code
-        account_language=fake.random_element(elements=["english", "japanese"]),
-        english_ok=fake.boolean(),
-        japanese_ok=fake.boolean(),
-        is_sitter=True #fake.boolean() for random results
-    )
-    appusers.append(appuser)
-    print(f"Created Appuser {_+1}: {appuser.firstname} {appuser.lastname} who lives in {appuser.prefecture} and speaks {appuser.account_language}")
+        account_language=rng.choice(["english", "japanese"]),
+        english_ok=rng.random() < 0.5,
+        japanese_ok=rng.random() < 0.5,
+        is_sitter=True # rng.random() < 0.5 for random results
+    ))
+
+  sitters = []
+  availabilities = []
+  petsToInsert = []
+  petIDsByOwner = {}
+  remainingDays = (date(now.year, 12, 31) - now.date()).days + 1
 
   for appuser in appusers:
-      if appuser.is_sitter:
-          await models.Sitter.create(
-              sitter_profile_bio=f'{fake.random_element(elements=bios)}',
-              sitter_bio_picture_src_list=f'{fake.random_element(elements=interior)},{fake.random_element(elements=exterior)},{fake.random_element(elements=yard)}',
-              sitter_house_ok=fake.boolean(),
-              owner_house_ok=fake.boolean(),
-              visit_ok=fake.boolean(),
-              dogs_ok=fake.boolean(),
-              cats_ok=fake.boolean(),
-              fish_ok=fake.boolean(),
-              birds_ok=fake.boolean(),
-              rabbits_ok=fake.boolean(),
-              appuser=appuser
-          )
-          print(f"Created a Sitter profile for Appuser {appuser.id}: {appuser.firstname} {appuser.lastname}")
-
-          for _ in range(5):
-            available_date = fake.date_time_this_year(False, True) # before_now: bool, after_now: bool
-            await models.Availability.create(
-              appuser=appuser,
-              available_date=available_date
-            )
-            print(f"Sitter {appuser.firstname} is available on {available_date}")
-         
-      randomPetCount = randint(1,3)
-      for i in range(randomPetCount):
-        await create_pet(appuser)
-
-  for i in range(userAndInquiryCount):  # Create fake inquiries
-      owner = choice([user for user in appusers])  # Owner can be any user since all appusers are owners by default
-      sitter = choice([user for user in appusers if user.is_sitter])  # Ensure the sitter is a sitter
-      
-      start_date, end_date = generate_date_range()
-
-      petList = await get_all_pets_for_user(owner.id)
-      pet_id_list = ""
-
-      for i in range(len(petList)):
-        if not pet_id_list:
-            pet_id_list += str(petList[i].id)
-        else:
-            pet_id_list += "," + str(petList[i].id)
-
-      inquiry = await models.Inquiry.create(
-          owner_appuser=owner,
-          sitter_appuser=sitter,
-          inquiry_status=choice([models.InquiryStatus.REQUESTED, models.InquiryStatus.APPROVED, models.InquiryStatus.REJECTED]),
-          start_date=start_date,
-          end_date=end_date,
-          desired_service=choice([models.PetServices.OWNER_HOUSE, models.PetServices.SITTER_HOUSE, models.PetServices.VISIT]),
-          pet_id_list=pet_id_list, 
+    if appuser.is_sitter:
+      sitters.append(models.Sitter(
+          id=len(sitters) + 1,
+          sitter_profile_bio=rng.choice(bios),
+          sitter_bio_picture_src_list=f'{rng.choice(interior)},{rng.choice(exterior)},{rng.choice(yard)}',
+          sitter_house_ok=rng.random() < 0.5,
+          owner_house_ok=rng.random() < 0.5,
+          visit_ok=rng.random() < 0.5,
+          dogs_ok=rng.random() < 0.5,
+          cats_ok=rng.random() < 0.5,
+          fish_ok=rng.random() < 0.5,
+          birds_ok=rng.random() < 0.5,
+          rabbits_ok=rng.random() < 0.5,
+          appuser_id=appuser.id
+      ))
+
+      for dayOffset in sorted(rng.sample(range(remainingDays), min(5, remainingDays))): # distinct days for the rest of this year
+        availabilities.append(models.Availability(
+          id=len(availabilities) + 1,
+          appuser_id=appuser.id,
+          available_date=now.date() + timedelta(days=dayOffset)
+        ))
+
+    for _ in range(rng.randint(1,3)):
+      pet = build_pet(rng, len(petsToInsert) + 1, appuser, now)
+      petsToInsert.append(pet)
+      petIDsByOwner.setdefault(appuser.id, []).append(pet.id)
+
+  sitterAppusers = [appuser for appuser in appusers if appuser.is_sitter]
+  inquiries = []
+  inquiryPets = []
+  messages = []
+  reviews = []
+
+  for i in range(scale if sitterAppusers else 0):  # Create fake inquiries
+      owner = rng.choice(appusers)  # Owner can be any user since all appusers are owners by default
+      sitter = rng.choice(sitterAppusers)
+      start_date, end_date = generate_date_range(rng, now)
+      inquiry_status = rng.choice([models.InquiryStatus.REQUESTED, models.InquiryStatus.APPROVED, models.InquiryStatus.REJECTED])
+
+      inquiry = models.Inquiry(
+          id=i + 1,
+          owner_appuser_id=owner.id,
+          sitter_appuser_id=sitter.id,
+          inquiry_status=inquiry_status,
+          start_date=start_date.date(),
+          end_date=end_date.date(),
+          desired_service=rng.choice([models.PetServices.OWNER_HOUSE, models.PetServices.SITTER_HOUSE, models.PetServices.VISIT]),
+          pet_id_list=",".join(str(petID) for petID in petIDsByOwner.get(owner.id, [])),
           additional_info=fake.text(max_nb_chars=100),
-          inquiry_submitted=fake.date_time_this_year(True, False),
-          inquiry_finalized=fake.date_time_this_year(True, False) if choice([True, False]) else None
+          inquiry_submitted=this_year_before_now(rng, now),
+          inquiry_finalized=this_year_before_now(rng, now) if rng.random() < 0.5 else None
       )
-      print(f"Created Inquiry of Status {inquiry.inquiry_status} for Owner {owner.firstname} to Sitter {sitter.firstname} from {start_date} to {end_date}")
+      inquiries.append(inquiry)
+      for position, petID in enumerate(petIDsByOwner.get(owner.id, [])):
+        inquiryPets.append(models.InquiryPet(id=len(inquiryPets) + 1, inquiry_id=inquiry.id, pet_id=petID, position=position))
 
       if i % 2 == 0:
-        await create_messages(inquiry, owner, sitter)
+        messages.extend(build_messages(len(messages) + 1, inquiry.id, owner, sitter))
       else:
-        await create_messages(inquiry, sitter, owner)
-
-      if inquiry.inquiry_status in [models.InquiryStatus.APPROVED]:
-        await create_review(owner, sitter, "sitter")
-        await create_review(sitter, owner, "owner")
-
-  print("Seeding completed!")
\ No newline at end of file
+        messages.extend(build_messages(len(messages) + 1, inquiry.id, sitter, owner))
+
+      if inquiry_status in [models.InquiryStatus.APPROVED]:
+        reviews.append(build_review(rng, len(reviews) + 1, owner, sitter, "sitter"))
+        reviews.append(build_review(rng, len(reviews) + 1, sitter, owner, "owner"))
+
+  return {
+    models.Appuser: appusers,
+    models.Sitter: sitters,
+    models.Availability: availabilities,
+    models.Pet: petsToInsert,
+    models.Inquiry: inquiries,
+    models.InquiryPet: inquiryPets,
+    models.Message: messages,
+    models.Review: reviews,
+  }
+
+async def seed_db(scale: int | None = None, seed: int | None = None):
+  defaultScale, defaultSeed = seed_settings()
+  scale = defaultScale if scale is None else scale
+  seed = defaultSeed if seed is None else seed
+
+  print(f"Seeding {scale} appusers with seed {seed}")
+  rowsByModel = generate_seed_rows(scale, seed, datetime.now())
+
+  async with in_transaction() as connection:
+    for model, rows in rowsByModel.items(): # ordered so that every foreign key target is inserted first
+      await bulk_insert(model, rows, connection)
+    await reset_id_sequences(connection, [model._meta.db_table for model in rowsByModel])
+    await ratings.recompute_ratings(connection) # review aggregates, and the averages of appusers with reviews
+    await availability_calendar.rebuild_months(connection)
+
+  print("Seeding completed!")
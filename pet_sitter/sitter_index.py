@@ -0,0 +1,266 @@
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+from pet_sitter.ratings import role_rating
+import pet_sitter.models as models
+import asyncio
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# bit position of each searchable capability in a sitter's mask
+SITTER_FLAGS = ["sitter_house_ok", "owner_house_ok", "visit_ok", "dogs_ok", "cats_ok", "fish_ok", "birds_ok", "rabbits_ok"]
+APPUSER_FLAGS = ["english_ok", "japanese_ok"]
+FLAG_BITS = {flag: 1 << bit for bit, flag in enumerate(SITTER_FLAGS + APPUSER_FLAGS)}
+
+def flags_mask(flags: Iterable[str]) -> int:
+  mask = 0
+  for flag in flags:
+    mask |= FLAG_BITS[flag]
+  return mask
+
+def capability_mask(sitter, appuser) -> int:
+  # sitter and appuser may be model instances or anything else with the flag attributes
+  mask = 0
+  for flag in SITTER_FLAGS:
+    if getattr(sitter, flag, None):
+      mask |= FLAG_BITS[flag]
+  for flag in APPUSER_FLAGS:
+    if getattr(appuser, flag, None):
+      mask |= FLAG_BITS[flag]
+  return mask
+
+# what a ranked search orders by, kept beside the mask: (sitter rating, last_login as a timestamp), 0 when unset
+Ranking = Tuple[float, float]
+
+def appuser_ranking(appuser) -> Ranking:
+  return (appuser.sitter_rating or 0.0, appuser.last_login.timestamp() if appuser.last_login else 0.0)
+
+@dataclass
+class RankingWeights:
+  rating: float = 1.0 # times sitter rating / 5
+  language: float = 0.5 # when the sitter speaks the requested language
+  recency: float = 0.5 # times 0.5 ** (days since last_login / recency_half_life_days)
+  recency_half_life_days: float = 30.0
+
+def ranking_score(ranking: Ranking, speaks_language: bool, weights: RankingWeights, now: float) -> float:
+  rating, last_login = ranking
+  score = weights.rating * rating / 5
+  if speaks_language:
+    score += weights.language
+  if last_login:
+    score += weights.recency * 0.5 ** (max(now - last_login, 0) / (weights.recency_half_life_days * 86400))
+  return score
+
+def top_k(scored: Iterable[Tuple[float, int]], k: int) -> List[Tuple[float, int]]:
+  # bounded heap over (score, appuser id) pairs, best first with ties broken by ascending id
+  return [(score, -negated_id) for score, negated_id in heapq.nlargest(k, ((score, -appuser_id) for score, appuser_id in scored))]
+
+class _Group:
+  """Sitters of one (prefecture, city_ward), as appuser ids in ascending order with their masks alongside"""
+
+  __slots__ = ("ids", "masks")
+
+  def __init__(self):
+    self.ids = array("q")
+    self.masks = array("H")
+
+  def set(self, appuser_id: int, mask: int):
+    position = bisect_left(self.ids, appuser_id)
+    if position < len(self.ids) and self.ids[position] == appuser_id:
+      self.masks[position] = mask
+    else:
+      self.ids.insert(position, appuser_id)
+      self.masks.insert(position, mask)
+
+  def remove(self, appuser_id: int):
+    position = bisect_left(self.ids, appuser_id)
+    if position < len(self.ids) and self.ids[position] == appuser_id:
+      del self.ids[position]
+      del self.masks[position]
+
+  def matching(self, required: int) -> List[int]:
+    if not required:
+      return self.ids.tolist()
+    return [appuser_id for appuser_id, mask in zip(self.ids, self.masks) if mask & required == required]
+
+Location = Tuple[str | None, str | None]
+
+class SitterIndex:
+  """In-process index of every sitter by prefecture and city_ward, answering capability searches without a query"""
+
+  def __init__(self):
+    self._groups: Dict[Location, _Group] = {}
+    self._cities: Dict[str | None, Set[str | None]] = {} # prefecture -> city_wards that have a group
+    self._entries: Dict[int, Tuple[Location, int]] = {} # appuser id -> (location, mask), to find a sitter's group on update
+    self._rankings: Dict[int, Ranking] = {}
+    self._pending: List[tuple] | None = None # changes made while a rebuild is loading, replayed onto its result
+    self.ready = False
+    self.last_rebuilt = 0.0
+    self.rebuild_count = 0
+    self._refresh_task: asyncio.Task | None = None
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def _set(self, appuser_id: int, location: Location, mask: int, ranking: Ranking):
+    previous = self._entries.get(appuser_id)
+    if previous and previous[0] != location:
+      self._remove(appuser_id)
+
+    group = self._groups.get(location)
+    if group is None:
+      group = self._groups[location] = _Group()
+      self._cities.setdefault(location[0], set()).add(location[1])
+    group.set(appuser_id, mask)
+    self._entries[appuser_id] = (location, mask)
+    self._rankings[appuser_id] = ranking
+
+  def _remove(self, appuser_id: int):
+    entry = self._entries.pop(appuser_id, None)
+    if entry is None:
+      return
+    del self._rankings[appuser_id]
+
+    location = entry[0]
+    group = self._groups[location]
+    group.remove(appuser_id)
+    if not group.ids:
+      del self._groups[location]
+      cities = self._cities[location[0]]
+      cities.discard(location[1])
+      if not cities:
+        del self._cities[location[0]]
+
+  def upsert(self, appuser_id: int, prefecture: str | None, city_ward: str | None, mask: int, ranking: Ranking = (0.0, 0.0)):
+    if self._pending is not None:
+      self._pending.append((appuser_id, prefecture, city_ward, mask, ranking))
+    self._set(appuser_id, (prefecture, city_ward), mask, ranking)
+
+  def upsert_sitter(self, sitter, appuser):
+    self.upsert(appuser.id, appuser.prefecture, appuser.city_ward, capability_mask(sitter, appuser), appuser_ranking(appuser))
+
+  def update_appuser(self, appuser):
+    # called after an appuser changes (profile, login or rating); only sitters are indexed, so anyone else is ignored
+    entry = self._entries.get(appuser.id)
+    if entry is None:
+      return
+    mask = entry[1] & ~flags_mask(APPUSER_FLAGS) | capability_mask(None, appuser)
+    self.upsert(appuser.id, appuser.prefecture, appuser.city_ward, mask, appuser_ranking(appuser))
+
+  def remove(self, appuser_id: int):
+    if self._pending is not None:
+      self._pending.append((appuser_id, None))
+    self._remove(appuser_id)
+
+  def search(self, prefecture: str, city_ward: str | None = None, flags: Iterable[str] = ()) -> List[int]:
+    """Appuser ids of the sitters in the location having every flag, in ascending order"""
+    required = flags_mask(flags)
+
+    if city_ward is not None:
+      group = self._groups.get((prefecture, city_ward))
+      return group.matching(required) if group else []
+
+    matches: List[int] = []
+    for city in self._cities.get(prefecture, ()):
+      matches.extend(self._groups[(prefecture, city)].matching(required))
+    matches.sort()
+    return matches
+
+  def top_ranked(self, appuser_ids: Iterable[int], k: int, weights: RankingWeights, language: str | None = None, now: float | None = None) -> List[Tuple[float, int]]:
+    """(score, appuser id) of the k best scoring sitters among appuser_ids, best first and ties by ascending id"""
+    now = time.time() if now is None else now
+    language_bit = FLAG_BITS.get(f"{language}_ok", 0) if language else 0
+    scored = ((ranking_score(self._rankings[appuser_id], bool(self._entries[appuser_id][1] & language_bit), weights, now), appuser_id) for appuser_id in appuser_ids)
+    return top_k(scored, k)
+
+  @staticmethod
+  async def _load() -> Dict[int, Tuple[Location, int, Ranking]]:
+    rows = await models.Sitter.all().values("appuser_id", *SITTER_FLAGS, *[f"appuser__{field}" for field in ["prefecture", "city_ward", "sitter_review_count", "sitter_score_sum", "last_login", *APPUSER_FLAGS]])
+    entries = {}
+    for row in rows:
+      mask = 0
+      for flag in SITTER_FLAGS:
+        if row[flag]:
+          mask |= FLAG_BITS[flag]
+      for flag in APPUSER_FLAGS:
+        if row[f"appuser__{flag}"]:
+          mask |= FLAG_BITS[flag]
+      last_login = row["appuser__last_login"]
+      ranking = (role_rating(row["appuser__sitter_review_count"], row["appuser__sitter_score_sum"]) or 0.0, last_login.timestamp() if isinstance(last_login, datetime) else 0.0)
+      entries[row["appuser_id"]] = ((row["appuser__prefecture"], row["appuser__city_ward"]), mask, ranking)
+    return entries
+
+  async def rebuild(self):
+    started = time.perf_counter()
+    self._pending = []
+    try:
+      entries = await self._load()
+    except Exception:
+      self._pending = None
+      raise
+
+    rebuilt = SitterIndex()
+    for appuser_id, (location, mask, ranking) in entries.items():
+      rebuilt._set(appuser_id, location, mask, ranking)
+    for change in self._pending: # a request may have written between the load and now
+      if len(change) == 2:
+        rebuilt._remove(change[0])
+      else:
+        rebuilt._set(change[0], (change[1], change[2]), change[3], change[4])
+
+    self._groups, self._cities, self._entries, self._rankings = rebuilt._groups, rebuilt._cities, rebuilt._entries, rebuilt._rankings
+    self._pending = None
+    self.ready = True
+    self.last_rebuilt = time.time()
+    self.rebuild_count += 1
+    logger.info("Sitter index rebuilt with %d sitters in %.1fms", len(self._entries), (time.perf_counter() - started) * 1000)
+
+  async def check(self) -> dict:
+    """Compares the index against the database and reports the appuser ids that differ"""
+    entries = await self._load()
+    missing = [appuser_id for appuser_id in entries if appuser_id not in self._entries]
+    unexpected = [appuser_id for appuser_id in self._entries if appuser_id not in entries]
+    stale = [appuser_id for appuser_id, entry in entries.items() if appuser_id in self._entries and self._entries[appuser_id] + (self._rankings[appuser_id],) != entry]
+    return {
+      "consistent": not (missing or unexpected or stale),
+      "missing": sorted(missing),
+      "unexpected": sorted(unexpected),
+      "stale": sorted(stale),
+    }
+
+  def start_refreshing(self, interval: float):
+    # other workers' writes only reach this process's index through this periodic check
+    if interval > 0 and self._refresh_task is None:
+      self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+  async def stop(self):
+    if self._refresh_task:
+      self._refresh_task.cancel()
+      self._refresh_task = None
+
+  async def _refresh_loop(self, interval: float):
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        report = await self.check()
+        if not report["consistent"]:
+          logger.info("Sitter index out of date (%d missing, %d unexpected, %d stale), rebuilding", len(report["missing"]), len(report["unexpected"]), len(report["stale"]))
+          await self.rebuild()
+      except Exception as e:
+        logger.warning("Sitter index refresh failed: %s", e)
+
+  def stats(self) -> dict:
+    return {
+      "ready": self.ready,
+      "sitters": len(self._entries),
+      "locations": len(self._groups),
+      "last_rebuilt": self.last_rebuilt,
+      "rebuild_count": self.rebuild_count,
+    }
+
+sitter_index = SitterIndex()
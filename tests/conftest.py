@@ -0,0 +1,130 @@
+from cryptography.hazmat.primitives import serialization # type: ignore
+from cryptography.hazmat.primitives.asymmetric import rsa # type: ignore
+from pet_sitter.authentication import mint_id_token
+import pytest
+import asyncio
+import tempfile
+import json
+import os
+
+# Tests that need a database run against TEST_DATABASE_URL, whose public schema they drop and recreate;
+# without it they are skipped. ID tokens are signed with a throwaway key that the app is pointed at.
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_PROJECT_ID = "test-project"
+TEST_KEY_ID = "test-key"
+
+_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_KEY_PEM = _key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+PUBLIC_KEY_PEM = _key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+
+_keys_file = os.path.join(tempfile.mkdtemp(), "signing_keys.json")
+with open(_keys_file, "w") as keys_file:
+  json.dump({TEST_KEY_ID: PUBLIC_KEY_PEM}, keys_file)
+
+# pet_sitter.main reads its settings at import, so they are in place before any test module imports it
+os.environ["FIREBASE_SIGNING_KEYS_FILE"] = _keys_file
+os.environ["FIREBASE_PROJECT_ID"] = TEST_PROJECT_ID
+os.environ["SEED_DATABASE"] = "false"
+os.environ["TOKEN_REVOCATION_CHECK_SECONDS"] = "0" # there is no Firebase to look revocations up in; the revocation tests fake one
+os.environ["SITTER_INDEX_REFRESH_SECONDS"] = "0" # tests rebuild the index and reload the pet feed themselves
+os.environ["PET_FEED_REFRESH_SECONDS"] = "0"
+os.environ["SEARCH_CACHE"] = "off" # so each request reaches the search it tests; the cache tests switch it on
+if TEST_DATABASE_URL:
+  os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+@pytest.fixture
+def anyio_backend():
+  return "asyncio"
+
+@pytest.fixture(scope="session")
+def signing_key():
+  """(private key PEM, public key PEM) of the throwaway key the app verifies ID tokens against"""
+  return PRIVATE_KEY_PEM, PUBLIC_KEY_PEM
+
+@pytest.fixture
+def signing_keys_file(tmp_path, signing_key):
+  path = tmp_path / "signing_keys.json"
+  path.write_text(json.dumps({TEST_KEY_ID: signing_key[1]}))
+  return str(path)
+
+def token_headers(uid: str, email: str | None = None) -> dict:
+  return {"Authorization": f"Bearer {mint_id_token(PRIVATE_KEY_PEM, TEST_KEY_ID, TEST_PROJECT_ID, uid, email=email)}"}
+
+async def _reset_schema():
+  import asyncpg # type: ignore
+
+  connection = await asyncpg.connect(TEST_DATABASE_URL.replace("postgres://", "postgresql://", 1))
+  try:
+    await connection.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+  finally:
+    await connection.close()
+
+@pytest.fixture(scope="session")
+def app_client():
+  if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set")
+
+  from fastapi.testclient import TestClient # type: ignore
+  import pet_sitter.main as main
+
+  asyncio.run(_reset_schema())
+  with TestClient(main.app) as client: # the app starts once per session, as it would in a worker
+    yield client
+
+async def _truncate_tables():
+  from tortoise import Tortoise # type: ignore
+
+  tables = ", ".join(f'"{model._meta.db_table}"' for model in Tortoise.apps["models"].values())
+  await Tortoise.get_connection("default").execute_script(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+
+@pytest.fixture
+def client(app_client, monkeypatch):
+  """The running app over an empty database"""
+  import pet_sitter.main as main
+  from pet_sitter.authentication import AppuserIdCache
+
+  app_client.portal.call(_truncate_tables)
+  app_client.portal.call(main.sitter_index.rebuild)
+  app_client.portal.call(main.pet_feed.reload)
+  monkeypatch.setattr(main, "appuser_id_cache", AppuserIdCache()) # ids are reused once the tables are emptied
+  return app_client
+
+@pytest.fixture
+def signup(client):
+  """Signs a new appuser up through the API, returning (appuser id, auth headers)"""
+  count = 0
+
+  def signup(**fields) -> tuple:
+    nonlocal count
+    count += 1
+    uid = f"uid-{count}"
+    email = fields.pop("email", f"user{count}@example.org")
+    headers = token_headers(uid, email)
+    response = client.post("/signup", json={"email": email, "firstname": "Test", "lastname": f"User{count}", **fields}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["appuser"]["id"], headers
+
+  return signup
+
+@pytest.fixture
+def make_sitter(client, signup):
+  """Signs up an appuser in the location and makes them a sitter offering the given services, returning their appuser id"""
+  def make_sitter(prefecture: str = "Tokyo", city_ward: str = "Shibuya", **flags) -> int:
+    appuserID, headers = signup(prefecture=prefecture, city_ward=city_ward)
+    response = client.post(f"/sitter/{appuserID}", json={"sitter_profile_bio": "Happy to help", **flags}, headers=headers)
+    assert response.status_code == 200, response.text
+    return appuserID
+
+  return make_sitter
+
+@pytest.fixture
+def inquiry(client, signup):
+  """An inquiry from a new owner to a new sitter, returned as (inquiry id, (owner id, headers), (sitter id, headers))"""
+  sitter = signup(prefecture="Tokyo", city_ward="Shibuya")
+  assert client.post(f"/sitter/{sitter[0]}", json={"sitter_profile_bio": "Happy to help"}, headers=sitter[1]).status_code == 200
+  owner = signup()
+  body = {"owner_appuser_id": owner[0], "sitter_appuser_id": sitter[0], "start_date": "2030-05-01T00:00:00", "end_date": "2030-05-03T00:00:00", "desired_service": "visit", "pet_id_list": ""}
+  response = client.post("/inquiry", json=body, headers=owner[1])
+  assert response.status_code == 201, response.text
+  return response.json()["id"], owner, sitter
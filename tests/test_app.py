@@ -0,0 +1,23 @@
+import firebase_admin # type: ignore
+import pytest
+
+def test_importing_the_app_does_not_initialize_firebase():
+  import pet_sitter.main # noqa: F401
+
+  with pytest.raises(ValueError):
+    firebase_admin.get_app()
+
+def test_health_reports_startup_timings(client):
+  response = client.get("/health")
+
+  assert response.status_code == 200
+  assert {"import", "database", "signing_keys"} <= set(response.json()["startup_ms"])
+
+def test_authenticated_routes_resolve_the_caller(client, signup):
+  ownerID, ownerHeaders = signup()
+  _, otherHeaders = signup()
+
+  update = {"firstname": "Renamed", "prefecture": "Tokyo", "city_ward": "Shibuya"}
+  assert client.put(f"/appuser/{ownerID}", json=update, headers=ownerHeaders).json()["firstname"] == "Renamed"
+  assert client.put(f"/appuser/{ownerID}", json=update, headers=otherHeaders).status_code == 403
+  assert client.get(f"/appuser/{ownerID}", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
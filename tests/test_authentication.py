@@ -0,0 +1,282 @@
+from firebase_admin import auth
+from pet_sitter.authentication import VerifiedTokenCache, TokenRevocationChecker, TokenVerifier, TokenVerificationTimeout, SigningKeyStore, SigningKeysUnavailable, UnknownSigningKeyError, AppuserIdCache, mint_id_token
+import asyncio
+import pytest
+import time
+
+def claims(uid: str = "uid-1", lifetime: float = 3600, issued: float | None = None) -> dict:
+  issued = time.time() if issued is None else issued
+  return {"uid": uid, "iat": issued, "exp": issued + lifetime}
+
+def test_token_cache_serves_a_token_until_its_exp(monkeypatch):
+  cache = VerifiedTokenCache()
+  decoded = claims(lifetime=60)
+  cache.put("token", decoded)
+
+  assert cache.get("token") is decoded
+  assert cache.get("other") is None
+
+  later = time.time() + 61
+  monkeypatch.setattr(time, "time", lambda: later)
+  assert cache.get("token") is None
+  assert cache.stats()["size"] == 0
+  assert (cache.hits, cache.misses) == (1, 2)
+
+def test_token_cache_skips_expired_tokens_and_tokens_without_exp():
+  cache = VerifiedTokenCache()
+  cache.put("expired", claims(lifetime=-1))
+  cache.put("no-exp", {"uid": "uid-1"})
+
+  assert cache.get("expired") is None
+  assert cache.get("no-exp") is None
+
+def test_token_cache_evicts_the_least_recently_used_token():
+  cache = VerifiedTokenCache(max_entries=2)
+  cache.put("a", claims("a"))
+  cache.put("b", claims("b"))
+  cache.get("a")
+  cache.put("c", claims("c"))
+
+  assert cache.get("b") is None
+  assert cache.get("a")["uid"] == "a"
+  assert cache.get("c")["uid"] == "c"
+
+def test_token_cache_drops_a_token_when_its_revocation_check_is_due(monkeypatch):
+  cache = VerifiedTokenCache()
+  now = time.time()
+  cache.put("token", claims(lifetime=3600), valid_until=now + 60)
+  assert cache.get("token") is not None
+
+  monkeypatch.setattr(time, "time", lambda: now + 60)
+  assert cache.get("token") is None
+
+def revocation_lookup(valid_after: dict, delay: float = 0):
+  calls = []
+
+  def lookup(uid: str) -> float | None:
+    calls.append(uid)
+    time.sleep(delay)
+    if isinstance(valid_after.get(uid), Exception):
+      raise valid_after[uid]
+    return valid_after.get(uid)
+
+  return lookup, calls
+
+@pytest.mark.anyio
+async def test_tokens_issued_before_a_revocation_are_rejected():
+  lookup, _ = revocation_lookup({"uid-1": time.time()})
+  checker = TokenRevocationChecker(lookup, interval=60)
+
+  with pytest.raises(auth.RevokedIdTokenError):
+    await checker.check(claims("uid-1", issued=time.time() - 10))
+  assert await checker.check(claims("uid-1", issued=time.time() + 1)) >= time.time() + 59
+  assert await checker.check(claims("uid-2")) is not None
+
+@pytest.mark.anyio
+async def test_revocations_are_looked_up_once_per_interval(monkeypatch):
+  valid_after = {}
+  lookup, calls = revocation_lookup(valid_after)
+  checker = TokenRevocationChecker(lookup, interval=60)
+  token = claims("uid-1", issued=time.time() - 10)
+
+  await checker.check(token)
+  valid_after["uid-1"] = time.time() # revoked elsewhere
+  await checker.check(token)
+  assert calls == ["uid-1"]
+
+  later = time.time() + 60
+  monkeypatch.setattr(time, "time", lambda: later)
+  with pytest.raises(auth.RevokedIdTokenError):
+    await checker.check(token)
+  assert calls == ["uid-1", "uid-1"]
+
+@pytest.mark.anyio
+async def test_concurrent_checks_of_one_user_share_a_lookup():
+  lookup, calls = revocation_lookup({}, delay=0.05)
+  checker = TokenRevocationChecker(lookup, interval=60)
+
+  await asyncio.gather(*[checker.check(claims("uid-1")) for _ in range(5)])
+  assert calls == ["uid-1"]
+
+@pytest.mark.anyio
+async def test_a_failed_lookup_keeps_the_last_known_revocation(monkeypatch):
+  revokedAt = time.time()
+  valid_after = {"uid-1": revokedAt}
+  lookup, calls = revocation_lookup(valid_after)
+  checker = TokenRevocationChecker(lookup, interval=60)
+  token = claims("uid-1", issued=revokedAt - 10)
+  with pytest.raises(auth.RevokedIdTokenError):
+    await checker.check(token)
+
+  valid_after["uid-1"] = RuntimeError("firebase is down")
+  later = time.time() + 60
+  monkeypatch.setattr(time, "time", lambda: later)
+  with pytest.raises(auth.RevokedIdTokenError):
+    await checker.check(token)
+  assert checker.stats()["failures"] == 1
+
+def counting_verify(delay: float = 0.05):
+  calls = []
+
+  def verify(id_token: str) -> dict:
+    calls.append(id_token)
+    time.sleep(delay)
+    return {"uid": id_token}
+
+  return verify, calls
+
+@pytest.mark.anyio
+async def test_concurrent_requests_with_the_same_token_share_one_verification():
+  verify, calls = counting_verify()
+  verifier = TokenVerifier(verify)
+  try:
+    results = await asyncio.gather(*[verifier.verify("token") for _ in range(5)])
+  finally:
+    verifier.shutdown()
+
+  assert calls == ["token"]
+  assert all(result == {"uid": "token"} for result in results)
+
+@pytest.mark.anyio
+async def test_different_tokens_are_verified_separately():
+  verify, calls = counting_verify()
+  verifier = TokenVerifier(verify)
+  try:
+    await asyncio.gather(verifier.verify("a"), verifier.verify("b"))
+    await verifier.verify("a") # nothing is remembered once a verification finished
+  finally:
+    verifier.shutdown()
+
+  assert sorted(calls) == ["a", "a", "b"]
+
+@pytest.mark.anyio
+async def test_a_slow_verification_times_out():
+  verify, _ = counting_verify(delay=0.5)
+  verifier = TokenVerifier(verify, timeout=0.05)
+  try:
+    with pytest.raises(TokenVerificationTimeout):
+      await verifier.verify("token")
+  finally:
+    verifier.shutdown()
+
+@pytest.mark.anyio
+async def test_a_cancelled_request_does_not_cancel_the_others_waiting_on_its_token():
+  verify, calls = counting_verify(delay=0.1)
+  verifier = TokenVerifier(verify)
+  try:
+    first = asyncio.ensure_future(verifier.verify("token"))
+    second = asyncio.ensure_future(verifier.verify("token"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == {"uid": "token"}
+  finally:
+    verifier.shutdown()
+
+  assert calls == ["token"]
+
+@pytest.mark.anyio
+async def test_key_store_verifies_a_minted_token(signing_key, signing_keys_file):
+  store = SigningKeyStore("test-project", key_file=signing_keys_file)
+  await store.start()
+
+  decoded = store.verify(mint_id_token(signing_key[0], "test-key", "test-project", "uid-1", email="a@example.org"))
+
+  assert decoded["uid"] == "uid-1"
+  assert decoded["email"] == "a@example.org"
+  assert store.stats()["key_ids"] == ["test-key"]
+
+@pytest.mark.anyio
+async def test_key_store_rejects_tokens_it_cannot_trust(signing_key, signing_keys_file):
+  store = SigningKeyStore("test-project", key_file=signing_keys_file)
+  await store.start()
+
+  with pytest.raises(UnknownSigningKeyError):
+    store.verify(mint_id_token(signing_key[0], "rotated-key", "test-project", "uid-1"))
+  with pytest.raises(auth.InvalidIdTokenError):
+    store.verify(mint_id_token(signing_key[0], "test-key", "another-project", "uid-1"))
+  with pytest.raises(auth.ExpiredIdTokenError):
+    store.verify(mint_id_token(signing_key[0], "test-key", "test-project", "uid-1", lifetime=-60))
+  with pytest.raises(auth.InvalidIdTokenError):
+    store.verify("not-a-token")
+
+  assert not await store.refresh_for_unknown_key() # keys from a key_file never change
+
+@pytest.mark.anyio
+async def test_concurrent_refreshes_share_one_fetch(signing_keys_file):
+  store = SigningKeyStore("test-project", key_file=signing_keys_file)
+  load = store._load
+  loads = []
+
+  def slow_load():
+    loads.append(1)
+    time.sleep(0.05)
+    return load()
+
+  store._load = slow_load
+  await asyncio.gather(*[store.refresh() for _ in range(5)])
+
+  assert len(loads) == 1
+  assert store.ready
+
+@pytest.mark.anyio
+async def test_verifications_before_the_keys_load_share_one_fetch(signing_keys_file):
+  store = SigningKeyStore("test-project", key_file=signing_keys_file)
+  load = store._load
+  loads = []
+
+  def failing_then_slow_load():
+    loads.append(1)
+    time.sleep(0.05)
+    if len(loads) == 1:
+      raise OSError("certificates unreachable")
+    return load()
+
+  store._load = failing_then_slow_load
+  for outcome in await asyncio.gather(*[store.ensure_ready() for _ in range(5)], return_exceptions=True):
+    assert isinstance(outcome, SigningKeysUnavailable)
+  with pytest.raises(SigningKeysUnavailable): # fails fast instead of fetching again
+    await store.ensure_ready()
+  assert len(loads) == 1
+
+  store.last_failed -= store.min_refresh_interval
+  await asyncio.gather(*[store.ensure_ready() for _ in range(5)])
+  assert len(loads) == 2 and store.ready
+
+def test_requests_get_503_while_the_signing_keys_are_unavailable(client, signup, monkeypatch):
+  import pet_sitter.main as main
+  appuserID, headers = signup()
+  monkeypatch.setattr(main, "verified_token_cache", VerifiedTokenCache())
+  monkeypatch.setattr(main.signing_key_store, "certs", {})
+  monkeypatch.setattr(main.signing_key_store, "last_failed", time.time())
+
+  assert client.get(f"/appuser/{appuserID}", headers=headers).status_code == 503
+
+def test_appuser_id_cache_keeps_the_most_recently_used_uids():
+  cache = AppuserIdCache(max_entries=2)
+  cache.put("a", 1)
+  cache.put("b", 2)
+  assert cache.get("a") == 1
+  cache.put("c", 3)
+
+  assert cache.get("b") is None
+  assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+  cache.invalidate("a")
+  assert cache.get("a") is None
+  assert cache.stats()["size"] == 1
+
+def test_revoked_tokens_stop_being_accepted_once_their_check_is_due(client, signup, monkeypatch):
+  import pet_sitter.main as main
+  appuserID, headers = signup()
+  _, otherHeaders = signup()
+  valid_after = {}
+  monkeypatch.setattr(main, "token_revocation_checker", TokenRevocationChecker(revocation_lookup(valid_after)[0], interval=0.05))
+  monkeypatch.setattr(main, "verified_token_cache", VerifiedTokenCache())
+
+  assert client.get(f"/appuser/{appuserID}", headers=headers).status_code == 200
+  valid_after["uid-1"] = time.time() + 1 # revoked through Firebase, by any worker or outside the app
+  time.sleep(0.1)
+
+  assert client.get(f"/appuser/{appuserID}", headers=headers).status_code == 401
+  assert client.get(f"/appuser/{appuserID}", headers=otherHeaders).status_code == 200
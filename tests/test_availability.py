@@ -0,0 +1,92 @@
+from datetime import date
+from tortoise import Tortoise # type: ignore
+from pet_sitter.availability_calendar import dates_in_range, month_masks
+import pet_sitter.availability_calendar as availability_calendar
+
+def test_ranges_include_both_ends_and_filter_weekdays():
+  assert dates_in_range(date(2030, 5, 6), date(2030, 5, 8)) == [date(2030, 5, 6), date(2030, 5, 7), date(2030, 5, 8)]
+  assert dates_in_range(date(2030, 5, 6), date(2030, 5, 19), [0, 6]) == [date(2030, 5, 6), date(2030, 5, 12), date(2030, 5, 13), date(2030, 5, 19)] # Mondays and Sundays
+  assert dates_in_range(date(2030, 5, 6), date(2030, 5, 6), []) == []
+
+def test_month_masks_set_one_bit_per_day():
+  assert month_masks(date(2030, 5, 30), date(2030, 6, 2)) == {date(2030, 5, 1): 1 << 29 | 1 << 30, date(2030, 6, 1): 0b11}
+  assert month_masks(date(2030, 5, 6), date(2030, 5, 19), [0]) == {date(2030, 5, 1): 1 << 5 | 1 << 12}
+
+def availability_dates(client, appuserID: int) -> list:
+  return sorted(availability["available_date"][:10] for availability in client.get(f"/appuser/{appuserID}/availability").json())
+
+def sign_sitter_up(client, signup) -> tuple:
+  appuserID, headers = signup()
+  assert client.post(f"/sitter/{appuserID}", json={"sitter_profile_bio": "Happy to help"}, headers=headers).status_code == 200
+  return appuserID, headers
+
+def test_bulk_saves_create_only_new_dates(client, signup):
+  appuserID, headers = sign_sitter_up(client, signup)
+  first = client.post(f"/appuser/{appuserID}/availability", json=[{"available_date": "2030-05-02T00:00:00"}, {"available_date": "2030-05-01T00:00:00"}], headers=headers)
+  assert first.status_code == 201, first.text
+  assert [created["available_date"] for created in first.json()["created"]] == ["2030-05-01", "2030-05-02"]
+  assert first.json()["skipped"] == []
+
+  second = client.post(f"/appuser/{appuserID}/availability", json=[{"available_date": "2030-05-02T00:00:00"}, {"available_date": "2030-05-03T00:00:00"}, {"available_date": "2030-05-03T00:00:00"}], headers=headers)
+  assert [created["available_date"] for created in second.json()["created"]] == ["2030-05-03"]
+  assert second.json()["skipped"] == ["2030-05-02"]
+  assert availability_dates(client, appuserID) == ["2030-05-01", "2030-05-02", "2030-05-03"]
+
+def test_ranges_report_created_and_skipped_dates(client, signup):
+  appuserID, headers = signup()
+  client.post(f"/appuser/{appuserID}/availability", json=[{"available_date": "2030-05-07T00:00:00"}], headers=headers)
+
+  response = client.post(f"/appuser/{appuserID}/availability/range", json={"start_date": "2030-05-06", "end_date": "2030-05-08"}, headers=headers)
+  assert response.status_code == 201, response.text
+  assert [created["available_date"] for created in response.json()["created"]] == ["2030-05-06", "2030-05-08"]
+  assert response.json()["skipped"] == ["2030-05-07"]
+
+def test_ranges_are_cleared_by_weekday(client, signup):
+  appuserID, headers = sign_sitter_up(client, signup)
+  client.post(f"/appuser/{appuserID}/availability/range", json={"start_date": "2030-05-06", "end_date": "2030-05-19"}, headers=headers)
+
+  response = client.delete(f"/appuser/{appuserID}/availability", params={"start_date": "2030-05-01", "end_date": "2030-05-31", "weekdays": [5, 6]}, headers=headers)
+  assert response.status_code == 200, response.text
+  assert response.json()["deleted"] == ["2030-05-11", "2030-05-12", "2030-05-18", "2030-05-19"]
+
+  response = client.delete(f"/appuser/{appuserID}/availability", params={"start_date": "2030-05-06", "end_date": "2030-05-07"}, headers=headers)
+  assert response.json()["deleted"] == ["2030-05-06", "2030-05-07"]
+  assert len(availability_dates(client, appuserID)) == 8
+
+def test_ranges_are_validated_and_owned(client, signup):
+  appuserID, headers = signup()
+  _, otherHeaders = signup()
+
+  def create(body: dict, headers: dict = headers) -> int:
+    return client.post(f"/appuser/{appuserID}/availability/range", json=body, headers=headers).status_code
+
+  assert create({"start_date": "2030-05-08", "end_date": "2030-05-07"}) == 400
+  assert create({"start_date": "2030-01-01", "end_date": "2031-01-02"}) == 400 # 367 days
+  assert create({"start_date": "2030-05-01", "end_date": "2030-05-07", "weekdays": [7]}) == 400
+  assert create({"start_date": "2030-05-01", "end_date": "2030-05-07"}, otherHeaders) == 403
+  assert client.delete(f"/appuser/{appuserID}/availability", params={"start_date": "2030-05-01", "end_date": "2030-05-07"}, headers=otherHeaders).status_code == 403
+
+def month_bitmaps(client) -> dict:
+  rows = client.portal.call(lambda: Tortoise.get_connection("default").execute_query_dict('SELECT "appuser_id", "month", "days" FROM "availability_month" WHERE "days" <> 0'))
+  return {(row["appuser_id"], row["month"]): row["days"] for row in rows}
+
+def test_bitmaps_follow_every_availability_write(client, signup):
+  appuserID, headers = sign_sitter_up(client, signup)
+  created = client.post(f"/appuser/{appuserID}/availability", json=[{"available_date": "2030-05-31T00:00:00"}, {"available_date": "2030-06-01T00:00:00"}], headers=headers).json()["created"]
+  client.post(f"/appuser/{appuserID}/availability/range", json={"start_date": "2030-05-01", "end_date": "2030-05-10", "weekdays": [0, 1]}, headers=headers)
+  client.delete(f"/appuser/{appuserID}/availability", params={"start_date": "2030-05-07", "end_date": "2030-05-07"}, headers=headers)
+  assert client.delete(f"/availability/{created[1]['id']}", headers=headers).status_code == 200
+
+  assert month_bitmaps(client) == {(appuserID, date(2030, 5, 1)): 1 << 5 | 1 << 30} # the 6th and the 31st
+  client.portal.call(lambda: availability_calendar.rebuild_months(Tortoise.get_connection("default")))
+  assert month_bitmaps(client) == {(appuserID, date(2030, 5, 1)): 1 << 5 | 1 << 30} # as rebuilt from the rows
+
+def test_calendar_is_masked_to_the_window(client, signup):
+  appuserID, headers = sign_sitter_up(client, signup)
+  client.post(f"/appuser/{appuserID}/availability/range", json={"start_date": "2030-05-01", "end_date": "2030-06-30", "weekdays": [0]}, headers=headers)
+
+  response = client.get(f"/appuser/{appuserID}/availability/calendar", params={"start_date": "2030-05-10", "end_date": "2030-06-05"})
+  assert response.status_code == 200, response.text
+  assert response.json()["months"] == {"2030-05": 1 << 12 | 1 << 19 | 1 << 26, "2030-06": 1 << 2} # Mondays from the 13th of May to the 3rd of June
+  assert client.get(f"/appuser/{appuserID}/availability/calendar", params={"start_date": "2030-07-01", "end_date": "2030-07-31"}).json()["months"] == {}
+  assert client.get(f"/appuser/{appuserID}/availability/calendar", params={"start_date": "2030-05-10", "end_date": "2030-05-01"}).status_code == 400
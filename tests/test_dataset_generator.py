@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+import pet_sitter.dataset_generator as dataset_generator
+import pet_sitter.models as models
+import csv
+import os
+
+def small_config(**overrides) -> dataset_generator.DatasetConfig:
+  settings = dict(appusers=40, sitters=12, inquiries=25, messages_per_inquiry=3, availability_per_sitter=4, max_pets_per_appuser=3, seed=5, shard_size=15, now=datetime(2024, 6, 1, tzinfo=timezone.utc))
+  settings.update(overrides)
+  return dataset_generator.DatasetConfig(**settings)
+
+def read_tables(out_dir: str) -> dict:
+  tables = {}
+  for table in sorted(os.listdir(out_dir)):
+    rows = []
+    for part in sorted(os.listdir(os.path.join(out_dir, table))):
+      with open(os.path.join(out_dir, table, part), newline="") as part_file:
+        rows.extend(list(csv.reader(part_file))[1:])
+    tables[table] = rows
+  return tables
+
+def test_sitters_are_spread_evenly_over_the_appuser_ids():
+  config = small_config()
+  sitterNumbers = [config.sitter_number(appuser_id) for appuser_id in range(1, config.appusers + 1)]
+  numbered = [number for number in sitterNumbers if number is not None]
+
+  assert numbered == list(range(1, config.sitters + 1))
+  assert all(config.sitter_number(config.sitter_appuser_id(number)) == number for number in numbered)
+
+def test_output_does_not_depend_on_the_process_count(tmp_path):
+  config = small_config()
+  single = dataset_generator.generate(config, "csv", str(tmp_path / "single"), processes=1, progress=lambda _: None)
+  parallel = dataset_generator.generate(config, "csv", str(tmp_path / "parallel"), processes=3, progress=lambda _: None)
+
+  assert single == parallel
+  assert single["appuser"] == 40 and single["sitter"] == 12 and single["message"] == 75
+  assert read_tables(str(tmp_path / "single")) == read_tables(str(tmp_path / "parallel"))
+
+def test_rows_reference_existing_rows(tmp_path):
+  config = small_config()
+  dataset_generator.generate(config, "csv", str(tmp_path), processes=1, progress=lambda _: None)
+  tables = read_tables(str(tmp_path))
+  petOwners = {row[0]: row[12] for row in tables["pet"]}
+  sitterAppuserIDs = {row[-1] for row in tables["sitter"]}
+
+  for row in tables["inquiry"]:
+    assert row[2] in sitterAppuserIDs
+    assert all(petOwners[petID] == row[1] for petID in row[7].split(","))
+  assert {row[1] for row in tables["message"]} == {row[0] for row in tables["inquiry"]}
+
+def test_generated_rows_load_into_the_app_schema(client):
+  totals = dataset_generator.generate(small_config(), "postgres", os.environ["DATABASE_URL"], processes=2, progress=lambda _: None)
+
+  assert client.portal.call(models.Appuser.all().count) == totals["appuser"]
+  assert client.portal.call(models.Message.all().count) == totals["message"]
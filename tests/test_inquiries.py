@@ -0,0 +1,72 @@
+def create_pet(client, appuserID: int, headers: dict, name: str = "Pochi") -> int:
+  response = client.post(f"/appuser/{appuserID}/pet", json={"name": name, "type_of_animal": "dog"}, headers=headers)
+  assert response.status_code == 201, response.text
+  return response.json()["id"]
+
+def create_inquiry(client, ownerID: int, sitterID: int, headers: dict, pet_id_list: str) -> int:
+  body = {"owner_appuser_id": ownerID, "sitter_appuser_id": sitterID, "start_date": "2030-05-01T00:00:00", "end_date": "2030-05-03T00:00:00", "desired_service": "visit", "pet_id_list": pet_id_list}
+  response = client.post("/inquiry", json=body, headers=headers)
+  assert response.status_code == 201, response.text
+  return response.json()["id"]
+
+def test_inquiry_pets_keep_the_listed_order(client, signup, make_sitter):
+  sitterID = make_sitter()
+  ownerID, headers = signup()
+  pochi, tama, hachi = (create_pet(client, ownerID, headers, name) for name in ["Pochi", "Tama", "Hachi"])
+  inquiryID = create_inquiry(client, ownerID, sitterID, headers, f"{hachi}, {pochi},{tama},{hachi}")
+
+  response = client.get(f"/inquiry/{inquiryID}/pet", headers=headers)
+  assert response.status_code == 200, response.text
+  assert [pet["id"] for pet in response.json()["pets_array"]] == [hachi, pochi, tama]
+  assert response.json()["pets_not_found"] == ""
+
+def test_missing_and_other_users_pets_are_not_found(client, signup, make_sitter):
+  sitterID = make_sitter()
+  ownerID, headers = signup()
+  otherID, otherHeaders = signup()
+  pochi = create_pet(client, ownerID, headers)
+  someoneElses = create_pet(client, otherID, otherHeaders)
+  inquiryID = create_inquiry(client, ownerID, sitterID, headers, f"{pochi},999,{someoneElses}")
+
+  response = client.get(f"/inquiry/{inquiryID}/pet", headers=headers).json()
+  assert [pet["id"] for pet in response["pets_array"]] == [pochi]
+  assert response["pets_not_found"] == f"999,{someoneElses}"
+
+def test_inquiry_pets_are_only_shown_to_its_participants(client, signup, make_sitter):
+  sitterID = make_sitter()
+  ownerID, headers = signup()
+  _, strangerHeaders = signup()
+  inquiryID = create_inquiry(client, ownerID, sitterID, headers, str(create_pet(client, ownerID, headers)))
+
+  assert client.get(f"/inquiry/{inquiryID}/pet", headers=strangerHeaders).status_code == 403
+
+def test_inquiries_can_be_listed_by_pet(client, signup, make_sitter):
+  sitterID = make_sitter()
+  ownerID, headers = signup()
+  pochi, tama = create_pet(client, ownerID, headers, "Pochi"), create_pet(client, ownerID, headers, "Tama")
+  both = create_inquiry(client, ownerID, sitterID, headers, f"{pochi},{tama}")
+  onlyTama = create_inquiry(client, ownerID, sitterID, headers, str(tama))
+
+  def inquiries(petID: int) -> list:
+    return [inquiry["id"] for inquiry in client.get(f"/appuser/{ownerID}/inquiry", params={"is_sitter": False, "pet_id": petID}, headers=headers).json()]
+
+  assert inquiries(tama) == [both, onlyTama]
+  assert inquiries(pochi) == [both]
+
+  assert client.put(f"/inquiry/{both}", json={"pet_id_list": f" {tama} "}, headers=headers).json()["pet_id_list"] == str(tama)
+  assert inquiries(pochi) == []
+
+def test_pet_id_lists_must_hold_pet_ids(client, signup, make_sitter):
+  sitterID = make_sitter()
+  ownerID, headers = signup()
+  body = {"owner_appuser_id": ownerID, "sitter_appuser_id": sitterID, "start_date": "2030-05-01T00:00:00", "end_date": "2030-05-03T00:00:00", "desired_service": "visit", "pet_id_list": "1,abc"}
+
+  assert client.post("/inquiry", json=body, headers=headers).status_code == 400
+  inquiryID = create_inquiry(client, ownerID, sitterID, headers, str(create_pet(client, ownerID, headers)))
+  assert client.put(f"/inquiry/{inquiryID}", json={"pet_id_list": "1;2"}, headers=headers).status_code == 400
+
+def test_picture_lists_read_back_as_comma_separated_strings(client, signup):
+  appuserID, headers = signup()
+  response = client.post(f"/appuser/{appuserID}/pet", json={"name": "Pochi", "type_of_animal": "dog", "pet_bio_picture_src_list": "a.png, b.png"}, headers=headers)
+
+  assert client.get(f"/pet/{response.json()['id']}").json()["pet_bio_picture_src_list"] == "a.png,b.png"
@@ -0,0 +1,40 @@
+from pet_sitter.location_lookup import city_ward_to_english, city_ward_to_japanese, prefecture_to_english, prefecture_to_japanese
+import pet_sitter.locations as locations
+import pytest
+
+@pytest.mark.parametrize("spelling", ["Aomori", "aomori", "ＡＯＭＯＲＩ", "青森県", "青森", "Aomori Prefecture", "aomori-ken"])
+def test_every_spelling_of_a_prefecture_is_found(spelling):
+  assert prefecture_to_english(spelling) == "Aomori"
+
+@pytest.mark.parametrize("spelling", ["Shibuya", "SHIBUYA", "渋谷", "渋谷区", "shibuya-ku", "Shibuya City"])
+def test_every_spelling_of_a_city_is_found_within_its_prefecture(spelling):
+  assert city_ward_to_english(spelling, "Tokyo") == "Shibuya"
+  assert city_ward_to_english(spelling, "東京都") == "Shibuya"
+
+def test_unknown_names_give_none():
+  assert prefecture_to_english("Atlantis") is None
+  assert prefecture_to_english(None) is None
+  assert city_ward_to_english("Shibuya", "Osaka") is None
+  assert city_ward_to_english("Shibuya", None) is None
+  assert city_ward_to_english(None, "Tokyo") is None
+
+def test_every_listed_location_round_trips():
+  for japanese, english in locations.prefecture_mapping.items():
+    assert prefecture_to_english(japanese) == english
+    assert prefecture_to_japanese(english) == japanese
+  for prefecture, cities in locations.city_mapping.items():
+    for english, japanese in cities.items():
+      assert city_ward_to_english(english, prefecture) == english
+      assert cities[city_ward_to_english(japanese, prefecture)] == japanese # a few cities share a japanese name in locations.py
+      assert city_ward_to_japanese(english, prefecture) == japanese
+
+def test_partial_updates_keep_the_stored_location(client, signup):
+  appuserID, headers = signup()
+  assert client.put(f"/appuser/{appuserID}", json={"prefecture": "東京都", "city_ward": "渋谷区"}, headers=headers).json()["city_ward"] == "Shibuya"
+
+  response = client.put(f"/appuser/{appuserID}", json={"city_ward": "meguro-ku"}, headers=headers)
+  assert response.status_code == 200, response.text
+  assert (response.json()["prefecture"], response.json()["city_ward"]) == ("Tokyo", "Meguro")
+
+  response = client.put(f"/appuser/{appuserID}", json={"firstname": "Hana"}, headers=headers)
+  assert (response.json()["prefecture"], response.json()["city_ward"]) == ("Tokyo", "Meguro")
@@ -0,0 +1,37 @@
+def post_messages(client, inquiry, count: int) -> list:
+  inquiryID, (ownerID, ownerHeaders), (sitterID, _) = inquiry
+  messageIDs = []
+  for number in range(count):
+    response = client.post(f"/inquiry/{inquiryID}/message", json={"author_appuser_id": ownerID, "recipient_appuser_id": sitterID, "content": f"Message {number}"}, headers=ownerHeaders)
+    assert response.status_code == 201, response.text
+    messageIDs.append(response.json()["id"])
+  return messageIDs
+
+def get_page(client, inquiry, **params) -> tuple:
+  inquiryID, (_, headers), _ = inquiry
+  response = client.get(f"/inquiry/{inquiryID}/message", params=params, headers=headers)
+  assert response.status_code == 200, response.text
+  return [message["id"] for message in response.json()], response.headers.get("X-Has-More")
+
+def test_without_paging_the_whole_history_is_returned(client, inquiry):
+  messageIDs = post_messages(client, inquiry, 3)
+  assert get_page(client, inquiry) == (messageIDs, None)
+
+def test_history_pages_in_both_directions(client, inquiry):
+  messageIDs = post_messages(client, inquiry, 5)
+
+  assert get_page(client, inquiry, limit=2) == (messageIDs[3:], "true") # the newest
+  assert get_page(client, inquiry, before_id=messageIDs[3], limit=2) == (messageIDs[1:3], "true")
+  assert get_page(client, inquiry, before_id=messageIDs[1], limit=2) == (messageIDs[:1], "false")
+  assert get_page(client, inquiry, after_id=messageIDs[0], limit=2) == (messageIDs[1:3], "true")
+  assert get_page(client, inquiry, after_id=messageIDs[2], limit=2) == (messageIDs[3:], "false")
+  assert get_page(client, inquiry, after_id=messageIDs[0], before_id=messageIDs[4], limit=10) == (messageIDs[1:4], "false")
+
+def test_pages_hold_only_this_inquirys_messages(client, inquiry, signup):
+  messageIDs = post_messages(client, inquiry, 2)
+  inquiryID, (_, headers), _ = inquiry
+  _, strangerHeaders = signup()
+
+  assert get_page(client, inquiry, after_id=0)[0] == messageIDs
+  assert client.get(f"/inquiry/{inquiryID}/message", params={"limit": 2}, headers=strangerHeaders).status_code == 403
+  assert client.get(f"/inquiry/{inquiryID}/message", params={"limit": 0}, headers=headers).status_code == 400
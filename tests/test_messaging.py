@@ -0,0 +1,144 @@
+from pet_sitter.messaging import InProcessBroker, InquiryMessagesManager, PostgresBroker, create_message_broker
+from tests.conftest import TEST_DATABASE_URL
+import asyncio
+import pytest
+
+class FakeWebSocket:
+  def __init__(self, fail: bool = False, stalled: bool = False):
+    self.fail = fail
+    self.stalled = stalled # sends never complete, like a client that stopped reading
+    self.closed_with = None
+    self.sent = []
+
+  async def send_json(self, message: dict):
+    if self.fail:
+      raise RuntimeError("socket closed")
+    if self.stalled:
+      await asyncio.Event().wait()
+    self.sent.append(message)
+
+  async def close(self, code: int = 1000):
+    self.closed_with = code
+
+async def settle():
+  # lets the writer tasks drain their queues
+  for _ in range(10):
+    await asyncio.sleep(0)
+
+def message(inquiry_id: int, content: str = "hello") -> dict:
+  return {"id": 1, "inquiry_id": inquiry_id, "content": content, "author_appuser_id": 1, "recipient_appuser_id": 2, "time_sent": "2030-05-01T00:00:00"}
+
+@pytest.mark.anyio
+async def test_messages_reach_every_socket_on_their_inquiry():
+  manager = InquiryMessagesManager()
+  await manager.start()
+  first, second, elsewhere = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+  await manager.connect(1, first)
+  await manager.connect(1, second)
+  await manager.connect(2, elsewhere)
+
+  await manager.broadcast(message(1))
+  await settle()
+
+  assert first.sent == [message(1)]
+  assert second.sent == [message(1)]
+  assert elsewhere.sent == []
+  assert manager.stats()["sockets"] == 3
+
+@pytest.mark.anyio
+async def test_inquiries_are_subscribed_while_a_socket_is_open():
+  broker = InProcessBroker()
+  manager = InquiryMessagesManager(broker)
+  await manager.start()
+  first, second = FakeWebSocket(), FakeWebSocket()
+
+  await manager.connect(1, first)
+  await manager.connect(1, second)
+  await manager.disconnect(1, first)
+  assert broker.stats()["subscriptions"] == 1
+
+  await manager.disconnect(1, second)
+  assert broker.stats()["subscriptions"] == 0
+  await manager.broadcast(message(1))
+  assert second.sent == []
+
+@pytest.mark.anyio
+async def test_failures_do_not_reach_the_sender():
+  manager = InquiryMessagesManager()
+  await manager.start()
+  broken, working = FakeWebSocket(fail=True), FakeWebSocket()
+  await manager.connect(1, broken)
+  await manager.connect(1, working)
+
+  await manager.broadcast(message(1))
+  await manager.broadcast(message(1))
+  await settle()
+  assert working.sent == [message(1), message(1)]
+  assert (manager.stats()["sockets"], manager.stats()["failed"]) == (1, 1) # the broken socket was dropped
+
+  async def publish(message: dict):
+    raise ConnectionError("broker unavailable")
+
+  manager.broker.publish = publish
+  await manager.broadcast(message(1)) # logged, not raised
+
+@pytest.mark.anyio
+async def test_sockets_that_fall_behind_are_closed_without_holding_up_the_others():
+  manager = InquiryMessagesManager(queue_size=2)
+  await manager.start()
+  stalled, reading = FakeWebSocket(stalled=True), FakeWebSocket()
+  await manager.connect(1, stalled)
+  await manager.connect(1, reading)
+
+  for _ in range(4): # the stalled socket holds one message in its send and two in its queue, then overflows
+    await manager.broadcast(message(1))
+    await settle()
+
+  assert len(reading.sent) == 4
+  assert stalled.closed_with == InquiryMessagesManager.EVICTED_CLOSE_CODE
+  assert (manager.stats()["sockets"], manager.stats()["evicted"]) == (1, 1)
+  await manager.close()
+
+def test_broker_is_chosen_by_the_setting():
+  assert isinstance(create_message_broker("memory", None), InProcessBroker)
+  assert isinstance(create_message_broker("postgres", "postgres://localhost/petsitter"), PostgresBroker)
+  with pytest.raises(RuntimeError):
+    create_message_broker("postgres", None)
+
+async def wait_for(received: list, count: int):
+  for _ in range(200):
+    if len(received) >= count:
+      return
+    await asyncio.sleep(0.01)
+
+def test_postgres_broker_fans_out_between_workers(client, inquiry):
+  inquiryID, (ownerID, ownerHeaders), (sitterID, _) = inquiry
+  long = client.post(f"/inquiry/{inquiryID}/message", json={"author_appuser_id": ownerID, "recipient_appuser_id": sitterID, "content": "x" * 9000}, headers=ownerHeaders).json()
+
+  async def fan_out():
+    received = {"publisher": [], "listener": [], "other": []}
+    brokers = {name: PostgresBroker(TEST_DATABASE_URL) for name in received}
+    for name, broker in brokers.items():
+      async def deliver(message: dict, name=name):
+        received[name].append(message)
+      await broker.start(deliver)
+    try:
+      await brokers["publisher"].subscribe(inquiryID)
+      await brokers["listener"].subscribe(inquiryID)
+      await brokers["other"].subscribe(inquiryID + 1)
+
+      await brokers["publisher"].publish(message(inquiryID))
+      await brokers["publisher"].publish({**long, "content": "x" * 9000}) # over the NOTIFY limit, so sent by id
+      await wait_for(received["listener"], 2)
+      await wait_for(received["publisher"], 2)
+    finally:
+      for broker in brokers.values():
+        await broker.close()
+    return received
+
+  received = client.portal.call(fan_out)
+
+  for name in ["publisher", "listener"]:
+    assert [delivered["id"] for delivered in received[name]] == [1, long["id"]]
+    assert received[name][1]["content"] == "x" * 9000
+  assert received["other"] == []
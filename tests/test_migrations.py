@@ -0,0 +1,55 @@
+from tortoise import Tortoise # type: ignore
+import pet_sitter.migrations as migrations
+
+async def applied_versions():
+  _, rows = await Tortoise.get_connection("default").execute_query('SELECT "version" FROM "schema_migration" ORDER BY "version"')
+  return [row["version"] for row in rows]
+
+async def index_names(table: str):
+  _, rows = await Tortoise.get_connection("default").execute_query("SELECT indexname FROM pg_indexes WHERE tablename = $1", [table])
+  return {row["indexname"] for row in rows}
+
+def test_startup_applies_every_migration_once(client):
+  assert client.portal.call(applied_versions) == migrations.available_migrations()
+  assert client.portal.call(migrations.migrate) == []
+
+def upgrade_from_baseline(client, rows_sql: str):
+  """Recreates the baseline schema, inserts rows_sql into it and applies every later migration"""
+  available = migrations.available_migrations
+
+  async def upgrade():
+    connection = Tortoise.get_connection("default")
+    await connection.execute_script("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    migrations.available_migrations = lambda: ["0001_baseline"]
+    try:
+      await migrations.migrate()
+    finally:
+      migrations.available_migrations = available
+    await connection.execute_script(rows_sql)
+    return await migrations.migrate()
+
+  return client.portal.call(upgrade)
+
+def test_hot_path_migration_keeps_one_availability_per_sitter_per_day(client):
+  applied = upgrade_from_baseline(client, """
+    INSERT INTO "appuser" ("id", "firstname", "lastname", "email", "firebase_user_id") VALUES (1, 'Test', 'User', 'user@example.org', 'uid-1');
+    INSERT INTO "availability" ("appuser_id", "available_date") VALUES (1, '2024-06-01'), (1, '2024-06-01'), (1, '2024-06-02');
+  """)
+
+  assert applied == migrations.available_migrations()[1:]
+  rows = client.portal.call(lambda: Tortoise.get_connection("default").execute_query_dict('SELECT "id", "available_date" FROM "availability" ORDER BY "id"'))
+  assert [row["id"] for row in rows] == [1, 3]
+  assert {"idx_message_inquiry_id"} <= client.portal.call(index_names, "message")
+  months = client.portal.call(lambda: Tortoise.get_connection("default").execute_query_dict('SELECT "appuser_id", "days" FROM "availability_month"'))
+  assert months == [{"appuser_id": 1, "days": 0b11}] # backfilled from the remaining rows
+
+def test_list_migration_converts_pictures_and_backfills_inquiry_pets(client):
+  upgrade_from_baseline(client, """
+    INSERT INTO "appuser" ("id", "firstname", "lastname", "email", "firebase_user_id", "user_bio_picture_src_list") VALUES (1, 'Test', 'User', 'user@example.org', 'uid-1', 'a.png, b.png,');
+    INSERT INTO "inquiry" ("id", "start_date", "end_date", "desired_service", "pet_id_list", "owner_appuser_id", "sitter_appuser_id") VALUES (1, '2024-06-01', '2024-06-02', 'visit', ' 7, x,3,7', 1, 1);
+  """)
+
+  pictures = client.portal.call(lambda: Tortoise.get_connection("default").execute_query_dict('SELECT "user_bio_picture_src_list" FROM "appuser"'))
+  assert pictures[0]["user_bio_picture_src_list"] == ["a.png", "b.png"]
+  inquiryPets = client.portal.call(lambda: Tortoise.get_connection("default").execute_query_dict('SELECT "pet_id", "position" FROM "inquiry_pet" ORDER BY "position"'))
+  assert [(row["pet_id"], row["position"]) for row in inquiryPets] == [(7, 0), (3, 2)]
@@ -0,0 +1,82 @@
+from pet_sitter.pet_feed import PetFeed, seeded_position
+import pet_sitter.main as main
+import pytest
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 100, 1000])
+def test_positions_are_a_permutation(size):
+  for seed in [0, 1, 12345]:
+    assert sorted(seeded_position(index, size, seed) for index in range(size)) == list(range(size))
+
+def test_seeds_choose_different_orders():
+  orders = {tuple(seeded_position(index, 50, seed) for index in range(50)) for seed in range(5)}
+  assert len(orders) == 5
+
+def feed_of(ids) -> PetFeed:
+  feed = PetFeed()
+  for pet_id in ids:
+    feed.add(pet_id)
+  return feed
+
+def test_pages_of_one_seed_cover_every_pet_once():
+  feed = feed_of(range(10, 33))
+  pages = [feed.page(7, page, 5) for page in range(6)]
+
+  assert [len(page) for page in pages] == [5, 5, 5, 5, 3, 0]
+  assert sorted(pet_id for page in pages for pet_id in page) == list(range(10, 33))
+  assert feed.page(7, 2, 5) == pages[2] # the same seed and page always give the same pets
+
+def test_pets_added_in_any_order_give_the_same_feed():
+  assert feed_of([5, 1, 3, 3]).page(1, 0, 10) == feed_of([1, 3, 5]).page(1, 0, 10)
+
+@pytest.mark.anyio
+async def test_reload_replays_writes_made_while_it_loads(monkeypatch):
+  feed = feed_of([9])
+
+  class Query:
+    def order_by(self, field):
+      return self
+
+    async def values_list(self, *fields, flat=False):
+      feed.add(4) # a request writing while the ids are read
+      feed.remove(1)
+      return [1, 2]
+
+  monkeypatch.setattr(main.models.Pet, "all", lambda: Query())
+  await feed.reload()
+
+  assert sorted(feed.page(0, 0, 10)) == [2, 4]
+  assert feed.ready
+
+def create_pets(client, signup, count: int) -> list:
+  appuserID, headers = signup()
+  return [client.post(f"/appuser/{appuserID}/pet", json={"name": f"Pet {number}", "type_of_animal": "dog"}, headers=headers).json()["id"] for number in range(count)]
+
+def test_feed_pages_through_every_pet_for_a_seed(client, signup):
+  petIDs = create_pets(client, signup, 7)
+
+  first = client.get("/pet", params={"numOfPets": 3})
+  seed = first.headers["X-Feed-Seed"]
+  pages = [first.json()] + [client.get("/pet", params={"numOfPets": 3, "seed": seed, "page": page}).json() for page in [1, 2]]
+
+  assert sorted(pet["id"] for page in pages for pet in page) == sorted(petIDs)
+  assert client.get("/pet", params={"numOfPets": 3, "seed": seed}).json() == pages[0]
+
+def test_deleted_pets_leave_the_feed(client, signup):
+  appuserID, headers = signup()
+  petID = client.post(f"/appuser/{appuserID}/pet", json={"name": "Pochi", "type_of_animal": "dog"}, headers=headers).json()["id"]
+  assert [pet["id"] for pet in client.get("/pet").json()] == [petID]
+
+  assert client.delete(f"/pet/{petID}", headers=headers).status_code == 200
+  assert client.get("/pet").json() == []
+
+def test_feed_rejects_bad_paging(client):
+  assert client.get("/pet", params={"numOfPets": 0}).status_code == 400
+  assert client.get("/pet", params={"page": -1}).status_code == 400
+
+def test_feed_clamps_oversized_pages(client, signup, monkeypatch):
+  create_pets(client, signup, 3)
+  monkeypatch.setattr(main, "pet_feed_max_page_size", 2)
+
+  response = client.get("/pet", params={"numOfPets": 501})
+  assert response.status_code == 200
+  assert len(response.json()) == 2
@@ -0,0 +1,53 @@
+from pet_sitter.proximity import CityGrid, city_grid, distance_km
+import pet_sitter.locations as locations
+import pet_sitter.main as main
+import pytest
+
+def test_distance_between_city_centroids():
+  assert distance_km((35.69, 139.70), (34.69, 135.50)) == pytest.approx(397, abs=5) # Shinjuku to Osaka
+  assert distance_km((35.66, 139.70), (35.66, 139.70)) == 0
+
+@pytest.mark.parametrize("radius_km", [1, 10, 60, 200])
+def test_grid_finds_the_same_cities_as_measuring_every_city(radius_km):
+  grid = city_grid()
+  for prefecture, city in [("Tokyo", "Shibuya"), ("Osaka", "Osaka"), ("Hokkaido", None)]:
+    origin = grid.locate(prefecture, city)
+    everyCity = sorted((distance_km(origin, coordinates), (cityPrefecture, cityName)) for cityPrefecture, cities in locations.city_coordinates.items() for cityName, coordinates in cities.items() if distance_km(origin, coordinates) <= radius_km)
+    assert grid.within(origin, radius_km) == everyCity
+
+def test_every_listed_city_has_its_own_centroid_or_is_left_out():
+  placed = [(prefecture, city) for prefecture, cities in locations.city_coordinates.items() for city in cities]
+  unplaced = [(prefecture, city) for prefecture, cities in locations.unplaced_cities.items() for city in cities]
+  listed = [(prefecture, city) for prefecture, cities in locations.japan_prefectures_cities.items() for city in cities]
+
+  assert set(placed) | set(unplaced) == set(listed) and not set(placed) & set(unplaced)
+  centroids = [locations.city_coordinates[prefecture][city] for prefecture, city in placed]
+  assert len(set(centroids)) == len(centroids)
+
+def test_unknown_cities_stand_in_with_the_prefecture_capital():
+  grid = CityGrid({"Tokyo": {"Shinjuku": (35.69, 139.70), "Shibuya": (35.66, 139.70)}})
+
+  assert grid.locate("Tokyo", "Shibuya") == (35.66, 139.70)
+  assert grid.locate("Tokyo", "Nowhere") == (35.69, 139.70)
+  assert grid.locate("Atlantis") is None
+
+@pytest.mark.parametrize("use_sitter_index", [True, False])
+def test_nearby_sitters_are_ordered_by_distance(client, make_sitter, monkeypatch, use_sitter_index):
+  shinjuku = make_sitter("Tokyo", "Shinjuku", dogs_ok=True)
+  meguro = make_sitter("Tokyo", "Meguro", dogs_ok=True)
+  shibuya = make_sitter("Tokyo", "Shibuya", dogs_ok=True)
+  make_sitter("Tokyo", "Shibuya") # no dogs
+  make_sitter("Osaka", "Osaka", dogs_ok=True)
+  monkeypatch.setattr(main, "use_sitter_index", use_sitter_index)
+
+  response = client.get("/appuser-sitters/nearby", params={"prefecture": "Tokyo", "city_ward": "Shibuya", "radius_km": 5, "dogs_ok": True})
+  assert response.status_code == 200, response.text
+  assert [(match["appuser"]["id"], match["distance_km"]) for match in response.json()] == [(shibuya, 0.0), (meguro, 2.2), (shinjuku, 3.3)]
+
+  nearest = client.get("/appuser-sitters/nearby", params={"prefecture": "Tokyo", "city_ward": "Shibuya", "nearest": 4, "dogs_ok": True}).json()
+  assert [match["appuser"]["id"] for match in nearest] == [shibuya, meguro, shinjuku] # Osaka is beyond the largest radius
+
+def test_nearby_search_rejects_unknown_places_and_bad_radii(client):
+  assert client.get("/appuser-sitters/nearby", params={"prefecture": "Atlantis"}).status_code == 400
+  assert client.get("/appuser-sitters/nearby", params={"prefecture": "Tokyo", "radius_km": 0}).status_code == 400
+  assert client.get("/appuser-sitters/nearby", params={"prefecture": "Tokyo", "radius_km": main.sitter_search_max_radius_km + 1}).status_code == 400
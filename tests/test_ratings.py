@@ -0,0 +1,48 @@
+from tortoise import Tortoise # type: ignore
+import pet_sitter.ratings as ratings
+
+def review(client, recipientID: int, authorID: int, headers: dict, role: str, score: int) -> dict:
+  response = client.post(f"/appuser/{recipientID}/review", json={"author_appuser_id": authorID, "recipient_appuser_type": role, "score": score}, headers=headers)
+  assert response.status_code == 201, response.text
+  return response.json()["appuser"]
+
+def test_reviews_add_to_the_recipients_role_aggregates(client, signup):
+  recipientID, _ = signup()
+  authorID, headers = signup()
+
+  review(client, recipientID, authorID, headers, "sitter", 4)
+  review(client, recipientID, authorID, headers, "sitter", 5)
+  appuser = review(client, recipientID, authorID, headers, "owner", 2)
+
+  assert (appuser["sitter_review_count"], appuser["sitter_score_sum"]) == (2, 9)
+  assert (appuser["owner_review_count"], appuser["owner_score_sum"]) == (1, 2)
+  assert appuser["average_user_rating"] == 11 / 3 # legacy, over both roles
+
+  ratings = client.get(f"/appuser/{recipientID}", headers=headers).json()
+  assert (ratings["sitter_rating"], ratings["owner_rating"]) == (4.5, 2.0)
+
+def test_role_ratings_are_unset_without_reviews():
+  assert ratings.role_rating(0, 0) is None
+  assert ratings.role_rating(2, 7) == 3.5
+
+def test_invalid_reviews_leave_the_aggregates_alone(client, signup):
+  recipientID, _ = signup()
+  authorID, headers = signup()
+
+  assert client.post(f"/appuser/{recipientID}/review", json={"author_appuser_id": authorID, "recipient_appuser_type": "sitter", "score": 6}, headers=headers).status_code == 400
+  assert client.post(f"/appuser/{recipientID}/review", json={"author_appuser_id": authorID, "recipient_appuser_type": "pet", "score": 3}, headers=headers).status_code == 400
+  assert client.get(f"/appuser/{recipientID}", headers=headers).json()["sitter_review_count"] == 0
+
+def test_recompute_repairs_drifted_aggregates(client, signup):
+  recipientID, _ = signup()
+  authorID, headers = signup()
+  review(client, recipientID, authorID, headers, "sitter", 3)
+  review(client, recipientID, authorID, headers, "owner", 5)
+
+  connection = lambda: Tortoise.get_connection("default")
+  client.portal.call(lambda: connection().execute_query('UPDATE "appuser" SET "sitter_score_sum" = 40, "owner_review_count" = 7 WHERE "id" = $1', [recipientID]))
+
+  assert client.portal.call(lambda: ratings.recompute_ratings(connection())) == 1
+  assert client.portal.call(lambda: ratings.recompute_ratings(connection())) == 0
+  rows = client.portal.call(lambda: connection().execute_query_dict('SELECT "owner_review_count", "owner_score_sum", "sitter_review_count", "sitter_score_sum" FROM "appuser" WHERE "id" = $1', [recipientID]))
+  assert rows == [{"owner_review_count": 1, "owner_score_sum": 5, "sitter_review_count": 1, "sitter_score_sum": 3}]
@@ -0,0 +1,85 @@
+from pet_sitter.search_cache import InProcessSearchCache, create_search_cache, search_cache_key
+import pet_sitter.main as main
+import pytest
+import time
+
+def test_keys_depend_on_every_part():
+  assert search_cache_key("Tokyo", ["dogs_ok"], None) == search_cache_key("Tokyo", ["dogs_ok"], None)
+  assert search_cache_key("Tokyo", ["dogs_ok"], None) != search_cache_key("Tokyo", ["cats_ok"], None)
+  assert search_cache_key("Tokyo", None) != search_cache_key("Tokyo", "None")
+
+def test_backend_is_chosen_by_the_setting():
+  assert create_search_cache("off", ttl=60, max_entries=10) is None
+  assert isinstance(create_search_cache("memory", ttl=60, max_entries=10), InProcessSearchCache)
+
+@pytest.mark.anyio
+async def test_entries_expire_after_the_ttl(monkeypatch):
+  now = 1000.0
+  monkeypatch.setattr(time, "time", lambda: now)
+  cache = InProcessSearchCache(ttl=60)
+  await cache.set("Tokyo", "a", {"body": "[]"})
+
+  now = 1059.0
+  assert await cache.get("Tokyo", "a") == {"body": "[]"}
+  now = 1060.0
+  assert await cache.get("Tokyo", "a") is None
+  assert (await cache.stats())["size"] == 0
+
+@pytest.mark.anyio
+async def test_least_recently_used_entries_are_evicted():
+  cache = InProcessSearchCache(max_entries=2)
+  await cache.set("Tokyo", "a", {})
+  await cache.set("Tokyo", "b", {})
+  await cache.get("Tokyo", "a")
+  await cache.set("Osaka", "c", {})
+
+  assert await cache.get("Tokyo", "b") is None
+  assert await cache.get("Tokyo", "a") == {}
+  assert await cache.get("Osaka", "c") == {}
+
+@pytest.mark.anyio
+async def test_invalidation_drops_only_that_prefecture():
+  cache = InProcessSearchCache()
+  await cache.set("Tokyo", "a", {})
+  await cache.set("Tokyo", "b", {})
+  await cache.set("Osaka", "a", {})
+  await cache.invalidate("Tokyo", "Tokyo")
+
+  assert await cache.get("Tokyo", "a") is None
+  assert await cache.get("Tokyo", "b") is None
+  assert await cache.get("Osaka", "a") == {}
+  stats = await cache.stats()
+  assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+def test_searches_are_served_from_the_cache_until_a_sitter_changes(client, make_sitter, signup, monkeypatch):
+  monkeypatch.setattr(main, "search_cache", InProcessSearchCache())
+  make_sitter("Tokyo", "Shibuya", dogs_ok=True)
+  params = {"prefecture": "Tokyo", "dogs_ok": True, "include_total": True}
+
+  first = client.get("/appuser-sitters", params=params)
+  second = client.get("/appuser-sitters", params={**params, "prefecture": "東京都"}) # the same search once normalized
+  assert second.json() == first.json()
+  assert second.headers["X-Total-Count"] == "1"
+  assert client.get("/metrics").json()["search_cache"]["hits"] == 1
+
+  make_sitter("Tokyo", "Meguro", dogs_ok=True)
+  assert len(client.get("/appuser-sitters", params=params).json()) == 2
+
+  appuserID, headers = signup()
+  assert client.post(f"/sitter/{appuserID}", json={"sitter_profile_bio": "hi", "dogs_ok": True}, headers=headers).status_code in (200, 201)
+  assert client.put(f"/appuser/{appuserID}", json={"prefecture": "Tokyo", "city_ward": "Kita"}, headers=headers).status_code == 200
+  assert len(client.get("/appuser-sitters", params=params).json()) == 3 # moved into Tokyo, so its entries were dropped
+
+@pytest.mark.anyio
+async def test_redis_invalidation_moves_to_a_new_generation():
+  fakeredis = pytest.importorskip("fakeredis")
+  from pet_sitter.search_cache import RedisSearchCache
+  cache = RedisSearchCache("redis://localhost")
+  cache._client = fakeredis.FakeAsyncRedis()
+  await cache.set("Tokyo", "a", {"body": "[]"})
+  await cache.set("Osaka", "a", {"body": "[1]"})
+
+  assert await cache.get("Tokyo", "a") == {"body": "[]"}
+  await cache.invalidate("Tokyo")
+  assert await cache.get("Tokyo", "a") is None
+  assert await cache.get("Osaka", "a") == {"body": "[1]"}
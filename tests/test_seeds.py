@@ -0,0 +1,42 @@
+from datetime import datetime
+from tortoise import Tortoise # type: ignore
+import pet_sitter.models as models
+import pet_sitter.seeds as seeds
+import pytest
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+def test_seed_rows_are_reproducible_for_a_scale_and_seed():
+  first = seeds.generate_seed_rows(30, 7, NOW)
+  second = seeds.generate_seed_rows(30, 7, NOW)
+
+  for model in first:
+    assert [row.id for row in first[model]] == [row.id for row in second[model]]
+  assert [appuser.email for appuser in first[models.Appuser]] == [appuser.email for appuser in second[models.Appuser]]
+  assert [appuser.email for appuser in seeds.generate_seed_rows(30, 8, NOW)[models.Appuser]] != [appuser.email for appuser in first[models.Appuser]]
+
+@pytest.fixture
+def model_relations():
+  # foreign key ids such as Pet.appuser_id only exist once the models are initialized, which needs no database
+  Tortoise.init_models(["pet_sitter.models"], "models")
+
+def test_seed_rows_reference_each_other_consistently(model_relations):
+  rows = seeds.generate_seed_rows(30, 7, NOW)
+  appuserIDs = {appuser.id for appuser in rows[models.Appuser]}
+  petOwners = {pet.id: pet.appuser_id for pet in rows[models.Pet]}
+
+  assert len({appuser.email for appuser in rows[models.Appuser]}) == 30
+  for inquiry in rows[models.Inquiry]:
+    assert {inquiry.owner_appuser_id, inquiry.sitter_appuser_id} <= appuserIDs
+    assert all(petOwners[int(petID)] == inquiry.owner_appuser_id for petID in inquiry.pet_id_list.split(",") if petID)
+
+  availableDates = [(availability.appuser_id, availability.available_date) for availability in rows[models.Availability]]
+  assert len(availableDates) == len(set(availableDates))
+
+def test_seeding_inserts_every_row_and_moves_the_id_sequences_past_them(client, signup):
+  client.portal.call(lambda: seeds.seed_db(scale=20, seed=1))
+
+  assert client.portal.call(models.Appuser.all().count) == 20
+  assert client.portal.call(models.Sitter.all().count) == 20
+  appuserID, _ = signup()
+  assert appuserID == 21
@@ -0,0 +1,208 @@
+from pet_sitter.sitter_index import SitterIndex, RankingWeights, flags_mask, ranking_score, top_k
+import pet_sitter.main as main
+import pet_sitter.models as models
+import pytest
+import time
+
+DOGS = flags_mask(["dogs_ok"])
+DOGS_AND_CATS = flags_mask(["dogs_ok", "cats_ok"])
+NO_RANKING = (0.0, 0.0)
+
+def test_search_finds_sitters_by_location_and_every_flag():
+  index = SitterIndex()
+  index.upsert(3, "Tokyo", "Shibuya", DOGS_AND_CATS)
+  index.upsert(1, "Tokyo", "Minato", DOGS)
+  index.upsert(2, "Tokyo", "Shibuya", DOGS)
+  index.upsert(4, "Osaka", "Kita", DOGS_AND_CATS)
+
+  assert index.search("Tokyo") == [1, 2, 3]
+  assert index.search("Tokyo", "Shibuya") == [2, 3]
+  assert index.search("Tokyo", flags=["dogs_ok", "cats_ok"]) == [3]
+  assert index.search("Tokyo", "Meguro") == []
+  assert index.search("Kyoto") == []
+
+def test_updates_move_and_remove_sitters():
+  index = SitterIndex()
+  index.upsert(1, "Tokyo", "Shibuya", DOGS)
+  index.upsert(1, "Osaka", "Kita", DOGS_AND_CATS)
+  index.upsert(2, "Tokyo", "Shibuya", DOGS)
+  index.remove(2)
+
+  assert index.search("Tokyo") == []
+  assert index.search("Osaka", "Kita", ["cats_ok"]) == [1]
+  assert index.stats()["locations"] == 1
+
+def test_appuser_updates_only_change_the_language_flags():
+  class Appuser:
+    id = 1
+    prefecture = "Tokyo"
+    city_ward = "Shibuya"
+    english_ok = True
+    japanese_ok = False
+    sitter_rating = None
+    last_login = None
+
+  index = SitterIndex()
+  index.upsert(1, "Tokyo", "Shibuya", DOGS)
+  index.update_appuser(Appuser())
+  Appuser.id = 2 # not a sitter, so not indexed
+  index.update_appuser(Appuser())
+
+  assert index.search("Tokyo", "Shibuya", ["dogs_ok", "english_ok"]) == [1]
+  assert len(index) == 1
+
+@pytest.mark.anyio
+async def test_rebuild_replays_writes_made_while_it_loads():
+  index = SitterIndex()
+  index.upsert(9, "Tokyo", "Shibuya", DOGS) # gone from the database, so the rebuild drops it
+
+  async def load():
+    index.upsert(2, "Tokyo", "Minato", DOGS) # a request writing while the rows are read
+    index.remove(1)
+    return {1: (("Tokyo", "Shibuya"), DOGS, NO_RANKING), 3: (("Osaka", "Kita"), DOGS, NO_RANKING)}
+
+  index._load = load
+  await index.rebuild()
+
+  assert index.search("Tokyo") == [2]
+  assert index.search("Osaka") == [3]
+  assert index.ready
+
+@pytest.mark.anyio
+async def test_check_reports_what_differs_from_the_database():
+  index = SitterIndex()
+  index.upsert(1, "Tokyo", "Shibuya", DOGS)
+  index.upsert(2, "Tokyo", "Shibuya", DOGS)
+
+  async def load():
+    return {1: (("Tokyo", "Shibuya"), DOGS_AND_CATS, NO_RANKING), 3: (("Osaka", "Kita"), DOGS, NO_RANKING)}
+
+  index._load = load
+
+  assert await index.check() == {"consistent": False, "missing": [3], "unexpected": [2], "stale": [1]}
+
+def test_ranking_score_weighs_rating_language_and_recency():
+  now = 1_000_000_000.0
+  weights = RankingWeights()
+
+  assert ranking_score((5.0, 0.0), False, weights, now) == 1.0
+  assert ranking_score((0.0, 0.0), True, weights, now) == 0.5
+  assert ranking_score((0.0, now), False, weights, now) == 0.5
+  assert ranking_score((0.0, now - 30 * 86400), False, weights, now) == pytest.approx(0.25) # one half-life ago
+  assert ranking_score((4.0, now), True, RankingWeights(rating=2, language=0, recency=1), now) == pytest.approx(2.6)
+
+def test_top_k_keeps_the_best_with_ties_by_ascending_id():
+  scored = [(0.5, 4), (0.9, 7), (0.5, 2), (0.1, 1), (0.9, 3)]
+
+  assert top_k(scored, 3) == [(0.9, 3), (0.9, 7), (0.5, 2)]
+  assert top_k(scored, 10) == sorted(scored, key=lambda pair: (-pair[0], pair[1]))
+  assert top_k([], 3) == []
+
+def test_top_ranked_scores_indexed_sitters():
+  now = time.time()
+  index = SitterIndex()
+  index.upsert(1, "Tokyo", "Shibuya", DOGS, (5.0, 0.0))
+  index.upsert(2, "Tokyo", "Shibuya", DOGS | flags_mask(["japanese_ok"]), (3.0, now))
+  index.upsert(3, "Tokyo", "Shibuya", DOGS, (2.5, 0.0))
+
+  assert [appuserID for _, appuserID in index.top_ranked(index.search("Tokyo"), 2, RankingWeights(), now=now)] == [2, 1]
+  assert [appuserID for _, appuserID in index.top_ranked([1, 3], 5, RankingWeights(), now=now)] == [1, 3]
+  assert index.top_ranked([2], 1, RankingWeights(), "japanese", now=now)[0][0] == pytest.approx(0.6 + 0.5 + 0.5)
+
+SEARCHES = [
+  {"prefecture": "Tokyo"},
+  {"prefecture": "Tokyo", "city_ward": "Shibuya"},
+  {"prefecture": "Tokyo", "city_ward": ""},
+  {"prefecture": "Tokyo", "dogs_ok": True},
+  {"prefecture": "Tokyo", "dogs_ok": True, "cats_ok": True},
+  {"prefecture": "東京都", "city_ward": "Shibuya", "visit_ok": True},
+  {"prefecture": "Osaka"},
+]
+
+def search_ids(client, params: dict) -> set:
+  response = client.get("/appuser-sitters", params=params)
+  assert response.status_code == 200, response.text
+  return {match["appuser"]["id"] for match in response.json()}
+
+def test_index_and_database_searches_agree(client, make_sitter, monkeypatch):
+  make_sitter("Tokyo", "Shibuya", dogs_ok=True, cats_ok=True)
+  make_sitter("Tokyo", "Shibuya", dogs_ok=True, visit_ok=True)
+  make_sitter("Tokyo", "Minato", cats_ok=True)
+  make_sitter("Osaka", "Kita", dogs_ok=True)
+  assert len(main.sitter_index) == 4
+
+  for params in SEARCHES:
+    fromIndex = search_ids(client, params)
+    monkeypatch.setattr(main, "use_sitter_index", False)
+    fromDatabase = search_ids(client, params)
+    monkeypatch.setattr(main, "use_sitter_index", True)
+    assert fromIndex == fromDatabase, params
+
+def test_an_empty_city_ward_searches_the_whole_prefecture(client, make_sitter, monkeypatch):
+  sitters = {make_sitter("Tokyo", "Shibuya"), make_sitter("Tokyo", "Minato")}
+
+  assert search_ids(client, {"prefecture": "Tokyo", "city_ward": ""}) == sitters
+  monkeypatch.setattr(main, "use_sitter_index", False)
+  assert search_ids(client, {"prefecture": "Tokyo", "city_ward": ""}) == sitters
+
+def test_sitters_written_elsewhere_are_picked_up_by_a_rebuild(client, make_sitter):
+  appuserID = make_sitter("Tokyo", "Shibuya", dogs_ok=True)
+  client.portal.call(lambda: models.Sitter.filter(appuser_id=appuserID).update(dogs_ok=False)) # as another worker would
+
+  assert client.portal.call(main.sitter_index.check)["stale"] == [appuserID]
+  assert search_ids(client, {"prefecture": "Tokyo", "dogs_ok": True}) == set() # rows are rechecked before they are returned
+
+  client.portal.call(main.sitter_index.rebuild)
+  assert client.portal.call(main.sitter_index.check)["consistent"]
+
+def test_admin_routes_check_and_rebuild_the_index(client, make_sitter, monkeypatch):
+  appuserID = make_sitter("Tokyo", "Shibuya", dogs_ok=True)
+  client.portal.call(lambda: models.Sitter.filter(appuser_id=appuserID).update(dogs_ok=False))
+  monkeypatch.setattr(main, "admin_token", "secret")
+  admin = {"X-Admin-Token": "secret"}
+
+  assert client.get("/admin/sitter-index").status_code == 404
+  assert client.post("/admin/sitter-index/rebuild", headers={"X-Admin-Token": "wrong"}).status_code == 404
+  assert client.get("/admin/sitter-index", headers=admin).json()["stale"] == [appuserID]
+
+  assert client.post("/admin/sitter-index/rebuild", headers=admin).status_code == 200
+  assert client.get("/admin/sitter-index", headers=admin).json()["consistent"]
+
+def test_admin_routes_are_off_without_a_token(client):
+  assert client.get("/admin/sitter-index", headers={"X-Admin-Token": ""}).status_code == 404
+
+def ranked_ids(client, params: dict) -> list:
+  response = client.get("/appuser-sitters", params={**params, "rank": True})
+  assert response.status_code == 200, response.text
+  return [(match["appuser"]["id"], match["score"]) for match in response.json()]
+
+def test_ranked_index_and_database_searches_agree(client, make_sitter, monkeypatch):
+  sitters = [make_sitter("Tokyo", "Shibuya", dogs_ok=True) for _ in range(5)]
+  for appuserID, (reviewCount, scoreSum) in zip(sitters, [(1, 3), (2, 10), (0, 0), (1, 5), (3, 3)]):
+    client.portal.call(lambda: models.Appuser.filter(id=appuserID).update(sitter_review_count=reviewCount, sitter_score_sum=scoreSum, last_login=None))
+  client.portal.call(lambda: models.Appuser.filter(id=sitters[2]).update(japanese_ok=True))
+  client.portal.call(main.sitter_index.rebuild)
+
+  for params in [{"prefecture": "Tokyo", "limit": 3}, {"prefecture": "Tokyo", "language": "japanese", "rating_weight": 0.5}]:
+    fromIndex = ranked_ids(client, params)
+    monkeypatch.setattr(main, "use_sitter_index", False)
+    fromDatabase = ranked_ids(client, params)
+    monkeypatch.setattr(main, "use_sitter_index", True)
+    assert fromIndex == fromDatabase, params
+
+  assert [appuserID for appuserID, _ in ranked_ids(client, {"prefecture": "Tokyo", "limit": 3})] == [sitters[1], sitters[3], sitters[0]]
+
+def test_ranked_search_rejects_cursors_and_unknown_languages(client):
+  assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", "rank": True, "cursor": main.encode_search_cursor(1)}).status_code == 400
+  assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", "rank": True, "language": "klingon"}).status_code == 400
+
+def test_ranking_uses_only_reviews_received_as_a_sitter(client, make_sitter, signup, monkeypatch):
+  wellReviewed, poorlyOwned = make_sitter(), make_sitter()
+  authorID, headers = signup()
+  for recipientID, role, score in [(wellReviewed, "sitter", 4), (poorlyOwned, "sitter", 4), (poorlyOwned, "owner", 1)]:
+    assert client.post(f"/appuser/{recipientID}/review", json={"author_appuser_id": authorID, "recipient_appuser_type": role, "score": score}, headers=headers).status_code == 201
+
+  for use_sitter_index in [True, False]:
+    monkeypatch.setattr(main, "use_sitter_index", use_sitter_index)
+    matches = client.get("/appuser-sitters", params={"prefecture": "Tokyo", "rank": True, "recency_weight": 0}).json()
+    assert [(match["appuser"]["id"], match["score"], match["appuser"]["sitter_rating"]) for match in matches] == [(wellReviewed, 0.8, 4.0), (poorlyOwned, 0.8, 4.0)]
@@ -0,0 +1,65 @@
+from fastapi import HTTPException # type: ignore
+import pet_sitter.main as main
+import pytest
+
+def test_search_cursors_round_trip_and_reject_garbage():
+  assert main.decode_search_cursor(main.encode_search_cursor(12345)) == 12345
+
+  for cursor in ["not-a-cursor", main.encode_search_cursor(1)[:-2], "eyJhZnRlciI6ICIxIn0"]: # the last one holds {"after": "1"}
+    with pytest.raises(HTTPException) as error:
+      main.decode_search_cursor(cursor)
+    assert error.value.status_code == 400
+
+def page_through(client, params: dict) -> tuple:
+  pages = []
+  cursor = None
+  while True:
+    response = client.get("/appuser-sitters", params={**params, **({"cursor": cursor} if cursor else {})})
+    assert response.status_code == 200, response.text
+    pages.append([match["appuser"]["id"] for match in response.json()])
+    cursor = response.headers.get("X-Next-Cursor")
+    if not cursor:
+      return pages, response.headers.get("X-Total-Count")
+
+@pytest.mark.parametrize("use_sitter_index", [True, False])
+def test_pages_cover_every_match_once_in_appuser_id_order(client, make_sitter, monkeypatch, use_sitter_index):
+  sitterIDs = [make_sitter("Tokyo", "Shibuya" if number % 2 else "Minato", dogs_ok=True) for number in range(5)]
+  make_sitter("Tokyo", "Shibuya") # no dogs
+  monkeypatch.setattr(main, "use_sitter_index", use_sitter_index)
+
+  pages, total = page_through(client, {"prefecture": "Tokyo", "dogs_ok": True, "limit": 2, "include_total": True})
+
+  assert pages == [sitterIDs[0:2], sitterIDs[2:4], sitterIDs[4:5]]
+  assert total == "5"
+
+def test_search_rejects_invalid_limits_and_cursors(client):
+  assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", "limit": 0}).status_code == 400
+  assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", "limit": main.sitter_search_max_page_size + 1}).status_code == 400
+  assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", "cursor": "garbage"}).status_code == 400
+
+def make_available_sitter(client, signup, days: list) -> int:
+  appuserID, headers = signup(prefecture="Tokyo", city_ward="Shibuya")
+  assert client.post(f"/sitter/{appuserID}", json={"sitter_profile_bio": "Happy to help"}, headers=headers).status_code == 200
+  if days:
+    response = client.post(f"/appuser/{appuserID}/availability", json=[{"available_date": f"2030-05-{day:02d}T00:00:00"} for day in days], headers=headers)
+    assert response.status_code == 201, response.text
+  return appuserID
+
+@pytest.mark.parametrize("use_sitter_index", [True, False])
+def test_date_ranges_keep_the_sitters_available_on_enough_days(client, signup, monkeypatch, use_sitter_index):
+  everyDay = make_available_sitter(client, signup, [1, 2, 3])
+  twoDays = make_available_sitter(client, signup, [1, 3, 9])
+  make_available_sitter(client, signup, [9])
+  monkeypatch.setattr(main, "use_sitter_index", use_sitter_index)
+
+  def matching(**params) -> list:
+    response = client.get("/appuser-sitters", params={"prefecture": "Tokyo", "start_date": "2030-05-01", "end_date": "2030-05-03", **params})
+    assert response.status_code == 200, response.text
+    return [match["appuser"]["id"] for match in response.json()]
+
+  assert matching() == [everyDay]
+  assert matching(min_days=2) == [everyDay, twoDays]
+
+def test_date_ranges_are_validated(client):
+  for params in [{"start_date": "2030-05-03", "end_date": "2030-05-01"}, {"start_date": "2030-05-01"}, {"start_date": "2030-05-01", "end_date": "2030-05-03", "min_days": 4}, {"min_days": 1}]:
+    assert client.get("/appuser-sitters", params={"prefecture": "Tokyo", **params}).status_code == 400, params
@@ -0,0 +1,80 @@
+from starlette.websockets import WebSocketDisconnect # type: ignore
+import pytest
+
+def test_frames_are_stored_acknowledged_and_broadcast(client, inquiry):
+  inquiryID, (ownerID, ownerHeaders), (sitterID, sitterHeaders) = inquiry
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}", headers=ownerHeaders) as owner, client.websocket_connect(f"/ws/inquiry/{inquiryID}", headers=sitterHeaders) as sitter:
+    owner.send_json({"content": "Is Pochi ready?", "client_id": "c1"})
+    ack = owner.receive_json()
+    assert ack["type"] == "ack" and ack["client_id"] == "c1"
+
+    for socket in [owner, sitter]:
+      broadcast = socket.receive_json()
+      assert (broadcast["id"], broadcast["content"], broadcast["author_appuser_id"], broadcast["recipient_appuser_id"]) == (ack["id"], "Is Pochi ready?", ownerID, sitterID)
+
+  history = client.get(f"/inquiry/{inquiryID}/message", headers=sitterHeaders).json()
+  assert [message["id"] for message in history] == [ack["id"]]
+
+def test_invalid_frames_are_answered_with_errors(client, inquiry):
+  inquiryID, (_, ownerHeaders), _ = inquiry
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}", headers=ownerHeaders) as owner:
+    owner.send_text("not json")
+    assert owner.receive_json()["type"] == "error"
+    owner.send_json({"content": "  ", "client_id": 7})
+    assert owner.receive_json() == {"type": "error", "detail": "Empty message", "client_id": 7}
+
+  assert client.get(f"/inquiry/{inquiryID}/message", headers=ownerHeaders).json() == []
+
+def test_browsers_authenticate_with_the_first_frame(client, inquiry):
+  inquiryID, (_, ownerHeaders), _ = inquiry
+  token = ownerHeaders["Authorization"].removeprefix("Bearer ")
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}") as owner:
+    owner.send_json({"token": token})
+    owner.send_json({"content": "Hello"})
+    assert owner.receive_json()["type"] == "ack"
+
+def test_a_binary_first_frame_is_refused(client, inquiry):
+  inquiryID = inquiry[0]
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}") as socket:
+    socket.send_bytes(b'{"token": "not-a-token"}')
+    assert socket.receive_json()["status_code"] == 401
+    with pytest.raises(WebSocketDisconnect) as closed:
+      socket.receive_json()
+  assert closed.value.code == 1008
+
+def test_binary_frames_after_authentication_are_answered_with_errors(client, inquiry):
+  inquiryID, (_, ownerHeaders), _ = inquiry
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}", headers=ownerHeaders) as owner:
+    owner.send_bytes(b'{"content": "Hello"}')
+    assert owner.receive_json() == {"type": "error", "detail": "Expected a text frame"}
+    owner.send_json({"content": "Hello"})
+    assert owner.receive_json()["type"] == "ack"
+
+def test_the_token_is_not_read_from_the_query_string(client, inquiry):
+  inquiryID, (_, ownerHeaders), _ = inquiry
+  token = ownerHeaders["Authorization"].removeprefix("Bearer ")
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}?token={token}") as owner:
+    owner.send_json({"content": "Hello"}) # taken as the first frame, which holds no token
+    assert owner.receive_json()["status_code"] == 401
+    with pytest.raises(WebSocketDisconnect) as closed:
+      owner.receive_json()
+  assert closed.value.code == 1008
+
+@pytest.mark.parametrize("who", ["stranger", "anonymous"])
+def test_other_callers_are_refused(client, inquiry, signup, who):
+  inquiryID = inquiry[0]
+  headers = signup()[1] if who == "stranger" else {}
+
+  with client.websocket_connect(f"/ws/inquiry/{inquiryID}", headers=headers) as socket:
+    if who == "anonymous":
+      socket.send_json({"token": "not-a-token"})
+    assert socket.receive_json()["status_code"] in (401, 403)
+    with pytest.raises(WebSocketDisconnect) as closed:
+      socket.receive_json()
+  assert closed.value.code == 1008